@@ -0,0 +1,67 @@
+"""Compares fixed concurrency (too low and too high) with adaptive concurrency against a local fake switch farm, whose
+simulated AAA server handles only a few logins at once and rejects them, once it is overloaded.
+
+Usage (from the repository root, Linux only because of the 127.0.0.0/8 trick):
+    python -m benchmark.bench_adaptive_concurrency --devices 300 --aaa-capacity 10
+"""
+import argparse
+import time
+
+from benchmark.common import build_switches, quiet_logging, replace_config, use_benchmark_config
+from benchmark.fake_switch_farm import FakeSwitchFarm
+from network_toolkit.async_ssh_connection import run_show_command_async
+from network_toolkit.fetch_timing import measure_run
+from network_toolkit.ssh_connection import run_show_command
+from network_toolkit.ssh_session_pool import close_session_pool
+
+COMMAND = "show derived-config | begin interface"
+
+
+def _run(name, run, addresses, farm):
+    switches = build_switches(addresses)
+    rejected_logins = farm.rejected_logins
+    with measure_run(COMMAND, switches) as run_timing:
+        start = time.perf_counter()
+        result = run(switches, COMMAND)
+        duration = time.perf_counter() - start
+    # Every run logs in again
+    close_session_pool()
+    collected = sum(1 for switch in result.values() if switch["eth_interfaces"])
+    print(f"{name:<16} {duration:8.2f}s  {collected}/{len(addresses)} collected  {farm.rejected_logins - rejected_logins} logins rejected")
+    for limit_name, history in run_timing.concurrency.items():
+        print(f"{'':<16} {limit_name}: " + ", ".join(f"{limit} @ {seconds}s" for seconds, limit in history))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the fake switch needs per command")
+    parser.add_argument("--aaa-capacity", type=int, default=10, help="Logins the AAA server handles at once")
+    parser.add_argument("--aaa-latency", type=float, default=0.1, help="Seconds the AAA server needs per login")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--engine", choices=("thread", "asyncio"), default="thread")
+    parser.add_argument("--low", type=int, default=4, help="Fixed concurrency, which is too low")
+    parser.add_argument("--high", type=int, default=50, help="Fixed concurrency, which overloads the AAA server")
+    parser.add_argument("--min-sessions", type=int, default=2, help="adaptive_min_sessions")
+    parser.add_argument("--max-sessions", type=int, default=50, help="adaptive_max_sessions")
+    args = parser.parse_args()
+
+    quiet_logging()
+    use_benchmark_config(ssh_port=args.port, collection_engine=args.engine, max_open_ssh_sessions=max(args.high, args.max_sessions),
+                         adaptive_min_sessions=args.min_sessions, adaptive_max_sessions=args.max_sessions)
+    run = run_show_command_async if args.engine == "asyncio" else run_show_command
+    farm = FakeSwitchFarm(port=args.port, latency=args.latency, aaa_capacity=args.aaa_capacity, aaa_latency=args.aaa_latency)
+    farm.start_in_thread()
+    addresses = FakeSwitchFarm.addresses(args.devices)
+
+    try:
+        for name, adaptive, sessions in ((f"fixed {args.low}", False, args.low), (f"fixed {args.high}", False, args.high),
+                                         (f"adaptive from {args.low}", True, args.low)):
+            replace_config(adaptive_concurrency=adaptive, number_of_worker_threads=sessions, max_concurrent_sessions=sessions)
+            _run(name, run, addresses, farm)
+    finally:
+        farm.stop_in_thread()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measures the cold start of the toolkit: wall time of fresh interpreters and the heaviest imports (-X importtime).
+
+Usage (from the repository root):
+    python -m benchmark.bench_cold_start --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PATH_REPOSITORY = Path(__file__).resolve().parent.parent
+PATH_MAIN = PATH_REPOSITORY / "network_toolkit/main.py"
+
+SCENARIOS = {
+    "import main": ["-c", "import main"],
+    "main.py --help": [str(PATH_MAIN), "--help"],
+    "main.py search --help": [str(PATH_MAIN), "search", "--help"],
+}
+
+
+def _environment():
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join([str(PATH_REPOSITORY), str(PATH_REPOSITORY / "network_toolkit")])
+    return environment
+
+
+def _run(arguments, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-W", "ignore"] + arguments, env=_environment(), stdout=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _heaviest_imports(arguments, count):
+    """Returns the direct imports of main with the largest cumulative import time in microseconds"""
+    completed_process = subprocess.run([sys.executable, "-W", "ignore", "-X", "importtime"] + arguments, env=_environment(),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    imports = []
+    for line in completed_process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:  # Modules imported by main directly, nested imports are indented deeper
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest imports to list")
+    args = parser.parse_args()
+
+    for name, arguments in SCENARIOS.items():
+        durations = _run(arguments, args.runs)
+        print(f"{name:<22} median {statistics.median(durations) * 1000:7.0f}ms  min {min(durations) * 1000:7.0f}ms")
+
+    print("Heaviest imports of 'import main':")
+    for cumulative, name in _heaviest_imports(SCENARIOS["import main"], args.top):
+        print(f"    {cumulative / 1000:7.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
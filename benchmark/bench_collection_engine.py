@@ -0,0 +1,53 @@
+"""Compares the thread engine with the asyncio engine against a local fake switch farm.
+
+Usage (from the repository root, Linux only because of the 127.0.0.0/8 trick):
+    python -m benchmark.bench_collection_engine --devices 300 --latency 0.5
+"""
+import argparse
+import time
+
+from benchmark.common import build_switches, quiet_logging, replace_config, use_benchmark_config
+from benchmark.fake_switch_farm import FakeSwitchFarm
+from network_toolkit.async_ssh_connection import run_show_command_async
+from network_toolkit.ssh_connection import run_show_command
+
+COMMAND = "show derived-config | begin interface"
+
+
+def _run_engine(name, run, addresses):
+    switches = build_switches(addresses)
+    start = time.perf_counter()
+    result = run(switches, COMMAND)
+    duration = time.perf_counter() - start
+    collected = sum(1 for switch in result.values() if switch["eth_interfaces"])
+    print(f"{name:<8} {duration:8.2f}s  {len(addresses) / duration:8.1f} switches/s  {collected}/{len(addresses)} collected")
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the fake switch needs per command")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--threads", type=int, default=15, help="number_of_worker_threads for the thread engine")
+    parser.add_argument("--sessions", type=int, default=200, help="max_concurrent_sessions for the asyncio engine")
+    args = parser.parse_args()
+
+    quiet_logging()
+    use_benchmark_config(ssh_port=args.port, number_of_worker_threads=args.threads, max_concurrent_sessions=args.sessions)
+    farm = FakeSwitchFarm(port=args.port, latency=args.latency)
+    farm.start_in_thread()
+    addresses = FakeSwitchFarm.addresses(args.devices)
+
+    try:
+        thread_duration = _run_engine("thread", run_show_command, addresses)
+        replace_config(collection_engine="asyncio")
+        asyncio_duration = _run_engine("asyncio", run_show_command_async, addresses)
+    finally:
+        farm.stop_in_thread()
+
+    print(f"Speedup asyncio vs. thread: {thread_duration / asyncio_duration:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compares the peak memory of the collection into one dict, which gets written at the end, with the pipeline, which
+streams every switch into an NDJSON file, against a local fake switch farm. 'pipeline-json' is the pipeline of the
+other formats: the NDJSON checkpoint gets converted into a JSON file switch by switch afterwards.
+
+Every run is its own process, so its peak memory (max. RSS) counts only this run. The farm runs in this process. Both
+use the asyncio engine, which closes every session after its command, so open sessions don't add to the memory.
+
+Usage (from the repository root, Linux only because of the 127.0.0.0/8 trick):
+    python -m benchmark.bench_collection_pipeline --devices 300 1200 2400 --latency 0.05
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark.common import build_switches, quiet_logging, use_benchmark_config
+from benchmark.fake_switch_farm import FakeSwitchFarm
+
+COMMAND = "show derived-config | begin interface"
+MODES = ("dict", "pipeline", "pipeline-json")
+
+
+def _peak_memory_mib():
+    """Peak RSS of this process. Unlike ru_maxrss, VmHWM does not start with the peak of the parent, which forked it."""
+    with open("/proc/self/status", mode="r", encoding="utf-8") as status_file:
+        for line in status_file:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+def _run_child(args):
+    """Runs one collection and prints duration and peak memory as JSON"""
+    from network_toolkit.async_ssh_connection import run_show_command_async
+    from network_toolkit.collection_pipeline import stream_show_command
+    from network_toolkit.snapshot import dump_mapping, NdjsonSnapshot, NdjsonSnapshotWriter
+
+    quiet_logging()
+    use_benchmark_config(ssh_port=args.port, collection_engine="asyncio", max_concurrent_sessions=args.sessions,
+                         parser_processes=args.parser_processes, pipeline_queue_size=args.queue_size)
+    switches = build_switches(FakeSwitchFarm.addresses(args.devices))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        start = time.perf_counter()
+        if args.child == "dict":
+            combined_cli_output = run_show_command_async(switches, COMMAND)
+            with open(Path(temp_dir) / "snapshot.json", "x") as json_file:
+                json.dump(combined_cli_output, json_file, indent=2)
+        elif args.child == "pipeline":
+            with NdjsonSnapshotWriter(Path(temp_dir) / "snapshot.ndjson") as snapshot_writer:
+                stream_show_command(switches, COMMAND, snapshot_writer)
+        else:
+            with NdjsonSnapshotWriter(Path(temp_dir) / "snapshot.ndjson", complete_on_close=False) as snapshot_writer:
+                stream_show_command(switches, COMMAND, snapshot_writer)
+            with NdjsonSnapshot(snapshot_writer.path_partial_file, [switch_element.ip for switch_element in switches]) as collected_config:
+                with open(Path(temp_dir) / "snapshot.json", "x") as json_file:
+                    dump_mapping(collected_config, json_file, indent=2)
+        duration = time.perf_counter() - start
+    print(json.dumps({"seconds": duration, "max_rss_mib": _peak_memory_mib()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, nargs="+", default=[300, 1200])
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--sessions", type=int, default=50, help="max_concurrent_sessions")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the fake switch needs per command")
+    parser.add_argument("--stack-members", type=int, default=4)
+    parser.add_argument("--parser-processes", type=int, default=0)
+    parser.add_argument("--queue-size", type=int, default=100, help="pipeline_queue_size")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        args.devices = args.devices[0]
+        _run_child(args)
+        return
+
+    quiet_logging()
+    farm = FakeSwitchFarm(port=args.port, latency=args.latency, stack_members=args.stack_members)
+    farm.start_in_thread()
+    try:
+        for device_count in args.devices:
+            for mode in MODES:
+                child = subprocess.run([sys.executable, "-W", "ignore", "-m", "benchmark.bench_collection_pipeline", "--child", mode,
+                                        "--devices", str(device_count), "--port", str(args.port), "--sessions", str(args.sessions),
+                                        "--parser-processes", str(args.parser_processes), "--queue-size", str(args.queue_size)],
+                                       capture_output=True, text=True, check=True)
+                result = json.loads(child.stdout.strip().splitlines()[-1])
+                print(f"{device_count:6d} switches  {mode:<13} {result['seconds']:8.2f}s  peak {result['max_rss_mib']:8.1f} MiB")
+    finally:
+        farm.stop_in_thread()
+
+
+if __name__ == "__main__":
+    main()
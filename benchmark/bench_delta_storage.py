@@ -0,0 +1,78 @@
+"""Compares the disk usage of daily full JSON config files with base files plus deltas and times the rebuild of a file.
+
+Every file gets rebuilt from the deltas and compared with the original content.
+
+Usage (from the repository root):
+    python -m benchmark.bench_delta_storage --days 90 --switches 200
+"""
+import argparse
+import copy
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmark.common import build_parsed_cli_output, quiet_logging
+from network_toolkit.snapshot import compact_snapshots, load_snapshot, write_snapshot_with_delta
+from network_toolkit.tool.history_search import SNAPSHOT_TIME_FORMAT
+
+
+def _generate_daily_outputs(days, switch_count, changes_per_day, seed=0):
+    """Yields (timestamp, parsed cli output) per day, some access ports get shut down or enabled again every day"""
+    rnd = random.Random(seed)
+    parsed_cli_output = build_parsed_cli_output(switch_count)
+
+    start_time = datetime(2022, 1, 1, 6)
+    for day in range(days):
+        for _ in range(changes_per_day):
+            eth_interfaces = parsed_cli_output[rnd.choice(list(parsed_cli_output))]["eth_interfaces"]
+            int_config = eth_interfaces[rnd.choice(list(eth_interfaces))]
+            if "shutdown" in int_config:
+                int_config.remove("shutdown")
+            else:
+                int_config.append("shutdown")
+        yield (start_time + timedelta(days=day)).strftime(SNAPSHOT_TIME_FORMAT), copy.deepcopy(parsed_cli_output)
+
+
+def _directory_size(path_directory):
+    return sum(path_file.stat().st_size for path_file in Path(path_directory).iterdir())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--switches", type=int, default=200)
+    parser.add_argument("--changes-per-day", type=int, default=5)
+    parser.add_argument("--base-interval", type=int, default=30)
+    args = parser.parse_args()
+
+    quiet_logging()
+    with tempfile.TemporaryDirectory() as json_dir, tempfile.TemporaryDirectory() as delta_dir:
+        expected = {}
+        start = time.perf_counter()
+        for timestamp, parsed_cli_output in _generate_daily_outputs(args.days, args.switches, args.changes_per_day):
+            with open(Path(json_dir) / (timestamp + ".json"), "x") as json_file:
+                json.dump(parsed_cli_output, json_file, indent=2)
+            path_file = write_snapshot_with_delta(parsed_cli_output, delta_dir, timestamp, args.base_interval)
+            expected[path_file.name] = parsed_cli_output
+        print(f"Generated {args.days} files with {args.switches} switches in {time.perf_counter() - start:.1f}s")
+        print(f"json   {_directory_size(json_dir) / 2 ** 20:8.1f} MiB")
+        print(f"delta  {_directory_size(delta_dir) / 2 ** 20:8.1f} MiB")
+
+        start = time.perf_counter()
+        mismatches = sum(load_snapshot(Path(delta_dir) / file_name) != parsed_cli_output for file_name, parsed_cli_output in expected.items())
+        print(f"Rebuilt {len(expected)} files in {(time.perf_counter() - start) / len(expected) * 1000:.0f} ms each, {mismatches} differ")
+
+        start = time.perf_counter()
+        size_before, size_after = compact_snapshots(json_dir, args.base_interval)
+        compacted_files = sorted(Path(json_dir).iterdir())
+        mismatches = sum(load_snapshot(path_file) != expected_content
+                         for path_file, expected_content in zip(compacted_files, expected.values()))
+        print(f"Compacted the json files from {size_before / 2 ** 20:.1f} MiB to {size_after / 2 ** 20:.1f} MiB "
+              f"in {time.perf_counter() - start:.1f}s, {mismatches} differ")
+
+
+if __name__ == "__main__":
+    main()
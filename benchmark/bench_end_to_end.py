@@ -0,0 +1,179 @@
+"""Runs the toolkit end to end against a local fake switch farm and reports throughput and latency percentiles.
+
+Phases: check_ssh_connection (reachability scan and login check), run_show_command (collection incl. parsing on the
+worker threads), parse_interface_cli_output (parser alone) and search_in_output_file (cold with index build, then warm).
+Some switches of the farm reject the login, drop the connection or answer slowly, see FakeSwitchFarm.
+
+The report is printed and, with --output, written as JSON. --compare prints the ratio to an earlier report, so two
+commits can be compared:
+    python -m benchmark.bench_end_to_end --devices 200 --output before.json
+    python -m benchmark.bench_end_to_end --devices 200 --compare before.json
+
+Usage (from the repository root, Linux only because of the 127.0.0.0/8 trick):
+    python -m benchmark.bench_end_to_end --devices 200 --latency 0.05 --jitter 0.05
+"""
+import argparse
+import json
+import logging
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark.common import build_switches, percentiles, quiet_logging, use_benchmark_config
+from benchmark.config_generator import generate_derived_config
+from benchmark.fake_switch_farm import FakeSwitchFarm
+from network_toolkit import ssh_connection
+from network_toolkit.fetch_timing import measure_run
+from network_toolkit.inventory.network_switch import NetworkSwitch
+from network_toolkit.inventory.validator.connection_validator import check_ssh_connection
+from network_toolkit.ssh_session_pool import close_session_pool
+
+COMMAND = "show derived-config | begin interface"
+SEARCH_MASK = '"switchport mode access" AND NOT ~"dot1x"'
+
+# main.py imports its siblings as top level modules, like when it gets started as script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "network_toolkit"))
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _phase_report(duration, device_count, latencies=None, **extra):
+    report = {"seconds": round(duration, 3), "devices": device_count, "devices_per_second": round(device_count / duration, 1) if duration else None}
+    if latencies is not None:
+        report["latency_ms"] = {name: round(value * 1000, 1) for name, value in percentiles(latencies).items()}
+    report.update(extra)
+    return report
+
+
+def _bench_check_ssh_connection(switches):
+    start = time.perf_counter()
+    reachable_switches = check_ssh_connection(switches)
+    duration = time.perf_counter() - start
+    return _phase_report(duration, len(switches), reachable=sum(1 for switch_element in reachable_switches if switch_element.reachable))
+
+
+def _bench_run_show_command(switches):
+    with measure_run(COMMAND, switches) as run_timing:
+        start = time.perf_counter()
+        combined_cli_output = ssh_connection.run_show_command(switches, COMMAND)
+        duration = time.perf_counter() - start
+    # Time per device from taking a session to the parsed config, the phases come from the timing of the toolkit
+    latencies = [sum(seconds for phase, seconds in phases.items() if phase != "queue_wait") for phases in run_timing.devices.values()]
+    phase_percentiles = {phase: {name: round(value * 1000, 1) for name, value in values.items() if name.startswith("p") or name == "max"}
+                         for phase, values in run_timing.summary()["phases"].items()}
+    return _phase_report(duration, len(switches), latencies, failed=len(run_timing.failures), phases_ms=phase_percentiles), combined_cli_output
+
+
+def _bench_parser(addresses, farm):
+    raw_cli_outputs = [generate_derived_config("bench-" + ip, farm.stack_members, farm.ports_per_member, farm.lines_per_interface) for ip in addresses]
+    latencies = []
+    start = time.perf_counter()
+    for ip, raw_cli_output in zip(addresses, raw_cli_outputs):
+        parse_start = time.perf_counter()
+        NetworkSwitch(hostname="bench", ip=ip, os="cisco_ios", reachable=True, line_number=0).parse_interface_cli_output(raw_cli_output)
+        latencies.append(time.perf_counter() - parse_start)
+    return _phase_report(time.perf_counter() - start, len(addresses), latencies,
+                         mib_per_second=round(sum(map(len, raw_cli_outputs)) / 2 ** 20 / (time.perf_counter() - start), 1))
+
+
+def _bench_search(combined_cli_output, runs):
+    from main import SearchMaskFlags, search_in_output_file
+    from tool import compile_search_query
+
+    search_query = compile_search_query(SEARCH_MASK)
+    search_mask_flags = SearchMaskFlags(False, False, False)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path_output_file = Path(temp_dir) / "2022-01-01T06-00-00.json"
+        with open(path_output_file, "x") as json_file:
+            json.dump(combined_cli_output, json_file, indent=2)
+
+        start = time.perf_counter()
+        search_in_output_file(path_output_file, search_query, search_mask_flags)
+        cold_duration = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            search_in_output_file(path_output_file, search_query, search_mask_flags)
+            latencies.append(time.perf_counter() - start)
+    return _phase_report(sum(latencies), len(combined_cli_output) * runs, latencies, cold_ms=round(cold_duration * 1000, 1))
+
+
+def _print_report(report, baseline=None):
+    for phase, phase_report in report["phases"].items():
+        line = f"{phase:<28} {phase_report['seconds']:8.2f}s {phase_report['devices_per_second'] or 0:10.1f}/s"
+        for name, value in phase_report.get("latency_ms", {}).items():
+            line += f"  {name} {value:8.1f}ms"
+        if baseline is not None and phase in baseline["phases"]:
+            line += f"  {phase_report['seconds'] / baseline['phases'][phase]['seconds']:5.2f}x time of {baseline.get('commit') or 'baseline'}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--threads", type=int, default=15, help="number_of_worker_threads")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the fake switch needs per command")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Random extra seconds per command, up to this value")
+    parser.add_argument("--stack-members", type=int, default=2)
+    parser.add_argument("--ports", type=int, default=48, help="Access ports per stack member")
+    parser.add_argument("--lines", type=int, default=12, help="Config lines per access port")
+    parser.add_argument("--auth-failures", type=float, default=0.01, help="Share of switches, which reject the login")
+    parser.add_argument("--dropped", type=float, default=0.01, help="Share of switches, which drop the connection")
+    parser.add_argument("--slow", type=float, default=0.02, help="Share of switches, which answer 10 times slower")
+    parser.add_argument("--xe", type=float, default=0.5, help="Share of switches, which are cisco_xe instead of cisco_ios")
+    parser.add_argument("--search-runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the report as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="Earlier report (JSON) to compare with")
+    args = parser.parse_args()
+
+    quiet_logging()
+    # Dropped connections make paramiko log a traceback each, the toolkit itself logs one warning per switch
+    logging.getLogger("paramiko.transport").setLevel(logging.CRITICAL)
+    use_benchmark_config(ssh_port=args.port, number_of_worker_threads=args.threads)
+    rnd = random.Random(args.seed)
+    addresses = FakeSwitchFarm.addresses(args.devices)
+    # The login check tries the first 3 switches and waits for [ENTER] if one fails, so they always work
+    failing = rnd.sample(addresses[3:], round(len(addresses) * (args.auth_failures + args.dropped + args.slow)))
+    auth_failure_count, dropped_count = round(len(addresses) * args.auth_failures), round(len(addresses) * args.dropped)
+    farm = FakeSwitchFarm(port=args.port, latency=args.latency, stack_members=args.stack_members, ports_per_member=args.ports,
+                          lines_per_interface=args.lines, jitter=args.jitter, auth_failures=failing[:auth_failure_count],
+                          dropped=failing[auth_failure_count:auth_failure_count + dropped_count],
+                          slow=failing[auth_failure_count + dropped_count:], seed=args.seed)
+    xe_addresses = set(rnd.sample(addresses, round(len(addresses) * args.xe)))
+    switches = [switch_element for ip in addresses for switch_element in build_switches([ip], "cisco_xe" if ip in xe_addresses else "cisco_ios")]
+
+    report = {"commit": _commit(), "parameters": {name: str(value) if isinstance(value, Path) else value for name, value in vars(args).items()}, "phases": {}}
+    farm.start_in_thread()
+    try:
+        report["phases"]["check_ssh_connection"] = _bench_check_ssh_connection(switches)
+        report["phases"]["run_show_command"], combined_cli_output = _bench_run_show_command(switches)
+    finally:
+        close_session_pool()
+        farm.stop_in_thread()
+    report["phases"]["parse_interface_cli_output"] = _bench_parser(addresses, farm)
+    report["phases"]["search_in_output_file"] = _bench_search(combined_cli_output, args.search_runs)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, mode="r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    _print_report(report, baseline)
+    if args.output is not None:
+        with open(args.output, mode="w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
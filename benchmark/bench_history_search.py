@@ -0,0 +1,76 @@
+"""Times the history search over a year of daily config files, which change a little from day to day.
+
+The first run builds the search index of every file, later runs only load them.
+
+Usage (from the repository root):
+    python -m benchmark.bench_history_search --days 365 --switches 50
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmark.common import quiet_logging
+from benchmark.config_generator import generate_derived_config
+from network_toolkit.inventory.network_switch import NetworkSwitch
+from network_toolkit.snapshot import write_compact_snapshot
+from network_toolkit.tool.history_search import SNAPSHOT_TIME_FORMAT, list_snapshots, search_history
+from network_toolkit.tool.search_query import compile_search_query
+
+
+class _Flags:
+    negative_search = False
+    strip_oobm = False
+    strip_uplink = False
+
+
+def _generate_snapshots(path_directory, days, switch_count, changes_per_day, seed=0):
+    rnd = random.Random(seed)
+    parsed_cli_output = {}
+    for number in range(switch_count):
+        switch_element = NetworkSwitch(hostname=f"bench-{number}", ip=f"10.0.{number // 256}.{number % 256}", os="cisco_ios", reachable=True, line_number=0)
+        switch_element.parse_interface_cli_output(generate_derived_config(switch_element.hostname, stack_members=2))
+        parsed_cli_output[switch_element.ip] = switch_element.snapshot_entry()
+
+    start_time = datetime(2022, 1, 1, 6)
+    for day in range(days):
+        # Some access ports get shut down or enabled again
+        for _ in range(changes_per_day):
+            eth_interfaces = parsed_cli_output[rnd.choice(list(parsed_cli_output))]["eth_interfaces"]
+            int_config = eth_interfaces[rnd.choice(list(eth_interfaces))]
+            if "shutdown" in int_config:
+                int_config.remove("shutdown")
+            else:
+                int_config.append("shutdown")
+        file_name = (start_time + timedelta(days=day)).strftime(SNAPSHOT_TIME_FORMAT) + ".ntks"
+        write_compact_snapshot(parsed_cli_output, Path(path_directory) / file_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--switches", type=int, default=50)
+    parser.add_argument("--changes-per-day", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    quiet_logging()
+    search_query = compile_search_query('"switchport mode access" AND "shutdown"')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        start = time.perf_counter()
+        _generate_snapshots(temp_dir, args.days, args.switches, args.changes_per_day)
+        print(f"Generated {args.days} files with {args.switches} switches in {time.perf_counter() - start:.1f}s")
+
+        snapshots = list_snapshots(temp_dir)
+        for run in ("cold", "warm"):
+            start = time.perf_counter()
+            history_result = search_history(snapshots, search_query, _Flags(), args.workers)
+            changes = sum(len(changes) for interfaces in history_result.values() for changes in interfaces.values())
+            print(f"{run:<5} {time.perf_counter() - start:6.1f}s  {changes} changes on "
+                  f"{sum(len(interfaces) for interfaces in history_result.values())} interfaces")
+
+
+if __name__ == "__main__":
+    main()
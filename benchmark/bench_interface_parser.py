@@ -0,0 +1,69 @@
+"""Compares the former RegEx parser with the section parser of NetworkSwitch.parse_interface_cli_output.
+
+'sections' parses the output string, 'lines' feeds the same output line by line, like a stream would.
+
+Usage:
+    python -m benchmark.bench_interface_parser --stack-members 9 --ports 48 --lines 30
+"""
+import argparse
+import io
+import re
+import timeit
+
+from benchmark.config_generator import generate_derived_config
+from network_toolkit.inventory.network_switch import NetworkSwitch
+
+
+def parse_with_regex(raw_cli_output):
+    """Parser as it was before the line based one, used as reference"""
+    interface_eth_config = {}
+    for interface_name, interface_config in re.compile(r"^(interface.*)\n((?:.*\n)+?)!", re.MULTILINE).findall(raw_cli_output):
+        interface_config_list = [x.strip() for x in interface_config.split("\n ")]
+        if interface_name.startswith("interface Vlan"):
+            continue
+        interface_eth_config[interface_name] = interface_config_list
+    return interface_eth_config
+
+
+def parse_with_sections(raw_cli_output):
+    switch_element = NetworkSwitch(hostname="bench", ip="127.0.0.1", os="cisco_ios", reachable=True, line_number=0)
+    switch_element.parse_interface_cli_output(raw_cli_output)
+    return switch_element.interface_eth_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stack-members", type=int, default=9)
+    parser.add_argument("--ports", type=int, default=48, help="Access ports per stack member")
+    parser.add_argument("--lines", type=int, default=30, help="Config lines per access port")
+    parser.add_argument("--number", type=int, default=20, help="Parser runs per measurement")
+    parser.add_argument("--repeat", type=int, default=10, help="Measurements, the fastest one is reported")
+    args = parser.parse_args()
+
+    raw_cli_output = generate_derived_config("bench", args.stack_members, args.ports, args.lines)
+    interface_count = len(parse_with_sections(raw_cli_output))
+    print(f"{interface_count} interfaces, {raw_cli_output.count(chr(10))} lines, {len(raw_cli_output) / 1024:.0f} KiB per switch")
+
+    _compare("'show derived-config' output", raw_cli_output, args.number, args.repeat)
+    # Output of e.g. '| section interface' has no '!' lines, the RegEx rescans the rest of the output per interface
+    _compare("output without '!' lines", raw_cli_output.replace("\n!", ""), 1, 3)
+
+
+def _compare(scenario, raw_cli_output, number, repeat):
+    if parse_with_regex(raw_cli_output) != parse_with_sections(raw_cli_output):
+        raise SystemExit("Parsers disagree, benchmark is void.")
+
+    print(f"\n{scenario}:")
+    candidates = (
+        ("regex", lambda: parse_with_regex(raw_cli_output)),
+        ("sections", lambda: parse_with_sections(raw_cli_output)),
+        ("lines", lambda: parse_with_sections(io.StringIO(raw_cli_output))),
+    )
+    results = {}
+    for name, parse in candidates:
+        results[name] = min(timeit.repeat(parse, number=number, repeat=repeat)) / number
+        print(f"{name:<9} {results[name] * 1000:10.2f} ms per switch  ({results['regex'] / results[name]:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measures the webAPI part of the MAC address batch lookup against a local stand-in of macvendors.com.
+
+The previous implementation sent one request per MAC and slept 0.6s after each of them. It gets measured on a small
+sample and extrapolated, the current one runs the full batch.
+
+Usage (from the repository root):
+    python -m benchmark.bench_mac_lookup --macs 2000 --ouis 150 --rate 10
+"""
+import argparse
+import dataclasses
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from benchmark.common import quiet_logging
+from benchmark.fake_macvendors_api import FakeMacVendorsApi
+from network_toolkit.config.mac_lookup_config import MacLookupConfiguration
+from network_toolkit.tool.mac_address_lookup import MacAddress, _lookup_webapi
+from network_toolkit.tool.mac_vendor_cache import MacVendorCache
+
+
+def _generate_macs(mac_count, oui_count, seed=0):
+    rnd = random.Random(seed)
+    ouis = [f"{rnd.randrange(0x000000, 0xFEFFFF):06X}" for _ in range(oui_count)]
+    mac_list = []
+    for _ in range(mac_count):
+        formatted_mac = rnd.choice(ouis) + f"{rnd.randrange(0x1000000):06X}"
+        mac_list.append(MacAddress(formatted_mac, formatted_mac, formatted_mac[:6]))
+    return mac_list
+
+
+def _run_sequential(mac_list, api):
+    """Request pattern of the former implementation: one request per MAC, 0.6s pause after every success"""
+    start = time.perf_counter()
+    for mac_entity in mac_list:
+        response = requests.get(api.url + mac_entity.formatted_mac, timeout=5)
+        if response.status_code == 200:
+            time.sleep(0.6)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--macs", type=int, default=2000)
+    parser.add_argument("--ouis", type=int, default=150, help="Distinct OUIs in the batch")
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second the API accepts")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds the API needs per request")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of requests answered with 503")
+    parser.add_argument("--sample", type=int, default=20, help="MACs used to extrapolate the former implementation")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    quiet_logging()
+    api = FakeMacVendorsApi(port=args.port, rate=args.rate, latency=args.latency, error_rate=args.error_rate)
+    api.start_in_thread()
+    mac_list = _generate_macs(args.macs, args.ouis)
+    lookup_config = dataclasses.replace(MacLookupConfiguration("bench"), api_url_macvendors=api.url,
+                                        api_requests_per_second=args.rate, api_burst=max(int(args.rate), 1),
+                                        api_max_workers=max(int(args.rate * args.latency * 2), 4))
+
+    try:
+        sample_duration = _run_sequential(mac_list[:args.sample], api)
+        sequential_duration = sample_duration / args.sample * args.macs
+        api.request_count = api.rejected_count = 0
+
+        with tempfile.TemporaryDirectory() as temp_dir, MacVendorCache(Path(temp_dir) / "cache.sqlite", 365, 100000) as mac_cache:
+            start = time.perf_counter()
+            resolved_mac_list = _lookup_webapi(mac_list, {}, mac_cache, lookup_config)
+            duration = time.perf_counter() - start
+    finally:
+        api.stop_in_thread()
+
+    failed = sum(1 for organisation in resolved_mac_list.values() if organisation == "Unknown (lookup failed)")
+    print(f"former   {sequential_duration:8.1f}s  (extrapolated from {args.sample} MACs, {args.macs} requests)")
+    print(f"current  {duration:8.1f}s  {api.request_count} requests ({api.rejected_count} rejected with 429), "
+          f"{len(resolved_mac_list) - failed}/{len(resolved_mac_list)} resolved")
+    print(f"Speedup: {sequential_duration / duration:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
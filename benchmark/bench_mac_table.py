@@ -0,0 +1,88 @@
+"""Collects the MAC address tables of a local fake switch farm into the MAC location index and locates a batch of MACs.
+
+Every switch has one device per access port, its uplink learns the devices of the next switch. The batch lookup must
+report the access port of every device, not the uplink, and is compared with scanning all collected tables per MAC.
+
+Usage (from the repository root, Linux only because of the 127.0.0.0/8 trick):
+    python -m benchmark.bench_mac_table --devices 200 --macs 5000
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark.common import build_switches, quiet_logging, use_benchmark_config
+from benchmark.config_generator import edge_mac
+from benchmark.fake_switch_farm import FakeSwitchFarm
+from network_toolkit.ssh_connection import run_raw_command
+from network_toolkit.tool import mac_address_table
+from network_toolkit.tool.mac_address_table import MAC_TABLE_COMMAND, locate_mac_addresses, parse_mac_address_table, update_mac_location_index
+
+
+def _scan_tables(raw_cli_outputs, macs):
+    """Lookup without index: parses all tables for every MAC"""
+    locations = {}
+    for mac in macs:
+        for ip, raw_cli_output in raw_cli_outputs.items():
+            for table_mac, vlan, interface in parse_mac_address_table(raw_cli_output):
+                if table_mac == mac:
+                    locations.setdefault(mac, []).append((ip, interface, vlan))
+    return locations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--stack-members", type=int, default=2)
+    parser.add_argument("--macs", type=int, default=5000, help="MACs in the batch lookup")
+    parser.add_argument("--scan-sample", type=int, default=20, help="MACs used to extrapolate the lookup without index")
+    parser.add_argument("--port", type=int, default=2222)
+    args = parser.parse_args()
+
+    quiet_logging()
+    use_benchmark_config(ssh_port=args.port)
+    addresses = FakeSwitchFarm.addresses(args.devices)
+    farm = FakeSwitchFarm(port=args.port, stack_members=args.stack_members)
+    farm.start_in_thread()
+    switches = build_switches(addresses)
+
+    try:
+        start = time.perf_counter()
+        raw_cli_outputs = run_raw_command(switches, MAC_TABLE_COMMAND)
+        collect_duration = time.perf_counter() - start
+    finally:
+        farm.stop_in_thread()
+
+    rnd = random.Random(0)
+    expected_locations = {}
+    for _ in range(args.macs):
+        switch_element = rnd.choice(switches)
+        member, port = rnd.randint(1, args.stack_members), rnd.randint(1, 48)
+        expected_locations[edge_mac(FakeSwitchFarm.switch_number(switch_element.ip), member, port)] = (switch_element.ip, f"Gi{member}/0/{port}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        mac_address_table.path_to_mac_table = Path(temp_dir) / "mac_address_table.sqlite"
+        start = time.perf_counter()
+        update_mac_location_index(switches, raw_cli_outputs)
+        index_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        mac_locations = locate_mac_addresses(expected_locations)
+        lookup_duration = time.perf_counter() - start
+
+    located = sum(1 for mac, (ip, interface) in expected_locations.items()
+                  if any(location.edge and (location.switch_ip, location.interface) == (ip, interface) for location in mac_locations.get(mac, [])))
+    sample = list(expected_locations)[:args.scan_sample]
+    start = time.perf_counter()
+    _scan_tables(raw_cli_outputs, sample)
+    scan_duration = (time.perf_counter() - start) / len(sample) * len(expected_locations)
+
+    print(f"collection {collect_duration:8.2f}s  {sum(1 for output in raw_cli_outputs.values() if output)}/{len(switches)} switches")
+    print(f"index      {index_duration:8.2f}s")
+    print(f"lookup     {lookup_duration:8.3f}s  {located}/{len(expected_locations)} MACs located on their edge port")
+    print(f"scan       {scan_duration:8.1f}s  (without index, extrapolated from {len(sample)} MACs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Reads the devices from a local mock of Prime Infrastructure, one page after the other and with concurrent pages.
+
+Usage (from the repository root):
+    python -m benchmark.bench_prime_import --devices 6000 --concurrency 4
+"""
+import argparse
+import time
+
+from benchmark.common import quiet_logging
+from benchmark.fake_prime_api import FakePrimeApi
+from network_toolkit.config.input_source_config import PrimeConfiguration
+from network_toolkit.inventory.prime_import import _query_switch_data
+
+
+def _run_import(name, prime, prime_config):
+    prime.request_count = prime.rejected_count = 0
+    start = time.perf_counter()
+    switches = _query_switch_data(prime_config)
+    duration = time.perf_counter() - start
+    complete = [switch.hostname for switch in switches] == [device["deviceName"] for device in prime.devices]
+    print(f"{name:<11} {duration:7.2f}s  {len(switches)} devices ({'complete, in order' if complete else 'INCOMPLETE'}), "
+          f"{prime.request_count} requests, {prime.rejected_count} rejected with 503")
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=6000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4, help="max_concurrent_requests")
+    parser.add_argument("--rate", type=float, default=5, help="requests_per_second")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds Prime needs per request")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    quiet_logging()
+    prime = FakePrimeApi(port=args.port, device_count=args.devices, latency=args.latency, max_concurrent_requests=3)
+    prime.start_in_thread()
+    try:
+        sequential_config = PrimeConfiguration("prime", "prime", prime.address, None, args.page_size, 1, args.rate, 5)
+        sequential_duration = _run_import("sequential", prime, sequential_config)
+        concurrent_config = PrimeConfiguration("prime", "prime", prime.address, None, args.page_size, args.concurrency, args.rate, 5)
+        concurrent_duration = _run_import("concurrent", prime, concurrent_config)
+    finally:
+        prime.stop_in_thread()
+
+    print(f"Speedup: {sequential_duration / concurrent_duration:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compares the former thread based SSH reachability check with the asyncio scanner against a local listener farm.
+
+Usage (from the repository root, Linux only because of the 127.0.0.0/8 trick):
+    python -m benchmark.bench_reachability --reachable 1000 --unreachable 200 --timeout 2
+"""
+import argparse
+import asyncio
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark.listener_farm import ListenerFarm
+from network_toolkit.inventory.validator.reachability_scanner import scan_tcp_port
+
+
+def _former_check(ip, port, timeout):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        return ip, sock.connect_ex((ip, port)) == 0
+
+
+def _run_threads(addresses, port, timeout, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(_former_check, ip, port, timeout) for ip in addresses]
+        return dict(future.result() for future in futures)
+
+
+def _report(name, results, duration, farm):
+    wrong = sum(1 for ip in farm.reachable_addresses if not results[ip]) + sum(1 for ip in farm.unreachable_addresses if results[ip])
+    print(f"{name:<8} {duration:8.2f}s  {len(results) / duration:8.0f} hosts/s  {sum(results.values())} reachable, {wrong} wrong")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reachable", type=int, default=1000)
+    parser.add_argument("--unreachable", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=2, help="ssh_timeout")
+    parser.add_argument("--port", type=int, default=2223)
+    parser.add_argument("--threads", type=int, default=15, help="number_of_worker_threads of the former check")
+    parser.add_argument("--probes", type=int, default=1000, help="max_concurrent_probes of the scanner")
+    args = parser.parse_args()
+
+    farm = ListenerFarm(port=args.port, reachable=args.reachable, unreachable=args.unreachable)
+    farm.start_in_thread()
+    try:
+        start = time.perf_counter()
+        thread_results = _run_threads(farm.addresses, args.port, args.timeout, args.threads)
+        thread_duration = time.perf_counter() - start
+        _report("thread", thread_results, thread_duration, farm)
+
+        start = time.perf_counter()
+        scanner_results = asyncio.run(scan_tcp_port(farm.addresses, args.port, args.timeout, args.probes))
+        scanner_duration = time.perf_counter() - start
+        _report("asyncio", scanner_results, scanner_duration, farm)
+    finally:
+        farm.stop_in_thread()
+
+    print(f"Speedup asyncio vs. thread: {thread_duration / scanner_duration:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Shows the scheduling of the collection against a local fake switch farm: the slow switches are the last ones of the
+list (like WAN switches at the end of a CSV file), the flaky ones drop their first connection.
+
+The first run knows nothing about the switches and starts them in the order of the list. The second run starts the
+slowest switches of the first run first. Both retry the flaky switches. The lower bound of a run is the slowest switch
+or all switches spread evenly over the sessions, whichever takes longer.
+
+Usage (from the repository root, Linux only because of the 127.0.0.0/8 trick):
+    python -m benchmark.bench_scheduling --devices 200 --slow 5 --flaky 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmark.common import build_switches, quiet_logging, use_benchmark_config
+from benchmark.fake_switch_farm import FakeSwitchFarm
+from network_toolkit.async_ssh_connection import run_show_command_async
+from network_toolkit.fetch_timing import measure_run
+from network_toolkit.job_scheduler import DeviceHistory, path_history_file
+from network_toolkit.ssh_connection import run_show_command
+from network_toolkit.ssh_session_pool import close_session_pool
+
+COMMAND = "show derived-config | begin interface"
+
+
+def _run(name, run, addresses, farm):
+    switches = build_switches(addresses)
+    farm.dropped_flaky_connections.clear()
+    with measure_run(COMMAND, switches) as run_timing:
+        start = time.perf_counter()
+        result = run(switches, COMMAND)
+        duration = time.perf_counter() - start
+    # Every run logs in again
+    close_session_pool()
+    device_history = DeviceHistory.load(path_history_file())
+    device_history.update(run_timing)
+    device_history.save()
+
+    collected = sum(1 for switch in result.values() if switch["eth_interfaces"])
+    print(f"{name:<24} {duration:8.2f}s  {collected}/{len(addresses)} collected  {sum(run_timing.retries.values())} retries")
+    return run_timing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds the fake switch needs per command")
+    parser.add_argument("--slow", type=int, default=5, help="Slow switches at the end of the list")
+    parser.add_argument("--slow-factor", type=int, default=50)
+    parser.add_argument("--flaky", type=int, default=10, help="Switches, which drop their first connection")
+    parser.add_argument("--sessions", type=int, default=15, help="number_of_worker_threads (asyncio: max_concurrent_sessions)")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--engine", choices=("thread", "asyncio"), default="thread")
+    args = parser.parse_args()
+
+    quiet_logging()
+    use_benchmark_config(ssh_port=args.port, collection_engine=args.engine, number_of_worker_threads=args.sessions,
+                         max_concurrent_sessions=args.sessions)
+    run = run_show_command_async if args.engine == "asyncio" else run_show_command
+    addresses = FakeSwitchFarm.addresses(args.devices)
+    farm = FakeSwitchFarm(port=args.port, latency=args.latency, slow=addresses[-args.slow:] if args.slow else (),
+                          slow_factor=args.slow_factor, flaky=addresses[::max(1, args.devices // max(1, args.flaky))][:args.flaky])
+    farm.start_in_thread()
+
+    working_directory = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # The device history is kept in the working directory
+            os.chdir(temp_dir)
+            run_timing = _run("list order (1st run)", run, addresses, farm)
+            _run("slowest first (2nd run)", run, addresses, farm)
+    finally:
+        os.chdir(working_directory)
+        farm.stop_in_thread()
+
+    device_seconds = [sum(phases.get(phase, 0.0) for phase in ("tcp_connect", "ssh_login", "command")) for phases in run_timing.devices.values()]
+    print(f"{'lower bound':<24} {max(max(device_seconds), sum(device_seconds) / args.sessions):8.2f}s  "
+          f"(slowest switch {max(device_seconds):.2f}s, all switches / sessions {sum(device_seconds) / args.sessions:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Times the diff of two config files of a large fleet, which differ in a few interfaces.
+
+The first diff of a file builds its hash manifest, later diffs only compare hashes and read the changed switches.
+Every result is compared with a diff of all switches.
+
+Usage (from the repository root):
+    python -m benchmark.bench_snapshot_diff --switches 2000 --changes 20
+"""
+import argparse
+import copy
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark.common import build_parsed_cli_output, quiet_logging
+from network_toolkit.snapshot import write_compact_snapshot, write_snapshot_with_delta
+from network_toolkit.tool.snapshot_diff import _diff_switch, diff_snapshots
+
+
+def _change_interfaces(parsed_cli_output, changes, rnd):
+    changed_output = copy.deepcopy(parsed_cli_output)
+    for _ in range(changes):
+        eth_interfaces = changed_output[rnd.choice(list(changed_output))]["eth_interfaces"]
+        int_name = rnd.choice(list(eth_interfaces))
+        if rnd.random() < 0.1:
+            del eth_interfaces[int_name]
+        else:
+            eth_interfaces[int_name] = eth_interfaces[int_name] + ["description changed by bench", "shutdown"]
+    return changed_output
+
+
+def _brute_force_diff(old_output, new_output):
+    changed_switches = {}
+    for switch_ip in sorted(old_output.keys() & new_output.keys()):
+        switch_diff = _diff_switch(old_output[switch_ip], new_output[switch_ip])
+        if switch_diff:
+            changed_switches[switch_ip + " - " + new_output[switch_ip]["hostname"]] = switch_diff
+    return changed_switches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--switches", type=int, default=2000)
+    parser.add_argument("--changes", type=int, default=20, help="Number of changed interfaces")
+    args = parser.parse_args()
+
+    quiet_logging()
+    rnd = random.Random(0)
+    old_output = build_parsed_cli_output(args.switches)
+    new_output = _change_interfaces(old_output, args.changes, rnd)
+    expected = _brute_force_diff(old_output, new_output)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path_directory = Path(temp_dir)
+        for file_format in ("json", "compact", "delta"):
+            if file_format == "json":
+                path_old_file, path_new_file = path_directory / "2022-01-01T06-00-00.json", path_directory / "2022-01-02T06-00-00.json"
+                for path_file, parsed_cli_output in ((path_old_file, old_output), (path_new_file, new_output)):
+                    with open(path_file, "x") as json_file:
+                        json.dump(parsed_cli_output, json_file, indent=2)
+            elif file_format == "compact":
+                path_old_file = write_compact_snapshot(old_output, path_directory / "2022-01-01T06-00-00.ntks")
+                path_new_file = write_compact_snapshot(new_output, path_directory / "2022-01-02T06-00-00.ntks")
+            else:
+                delta_directory = path_directory / "delta"
+                delta_directory.mkdir()
+                path_old_file = write_snapshot_with_delta(old_output, delta_directory, "2022-01-01T06-00-00")
+                path_new_file = write_snapshot_with_delta(new_output, delta_directory, "2022-01-02T06-00-00")
+
+            for run in ("cold", "warm"):
+                start = time.perf_counter()
+                diff_result = diff_snapshots(path_old_file, path_new_file)
+                duration = time.perf_counter() - start
+                print(f"{file_format:<8} {run:<5} {duration * 1000:8.0f} ms  {len(diff_result['changed_switches'])} switches changed, "
+                      f"result {'matches' if diff_result['changed_switches'] == expected else 'DIFFERS from'} the full diff")
+
+
+if __name__ == "__main__":
+    main()
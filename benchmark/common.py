@@ -0,0 +1,61 @@
+"""Helpers shared by the benchmark scripts"""
+import dataclasses
+import logging
+
+import network_toolkit.config as config
+from network_toolkit.config.global_config import GlobalConfiguration
+from network_toolkit.inventory.network_switch import NetworkSwitch
+
+
+def use_benchmark_config(**overrides):
+    """Replaces the global config with one that points to the local fake switch farm"""
+    values = {
+        "ssh_username": "bench",
+        "ssh_password": "bench",
+        "path_to_csv_file": "switchlist.csv",
+        "ssh_port": 2222,
+        "ssh_timeout": 2,
+        "number_of_worker_threads": 15,
+        "debug_mode": False,
+        "skip_ssh_reachability_check": False,
+        "skip_ssh_authentication_check": False,
+        "input_source": "csv",
+    }
+    values.update(overrides)
+    config.GLOBAL_CONFIG = GlobalConfiguration(**values)
+    return config.GLOBAL_CONFIG
+
+
+def replace_config(**changes):
+    config.GLOBAL_CONFIG = dataclasses.replace(config.GLOBAL_CONFIG, **changes)
+    return config.GLOBAL_CONFIG
+
+
+def build_switches(addresses, os="cisco_ios"):
+    return [NetworkSwitch(hostname="bench-" + ip.replace(".", "-"), ip=ip, os=os, reachable=True, line_number=0) for ip in addresses]
+
+
+def build_parsed_cli_output(switch_count, stack_members=2):
+    """Returns the parsed cli output of a fleet of switches with generated config, like a fetch stores it"""
+    from benchmark.config_generator import generate_derived_config
+
+    parsed_cli_output = {}
+    for number in range(switch_count):
+        switch_element = NetworkSwitch(hostname=f"bench-{number}", ip=f"10.0.{number // 256}.{number % 256}", os="cisco_ios", reachable=True, line_number=0)
+        switch_element.parse_interface_cli_output(generate_derived_config(switch_element.hostname, stack_members=stack_members))
+        parsed_cli_output[switch_element.ip] = switch_element.snapshot_entry()
+    return parsed_cli_output
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Returns the given percentiles (nearest rank) and the maximum of the values, e.g. {"p50": ..., "max": ...}"""
+    values = sorted(values)
+    if not values:
+        return {}
+    result = {f"p{point}": values[min(len(values) - 1, max(0, round(point / 100 * len(values)) - 1))] for point in points}
+    result["max"] = values[-1]
+    return result
+
+
+def quiet_logging():
+    logging.basicConfig(format="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%dT%H:%M:%SZ", level=logging.WARNING)
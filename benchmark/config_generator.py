@@ -0,0 +1,99 @@
+"""Generates synthetic 'show derived-config | begin interface' output for benchmarks"""
+import random
+
+ACCESS_LINES = [
+    "description Access Port",
+    "switchport access vlan {vlan}",
+    "switchport mode access",
+    "switchport voice vlan 200",
+    "switchport port-security maximum 3",
+    "switchport port-security",
+    "authentication port-control auto",
+    "authentication periodic",
+    "mab",
+    "dot1x pae authenticator",
+    "storm-control broadcast level 10.00",
+    "spanning-tree portfast",
+    "spanning-tree bpduguard enable",
+    "service-policy input ACCESS-IN",
+    "ip dhcp snooping limit rate 15",
+]
+
+# Used for interfaces with more config lines than ACCESS_LINES offers
+EXTRA_LINES = [
+    "authentication event server dead action authorize vlan {vlan}",
+    "authentication event server alive action reinitialize",
+    "authentication host-mode multi-auth",
+    "authentication order dot1x mab",
+    "authentication priority dot1x mab",
+    "authentication timer reauthenticate server",
+    "authentication violation restrict",
+    "ip access-group ACL-DEFAULT in",
+    "srr-queue bandwidth share 1 30 35 5",
+    "priority-queue out",
+    "mls qos trust device cisco-phone",
+    "auto qos voip cisco-phone",
+]
+
+UPLINK_LINES = [
+    "description Uplink",
+    "switchport trunk allowed vlan 1,100-120,200",
+    "switchport mode trunk",
+    "ip dhcp snooping trust",
+    "channel-group 1 mode active",
+]
+
+
+def generate_derived_config(hostname, stack_members=1, ports_per_member=48, lines_per_interface=8, seed=None):
+    """Returns the interface section of a stack with the given size as the switch would print it"""
+    rnd = random.Random(seed if seed is not None else hostname)
+    lines = []
+
+    for member in range(1, stack_members + 1):
+        for port in range(1, ports_per_member + 1):
+            lines.append(f"interface GigabitEthernet{member}/0/{port}")
+            config_lines = (ACCESS_LINES + EXTRA_LINES * (lines_per_interface // len(EXTRA_LINES) + 1))[:max(lines_per_interface, 1)]
+            if rnd.random() < 0.1:
+                config_lines = config_lines + ["shutdown"]
+            for config_line in config_lines:
+                lines.append(" " + config_line.format(vlan=rnd.randint(100, 120)))
+            lines.append("!")
+        for port in range(1, 5):
+            lines.append(f"interface TenGigabitEthernet{member}/1/{port}")
+            lines.extend(" " + config_line for config_line in UPLINK_LINES)
+            lines.append("!")
+
+    lines.append("interface GigabitEthernet0/0")
+    lines.append(" vrf forwarding Mgmt-vrf")
+    lines.append(" no ip address")
+    lines.append("!")
+    lines.append("interface Vlan1")
+    lines.append(" no ip address")
+    lines.append(" shutdown")
+    lines.append("!")
+    lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def edge_mac(switch_number, member, port):
+    """Returns the MAC of the device on the access port as integer, unique across the fleet"""
+    return 0x001A2B000000 + switch_number * 4096 + member * 64 + port
+
+
+def generate_mac_address_table(switch_number, stack_members=1, ports_per_member=48, uplink_macs=20):
+    """Returns 'show mac address-table' of the stack with one device per access port, the uplink TenGigabitEthernet1/1/1
+    learns the devices of the next switch"""
+    def format_mac(mac):
+        hex_mac = f"{mac:012x}"
+        return f"{hex_mac[0:4]}.{hex_mac[4:8]}.{hex_mac[8:12]}"
+
+    lines = ["          Mac Address Table", "-------------------------------------------", "",
+             "Vlan    Mac Address       Type        Ports", "----    -----------       --------    -----",
+             " All    0100.0ccc.cccc    STATIC      CPU"]
+    for member in range(1, stack_members + 1):
+        for port in range(1, ports_per_member + 1):
+            lines.append(f" {100 + port % 21:>3}    {format_mac(edge_mac(switch_number, member, port))}    DYNAMIC     Gi{member}/0/{port}")
+    for port in range(1, min(uplink_macs, ports_per_member) + 1):
+        lines.append(f" {100 + port % 21:>3}    {format_mac(edge_mac(switch_number + 1, 1, port))}    DYNAMIC     Te1/1/1")
+    lines.append(f"Total Mac Addresses for this criterion: {len(lines) - 5}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,93 @@
+"""Local HTTP stand-in for the macvendors.com lookup API.
+
+Answers GET /v1/lookup/<mac> like the real API: 200 with the organisation, 404 for unknown OUIs and 429 above its
+rate limit. Optionally it answers a share of the requests with 503 and delays every answer.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _LookupHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self, status_code, body=None, headers=None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        api = self.server.api
+        with api.lock:
+            api.request_count += 1
+        time.sleep(api.latency)
+
+        if not api.has_capacity():
+            with api.lock:
+                api.rejected_count += 1
+            self._answer(429, {"errors": {"detail": "Too Many Requests"}}, {"Retry-After": "1"})
+            return
+        if api.error_rate and api.random.random() < api.error_rate:
+            self._answer(503, {"errors": {"detail": "Service Unavailable"}})
+            return
+
+        formatted_mac = self.path.rsplit("/", 1)[-1].upper()
+        if formatted_mac.startswith(api.unknown_prefix):
+            self._answer(404, {"errors": {"detail": "Not Found"}})
+            return
+        self._answer(200, {"data": {"organization_name": f"Vendor {formatted_mac[:6]}", "assignment": formatted_mac[:6]}})
+
+
+class FakeMacVendorsApi:
+    def __init__(self, port=8765, rate=None, latency=0.05, error_rate=0.0, unknown_prefix="FF"):
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.unknown_prefix = unknown_prefix
+        self.request_count = 0
+        self.rejected_count = 0
+
+        self.lock = threading.Lock()
+        self.random = random.Random(0)
+        self._rate = rate
+        self._allowance = rate
+        self._last_check = time.monotonic()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/v1/lookup/"
+
+    def has_capacity(self):
+        """Enforces 'rate' requests per second (burst of one second), like the limits of the real API plans"""
+        if self._rate is None:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self._allowance = min(self._rate, self._allowance + (now - self._last_check) * self._rate)
+            self._last_check = now
+            if self._allowance < 1:
+                return False
+            self._allowance -= 1
+            return True
+
+    def start_in_thread(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), _LookupHandler)
+        self._server.daemon_threads = True
+        self._server.api = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop_in_thread(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
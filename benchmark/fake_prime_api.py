@@ -0,0 +1,144 @@
+"""Local HTTP mock of the Devices resource of the Prime Infrastructure API v4.
+
+Answers GET /webacs/api/v4/data/Devices.json with '.full=true', '.firstResult' and '.maxResults' like Prime: the
+devices are sorted by name, '@count' holds the number of all devices and more than 1000 devices per page are
+refused. 'collectionTime=gt(<epoch ms>)' filters on the collection time. Requests above 'max_concurrent_requests'
+get 503, like the rate limit of Prime does.
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+DEVICES_PATH = "/webacs/api/v4/data/Devices.json"
+
+
+class _PrimeHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self, status_code, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        prime = self.server.prime
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+
+        if url.path != DEVICES_PATH:
+            self._answer(404, {"errorDocument": {"message": "Not Found"}})
+            return
+        if self.headers.get("Authorization") != prime.authorization:
+            self._answer(401, {"errorDocument": {"message": "Unauthorized"}})
+            return
+        if not prime.enter():
+            self._answer(503, {"errorDocument": {"message": "Rate limit exceeded"}})
+            return
+        try:
+            first_result = int(query.get(".firstResult", 0))
+            max_results = int(query.get(".maxResults", 100))
+            if max_results > 1000 and query.get(".full") == "true":
+                self._answer(503, {"errorDocument": {"message": "Too many results requested"}})
+                return
+            matching_devices = prime.devices
+            collection_time_filter = query.get("collectionTime", "")
+            if collection_time_filter.startswith("gt("):
+                collected_after = int(collection_time_filter[3:-1])
+                matching_devices = [device for device in prime.devices if _epoch_milliseconds(device["collectionTime"]) > collected_after]
+            devices = matching_devices[first_result:first_result + max_results]
+            time.sleep(prime.latency + prime.latency_per_device * len(devices))
+            self._answer(200, {"queryResponse": {
+                "@type": "Devices",
+                "@rootUrl": f"http://{self.headers.get('Host')}/webacs/api/v4/data",
+                "@requestUrl": f"http://{self.headers.get('Host')}{self.path}",
+                "@responseType": "listEntityInstances",
+                "@count": len(matching_devices),
+                "@first": first_result,
+                "@last": first_result + len(devices) - 1,
+                "entity": [{"@dtoType": "devicesDTO", "@type": "Devices", "devicesDTO": device} for device in devices]}})
+        finally:
+            prime.leave()
+
+
+def _epoch_milliseconds(collection_time):
+    return round(datetime.fromisoformat(collection_time).timestamp() * 1000)
+
+
+def generate_devices(count, start_time=None):
+    """Returns 'devicesDTO' entries of count switches, sorted by name like '.sort=deviceName' does"""
+    start_time = start_time or datetime(2022, 1, 1)
+    devices = []
+    for number in range(count):
+        devices.append({
+            "@displayName": str(1000 + number),
+            "@id": 1000 + number,
+            "adminStatus": "MANAGED",
+            "collectionTime": (start_time + timedelta(minutes=number)).strftime("%Y-%m-%dT%H:%M:%S.000+00:00"),
+            "deviceName": f"sw-{number:05d}",
+            "ipAddress": f"10.{number // 65536}.{number // 256 % 256}.{number % 256}",
+            "productFamily": "Switches and Hubs",
+            "reachability": "REACHABLE",
+            "softwareType": "IOS-XE" if number % 2 else "IOS",
+        })
+    return devices
+
+
+class FakePrimeApi:
+    def __init__(self, port=8766, device_count=6000, latency=0.2, latency_per_device=0.0002, max_concurrent_requests=5,
+                 username="prime", password="prime"):
+        self.port = port
+        self.devices = generate_devices(device_count)
+        self.latency = latency
+        self.latency_per_device = latency_per_device
+        self.max_concurrent_requests = max_concurrent_requests
+        self.authorization = "Basic " + base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+        self.request_count = 0
+        self.rejected_count = 0
+
+        self._lock = threading.Lock()
+        self._active_requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def enter(self):
+        with self._lock:
+            self.request_count += 1
+            if self._active_requests >= self.max_concurrent_requests:
+                self.rejected_count += 1
+                return False
+            self._active_requests += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._active_requests -= 1
+
+    def collect_again(self, device_numbers):
+        """Sets the collection time of the devices to now, like an inventory collection of Prime does"""
+        collection_time = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        for device_number in device_numbers:
+            self.devices[device_number]["collectionTime"] = collection_time
+
+    def start_in_thread(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), _PrimeHandler)
+        self._server.daemon_threads = True
+        self._server.prime = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop_in_thread(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,190 @@
+"""Local SSH server, which impersonates a farm of Cisco switches for benchmarks.
+
+The server listens on 0.0.0.0 and tells the devices apart by the loopback address the client connected to, so every
+address in 127.0.0.0/8 is its own switch (Linux routes the whole range to lo). It answers exec requests (asyncssh)
+as well as interactive shells (netmiko).
+
+Every command takes 'latency' plus a random share of 'jitter' seconds. Single switches can be made to fail: switches in
+'auth_failures' reject the password, switches in 'dropped' close the connection right after it was accepted and
+switches in 'slow' answer 'slow_factor' times slower, like a switch behind a WAN link. Switches in 'flaky' drop their
+first 'flaky_failures' connections and work afterwards.
+
+With 'aaa_capacity', every login asks a simulated AAA server (TACACS+), which needs 'aaa_latency' seconds per login. It
+handles 'aaa_capacity' logins at once, more logins queue up and take longer, above twice the capacity it rejects them.
+"""
+import asyncio
+import logging
+import random
+import threading
+
+import asyncssh
+
+from benchmark.config_generator import generate_derived_config, generate_mac_address_table
+
+logging.getLogger("asyncssh").setLevel(logging.WARNING)
+
+
+class _FakeSwitchServer(asyncssh.SSHServer):
+    def __init__(self, farm):
+        self.farm = farm
+
+    def connection_made(self, conn):
+        self.farm.login_count += 1
+        self.ip = conn.get_extra_info("sockname")[0]
+        if self.ip in self.farm.dropped or self.farm.drop_flaky_connection(self.ip):
+            conn.abort()
+
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    async def validate_password(self, username, password):
+        if not await self.farm.authenticate_at_aaa_server():
+            return False
+        return self.ip not in self.farm.auth_failures
+
+
+class FakeSwitchFarm:
+    def __init__(self, port=2222, latency=0.0, stack_members=1, ports_per_member=48, lines_per_interface=8,
+                 jitter=0.0, auth_failures=(), dropped=(), slow=(), slow_factor=10, seed=0, aaa_capacity=None, aaa_latency=0.05,
+                 flaky=(), flaky_failures=1):
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.auth_failures = set(auth_failures)
+        self.dropped = set(dropped)
+        self.slow = set(slow)
+        self.slow_factor = slow_factor
+        self.flaky = set(flaky)
+        self.flaky_failures = flaky_failures
+        self.dropped_flaky_connections = {}  # ip -> connections dropped so far
+        self._random = random.Random(seed)
+        self.stack_members = stack_members
+        self.ports_per_member = ports_per_member
+        self.lines_per_interface = lines_per_interface
+
+        self.aaa_capacity = aaa_capacity
+        self.aaa_latency = aaa_latency
+        self.rejected_logins = 0
+        self._logins_at_aaa_server = 0
+
+        self.login_count = 0
+        # ip -> timestamp, which the switch reports as its last config change
+        self.config_changed_at = {}
+
+        self._configs = {}
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    @staticmethod
+    def addresses(device_count):
+        """Returns the loopback addresses of the first device_count switches"""
+        return [f"127.1.{index // 250}.{index % 250 + 1}" for index in range(device_count)]
+
+    def _derived_config(self, ip):
+        if ip not in self._configs:
+            self._configs[ip] = generate_derived_config(self._hostname(ip), self.stack_members, self.ports_per_member, self.lines_per_interface)
+        return self._configs[ip]
+
+    @staticmethod
+    def switch_number(ip):
+        """Position of the switch in addresses()"""
+        _, _, block, host = ip.split(".")
+        return int(block) * 250 + int(host) - 1
+
+    def _delay(self, ip):
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        return delay * self.slow_factor if ip in self.slow else delay
+
+    def drop_flaky_connection(self, ip):
+        if ip not in self.flaky or self.dropped_flaky_connections.get(ip, 0) >= self.flaky_failures:
+            return False
+        self.dropped_flaky_connections[ip] = self.dropped_flaky_connections.get(ip, 0) + 1
+        return True
+
+    async def authenticate_at_aaa_server(self):
+        """Returns False, if the AAA server is overloaded"""
+        if self.aaa_capacity is None:
+            return True
+        if self._logins_at_aaa_server >= 2 * self.aaa_capacity:
+            self.rejected_logins += 1
+            return False
+        self._logins_at_aaa_server += 1
+        try:
+            await asyncio.sleep(self.aaa_latency * max(1.0, self._logins_at_aaa_server / self.aaa_capacity))
+        finally:
+            self._logins_at_aaa_server -= 1
+        return True
+
+    @staticmethod
+    def _hostname(ip):
+        return "bench-" + ip.replace(".", "-")
+
+    def _respond(self, ip, command):
+        command = command.strip()
+        if command.endswith("include Last configuration change"):
+            return f"! Last configuration change at {self.config_changed_at.get(ip, '10:00:00 UTC Mon May 2 2022')} by admin\n"
+        if command.startswith("show derived-config") or command.startswith("show running-config"):
+            return self._derived_config(ip)
+        if command == "show mac address-table":
+            return generate_mac_address_table(self.switch_number(ip), self.stack_members, self.ports_per_member)
+        if command == "show privilege":
+            return "Current privilege level is 15\n"
+        return ""
+
+    async def _handle_process(self, process):
+        ip = process.get_extra_info("sockname")[0]
+        prompt = self._hostname(ip) + "#"
+
+        if process.command is not None:
+            await asyncio.sleep(self._delay(ip))
+            process.stdout.write(self._respond(ip, process.command))
+            process.exit(0)
+            return
+
+        process.stdout.write("\n" + prompt)
+        try:
+            async for line in process.stdin:
+                if line.strip() == "exit":
+                    break
+                if line.strip():
+                    await asyncio.sleep(self._delay(ip))
+                process.stdout.write(self._respond(ip, line) + "\n" + prompt)
+        except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged, asyncssh.ConnectionLost):
+            pass
+        process.exit(0)
+
+    async def start(self):
+        host_key = asyncssh.generate_private_key("ssh-rsa")
+        self._server = await asyncssh.create_server(lambda: _FakeSwitchServer(self), "", self.port, server_host_keys=[host_key],
+                                                    process_factory=self._handle_process, line_editor=True)
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        # Sessions, which the clients kept open, would otherwise outlive the farm
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    def start_in_thread(self):
+        """Runs the farm on its own event loop, so blocking clients can be benchmarked from the main thread"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_in_thread(self):
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
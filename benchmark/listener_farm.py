@@ -0,0 +1,67 @@
+"""Local TCP listeners, which play reachable and unreachable switches for the reachability check.
+
+Reachable hosts accept and close every connection. Unreachable hosts are listeners with a full accept queue: the
+kernel drops further SYNs, so a connect to them runs into its timeout like one to a switch, which is down.
+Every host is its own address in 127.0.0.0/8 (Linux only).
+"""
+import selectors
+import socket
+import threading
+
+
+class ListenerFarm:
+    def __init__(self, port=2223, reachable=100, unreachable=100):
+        self.port = port
+        self.reachable_addresses = [f"127.4.{host // 250}.{host % 250 + 1}" for host in range(reachable)]
+        self.unreachable_addresses = [f"127.5.{host // 250}.{host % 250 + 1}" for host in range(unreachable)]
+
+        self._selector = selectors.DefaultSelector()
+        self._sockets = []
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def addresses(self):
+        return self.reachable_addresses + self.unreachable_addresses
+
+    def _listen(self, address, backlog):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((address, self.port))
+        listener.listen(backlog)
+        self._sockets.append(listener)
+        return listener
+
+    def _accept_loop(self):
+        while not self._stop_event.is_set():
+            for key, _ in self._selector.select(timeout=0.1):
+                try:
+                    connection, _ = key.fileobj.accept()
+                    connection.close()
+                except BlockingIOError:
+                    pass
+
+    def start_in_thread(self):
+        for address in self.reachable_addresses:
+            listener = self._listen(address, 128)
+            listener.setblocking(False)
+            self._selector.register(listener, selectors.EVENT_READ)
+
+        for address in self.unreachable_addresses:
+            self._listen(address, 0)
+            # Two pending connections fill the queue of a listener with backlog 0
+            for _ in range(2):
+                filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                filler.setblocking(False)
+                filler.connect_ex((address, self.port))
+                self._sockets.append(filler)
+
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+
+    def stop_in_thread(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._selector.close()
+        for sock in self._sockets:
+            sock.close()
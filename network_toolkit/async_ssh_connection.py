@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import socket
+import time
+
+import asyncssh
+from alive_progress import alive_bar
+
+import network_toolkit.config as config
+from network_toolkit import fetch_timing
+from network_toolkit.concurrency_limit import create_session_limit, describe_session_limit
+from network_toolkit.job_scheduler import run_in_asyncio
+
+logging.getLogger("asyncssh").setLevel(logging.WARNING)
+
+# Upper bound for TCP connect, key exchange and login of a single session
+SSH_LOGIN_TIMEOUT = 30
+
+
+def run_show_command_async(switches, cli_show_command):
+    """Runs the cli command on all the switches, using one asyncio event loop instead of a thread per session"""
+    logging.info(f"Starting to execute '{cli_show_command}' on {len(switches)} switches "
+                 f"(asyncio, {describe_session_limit(async_engine=True)})...")
+    return asyncio.run(_run_show_command(switches, cli_show_command))
+
+
+async def _run_show_command(switches, cli_show_command):
+    session_limit = create_session_limit(async_engine=True)
+
+    async def run_job(switch_element, timeout_factor, submitted_at, retry):
+        return await run_command_in_slot(switch_element, cli_show_command, session_limit, timeout_factor, submitted_at, retry)
+
+    with alive_bar(total=len(switches)) as bar:
+        async for switch_element, raw_cli_output in run_in_asyncio(switches, run_job):
+            with fetch_timing.measure(switch_element.ip, "parse"):
+                switch_element.parse_interface_cli_output(raw_cli_output)
+            bar()
+    session_limit.finish()
+
+    # Keep the order of the input, like the thread engine does
+    return {switch_element.ip: switch_element.snapshot_entry() for switch_element in switches}
+
+
+def run_raw_command_async(switches, cli_show_command):
+    """Runs the cli command on all the switches and returns the unparsed output per IP"""
+    logging.info(f"Starting to execute '{cli_show_command}' on {len(switches)} switches "
+                 f"(asyncio, {describe_session_limit(async_engine=True)})...")
+    return asyncio.run(_run_raw_command(switches, cli_show_command))
+
+
+async def _run_raw_command(switches, cli_show_command):
+    session_limit = create_session_limit(async_engine=True)
+
+    async def run_job(switch_element, timeout_factor, submitted_at, retry):
+        return await run_command_in_slot(switch_element, cli_show_command, session_limit, timeout_factor, submitted_at, retry)
+
+    raw_cli_outputs = {}
+    with alive_bar(total=len(switches)) as bar:
+        async for switch_element, raw_cli_output in run_in_asyncio(switches, run_job):
+            raw_cli_outputs[switch_element.ip] = raw_cli_output
+            bar()
+    session_limit.finish()
+    return raw_cli_outputs
+
+
+async def run_command_in_slot(switch_element, command, session_limit, timeout_factor=1, submitted_at=None, retry=False):
+    """Runs the command, as soon as session_limit has a free slot (a retry before all others), and reports the result
+    to the limit. Returns (raw cli output, reason of the failure or None)."""
+    async with session_limit.slot(first=retry) as job:
+        if submitted_at is not None:
+            fetch_timing.record(switch_element.ip, "queue_wait", time.perf_counter() - submitted_at)
+        raw_cli_output, job.failure = await try_command_on_switch(switch_element, command, timeout_factor)
+    return raw_cli_output, job.failure
+
+
+async def run_command_on_switch(switch_element, command):
+    """Connects via ssh to the switch and runs the given command as exec request"""
+    raw_cli_output, _ = await try_command_on_switch(switch_element, command)
+    return raw_cli_output
+
+
+async def try_command_on_switch(switch_element, command, timeout_factor=1):
+    """Like run_command_on_switch, but returns (raw cli output, reason of the failure or None). The connect and login
+    timeouts are multiplied by timeout_factor."""
+    ssh_parameter = {
+        'host': switch_element.ip,
+        'port': config.GLOBAL_CONFIG.ssh_port,
+        'username': config.GLOBAL_CONFIG.ssh_username,
+        'password': config.GLOBAL_CONFIG.ssh_password,
+        'known_hosts': None,
+        'login_timeout': SSH_LOGIN_TIMEOUT * timeout_factor
+        }
+
+    raw_cli_output = ""
+    failure = None
+    try:
+        with fetch_timing.measure(switch_element.ip, "tcp_connect"):
+            sock = await _open_socket(switch_element.ip, config.GLOBAL_CONFIG.ssh_port, config.GLOBAL_CONFIG.ssh_timeout * timeout_factor)
+        with fetch_timing.measure(switch_element.ip, "ssh_login"):
+            ssh_connection = await asyncssh.connect(**ssh_parameter, sock=sock)
+        async with ssh_connection:
+            with fetch_timing.measure(switch_element.ip, "command"):
+                result = await ssh_connection.run(command, check=False)
+            raw_cli_output = result.stdout
+    except asyncssh.PermissionDenied:
+        logging.warning(f"Authentication failed for {switch_element.ip}")
+        failure = "authentication"
+    except (asyncio.TimeoutError, OSError):
+        logging.warning(f"SSH timeout for {switch_element.ip}")
+        failure = "timeout"
+    except asyncssh.Error:
+        logging.warning(f"SSH not enabled or could not be negotiated for {switch_element.ip}")
+        failure = "ssh"
+    except Exception:
+        logging.exception(f"Unexpected error on {switch_element.ip}")
+        failure = "error"
+
+    return raw_cli_output, failure
+
+
+async def _open_socket(ip, port, timeout):
+    """Opens the TCP connection for asyncssh, so the handshake gets timed apart from the SSH login"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (ip, port)), timeout)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
@@ -0,0 +1,208 @@
+"""Collection as pipeline of three stages, which stream every switch to disk as soon as it is parsed:
+
+    fetch   SSH worker threads (or the asyncio engine) run the command and hand over the raw output, see job_scheduler
+    parse   one thread parses the raw outputs, or spreads them over 'parser_processes' processes to avoid the GIL
+    write   the calling thread hands every parsed switch to the snapshot writer, e.g. NdjsonSnapshotWriter
+
+The stages are connected by queues of 'pipeline_queue_size' entries. A full queue blocks the stage in front of it, so
+at most a few hundred raw outputs and parsed switches are in memory, no matter how many switches get collected.
+Switches arrive at the writer in the order they finished, not in the order of the input.
+"""
+import asyncio
+import gc
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from alive_progress import alive_bar
+
+import network_toolkit.config as config
+from network_toolkit import fetch_timing
+from network_toolkit.concurrency_limit import create_session_limit, describe_session_limit
+from network_toolkit.job_scheduler import run_in_asyncio, run_in_threads
+
+# Marks the end of the items of a stage
+_END = object()
+# Seconds a blocked stage waits, before it checks if the pipeline got stopped
+_POLL_INTERVAL = 0.2
+
+
+def _put(target_queue, item, stop_event):
+    """Blocks while the queue is full. Returns False, if the pipeline got stopped meanwhile."""
+    while not stop_event.is_set():
+        try:
+            target_queue.put(item, timeout=_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source_queue, stop_event):
+    """Blocks while the queue is empty. Returns _END, if the pipeline got stopped meanwhile."""
+    while not stop_event.is_set():
+        try:
+            return source_queue.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def parse_switch(switch_element, raw_cli_output):
+    """Parses the raw output of one switch and returns (ip, snapshot entry, seconds). Runs in parser processes, too."""
+    start = time.perf_counter()
+    switch_element.parse_interface_cli_output(raw_cli_output)
+    switch_entry = switch_element.snapshot_entry()
+    # The list of switches lives as long as the collection, their config only until it is written
+    switch_element.interface_eth_config = {}
+    return switch_element.ip, switch_entry, time.perf_counter() - start
+
+
+def _fetch_worker(switch_element, command, session_limit, timeout_factor, submitted_at, retry, stop_event):
+    from network_toolkit.ssh_connection import try_command_on_switch
+
+    with session_limit.slot(first=retry) as job:
+        if stop_event.is_set():
+            job.failure = "stopped"
+            return "", job.failure
+        fetch_timing.record(switch_element.ip, "queue_wait", time.perf_counter() - submitted_at)
+        raw_cli_output, job.failure = try_command_on_switch(switch_element, command, timeout_factor)
+    return raw_cli_output, job.failure
+
+
+def _fetch_with_threads(switches, command, parse_queue, stop_event):
+    session_limit = create_session_limit()
+
+    def run_job(switch_element, timeout_factor, submitted_at, retry):
+        return _fetch_worker(switch_element, command, session_limit, timeout_factor, submitted_at, retry, stop_event)
+
+    for switch_element, raw_cli_output in run_in_threads(switches, run_job, session_limit.ceiling):
+        if not _put(parse_queue, (switch_element, raw_cli_output), stop_event):
+            break
+    session_limit.finish()
+
+
+async def _fetch_with_asyncio(switches, command, parse_queue, stop_event):
+    from network_toolkit.async_ssh_connection import try_command_on_switch
+
+    session_limit = create_session_limit(async_engine=True)
+    loop = asyncio.get_running_loop()
+
+    async def run_job(switch_element, timeout_factor, submitted_at, retry):
+        async with session_limit.slot(first=retry) as job:
+            if stop_event.is_set():
+                job.failure = "stopped"
+                return "", job.failure
+            fetch_timing.record(switch_element.ip, "queue_wait", time.perf_counter() - submitted_at)
+            raw_cli_output, job.failure = await try_command_on_switch(switch_element, command, timeout_factor)
+        return raw_cli_output, job.failure
+
+    fetched_switches = run_in_asyncio(switches, run_job)
+    try:
+        async for switch_element, raw_cli_output in fetched_switches:
+            # A full queue must not block the event loop
+            if not await loop.run_in_executor(None, _put, parse_queue, (switch_element, raw_cli_output), stop_event):
+                break
+    finally:
+        await fetched_switches.aclose()
+    session_limit.finish()
+
+
+def _fetch_stage(switches, command, parse_queue, stop_event):
+    if config.GLOBAL_CONFIG.collection_engine == "asyncio":
+        asyncio.run(_fetch_with_asyncio(switches, command, parse_queue, stop_event))
+    else:
+        _fetch_with_threads(switches, command, parse_queue, stop_event)
+
+
+def _forward_parsed_switch(parsed_switch, write_queue, stop_event):
+    ip, switch_entry, seconds = parsed_switch
+    fetch_timing.record(ip, "parse", seconds)
+    _put(write_queue, (ip, switch_entry), stop_event)
+
+
+def _parse_stage(parse_queue, write_queue, stop_event, executor=None):
+    if executor is None:
+        while True:
+            item = _get(parse_queue, stop_event)
+            if item is _END:
+                return
+            _forward_parsed_switch(parse_switch(*item), write_queue, stop_event)
+
+    # Outputs in the processes count to the bound of the pipeline, too
+    max_in_flight = max(config.GLOBAL_CONFIG.pipeline_queue_size, config.GLOBAL_CONFIG.parser_processes)
+    in_flight = deque()
+    while True:
+        item = _get(parse_queue, stop_event)
+        if item is _END:
+            break
+        in_flight.append(executor.submit(parse_switch, *item))
+        while len(in_flight) >= max_in_flight or (in_flight and in_flight[0].done()):
+            _forward_parsed_switch(in_flight.popleft().result(), write_queue, stop_event)
+    while in_flight and not stop_event.is_set():
+        _forward_parsed_switch(in_flight.popleft().result(), write_queue, stop_event)
+
+
+def _start_parser_processes(parser_processes):
+    """Starts the processes before any thread of the pipeline, a fork would copy the locks held by other threads"""
+    executor = ProcessPoolExecutor(max_workers=parser_processes)
+    # With fork, the first task starts all processes at once
+    executor.submit(int).result()
+    return executor
+
+
+def _run_stage(stage, errors, stop_event, next_queue, *args):
+    """Runs the stage in its own thread and passes the end on to the next stage, also if the stage failed"""
+    try:
+        stage(*args)
+    except BaseException as e:
+        errors.append(e)
+        stop_event.set()
+    finally:
+        _put(next_queue, _END, stop_event)
+
+
+def stream_show_command(switches, cli_show_command, snapshot_writer):
+    """Runs the cli command on all the switches and hands every parsed switch to snapshot_writer.write(ip, entry)"""
+    parser_processes = config.GLOBAL_CONFIG.parser_processes
+    logging.info(f"Starting to execute '{cli_show_command}' on {len(switches)} switches "
+                 f"({config.GLOBAL_CONFIG.collection_engine}, {describe_session_limit(config.GLOBAL_CONFIG.collection_engine == 'asyncio')}, "
+                 f"{f'{parser_processes} parser processes' if parser_processes > 0 else 'parser thread'}, "
+                 f"streamed to {snapshot_writer.path.name})...")
+
+    executor = _start_parser_processes(parser_processes) if parser_processes > 0 else None
+    parse_queue = queue.Queue(maxsize=config.GLOBAL_CONFIG.pipeline_queue_size)
+    write_queue = queue.Queue(maxsize=config.GLOBAL_CONFIG.pipeline_queue_size)
+    stop_event = threading.Event()
+    errors = []
+    stages = [threading.Thread(target=_run_stage, args=(_fetch_stage, errors, stop_event, parse_queue, switches, cli_show_command, parse_queue, stop_event),
+                               name="pipeline-fetch", daemon=True),
+              threading.Thread(target=_run_stage, args=(_parse_stage, errors, stop_event, write_queue, parse_queue, write_queue, stop_event, executor),
+                               name="pipeline-parse", daemon=True)]
+    for stage in stages:
+        stage.start()
+
+    try:
+        with alive_bar(total=len(switches)) as bar:
+            while True:
+                item = _get(write_queue, stop_event)
+                if item is _END:
+                    break
+                snapshot_writer.write(*item)
+                bar()
+                if snapshot_writer.switch_count % config.GLOBAL_CONFIG.pipeline_queue_size == 0:
+                    # Closed SSH connections are reference cycles, which keep their buffers until a full collection
+                    gc.collect()
+    finally:
+        # Also on errors of the writer or CTRL+C: the other stages stop after the switches they are working on
+        stop_event.set()
+        for stage in stages:
+            stage.join()
+        if executor is not None:
+            executor.shutdown()
+
+    if errors:
+        raise errors[0]
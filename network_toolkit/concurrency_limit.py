@@ -0,0 +1,229 @@
+"""Limits how many jobs (SSH sessions, reachability probes) run at once. The limit is fixed or adapts to the jobs.
+
+The adaptive limit moves between a floor and a ceiling by additive increase and multiplicative decrease (AIMD), like
+TCP does with its window. A window ends after as many finished jobs as the limit allows at once:
+    - without congestion, the limit grows by one per window (doubles, until the first congestion: slow start)
+    - on congestion, the limit gets halved at once
+
+Congestion means, more than _MAX_ERROR_RATIO of the window failed with timeouts or errors of the login, like they occur
+when the AAA server or the vty lines of the switches are overloaded, or the median latency of the window is more than
+_LATENCY_TOLERANCE times the baseline. The baseline is the lowest median of the last windows, so it follows a fleet,
+whose latency changes slowly, e.g. WAN switches at the end of the list. Jobs started before the last decrease don't
+count, they ran under the old limit.
+"""
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+import network_toolkit.config as config
+from network_toolkit import fetch_timing
+
+# Failures of a job, which point to overload instead of a broken switch
+CONGESTION_FAILURES = ("timeout", "authentication", "ssh")
+
+_MAX_ERROR_RATIO = 0.1
+_LATENCY_TOLERANCE = 2.0
+# Latency rises below this many seconds are jitter, e.g. of probes within the LAN
+_MIN_LATENCY_RISE = 0.05
+_MIN_LATENCY_SAMPLES = 3
+_BASELINE_WINDOWS = 20
+_DECREASE_FACTOR = 0.5
+
+
+class Job:
+    """One job holding a slot of the limit. Set 'failure' to the reason, if the job failed."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.failure = None
+
+
+class ConcurrencyLimit:
+    """Limit between floor and ceiling, starting at initial. With floor == ceiling the limit is fixed."""
+
+    def __init__(self, name, floor, ceiling, initial=None):
+        self.name = name
+        self.ceiling = max(1, ceiling)
+        self.floor = min(max(1, floor), self.ceiling)
+        self.limit = min(self.ceiling, max(self.floor, initial or self.floor))
+        self.adaptive = self.floor < self.ceiling
+        self.running = 0
+
+        self._start = time.monotonic()
+        self.history = [(0.0, self.limit)]  # (seconds since start, limit)
+        self._slow_start = True
+        self._last_decrease = self._start
+        self._baseline_medians = deque(maxlen=_BASELINE_WINDOWS)
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_jobs = 0
+        self._window_congested = 0
+        self._window_latencies = []
+
+    def _free_slots(self):
+        return max(0, self.limit - self.running)
+
+    def _record(self, job):
+        """Feeds the finished job into the limit. Threads call it while holding the lock."""
+        if not self.adaptive or job.started_at < self._last_decrease:
+            return
+        self._window_jobs += 1
+        if job.failure in CONGESTION_FAILURES:
+            self._window_congested += 1
+        elif job.failure is None:
+            self._window_latencies.append(time.monotonic() - job.started_at)
+
+        if self._window_congested > max(1, _MAX_ERROR_RATIO * self.limit):
+            self._decrease(f"{self._window_congested} of {self._window_jobs} jobs failed")
+        elif self._window_jobs >= max(self.limit, _MIN_LATENCY_SAMPLES):
+            self._end_window()
+
+    def _end_window(self):
+        if len(self._window_latencies) >= _MIN_LATENCY_SAMPLES:
+            median = statistics.median(self._window_latencies)
+            baseline = min(self._baseline_medians, default=median)
+            self._baseline_medians.append(median)
+            if median > _LATENCY_TOLERANCE * baseline and median - baseline > _MIN_LATENCY_RISE:
+                self._decrease(f"median latency {median:.2f}s, baseline {baseline:.2f}s")
+                return
+        if self._slow_start:
+            self._set_limit(self.limit * 2)
+        else:
+            self._set_limit(self.limit + 1)
+        logging.debug(f"{self.name}: concurrency {self.limit}")
+
+    def _decrease(self, reason):
+        self._slow_start = False
+        self._last_decrease = time.monotonic()
+        previous_limit = self.limit
+        self._set_limit(int(self.limit * _DECREASE_FACTOR))
+        if self.limit < previous_limit:
+            logging.info(f"{self.name}: concurrency {previous_limit} -> {self.limit} ({reason})")
+
+    def _set_limit(self, limit):
+        self.limit = min(self.ceiling, max(self.floor, limit))
+        self._reset_window()
+        if self.limit != self.history[-1][1]:
+            self.history.append((round(time.monotonic() - self._start, 1), self.limit))
+
+    def finish(self):
+        """Logs the limit over time and stores it with the timing of the run"""
+        if not self.adaptive:
+            return
+        limits = [limit for _, limit in self.history]
+        logging.info(f"{self.name}: concurrency between {min(limits)} and {max(limits)}, last {self.limit} "
+                     f"({len(self.history) - 1} changes, floor {self.floor}, ceiling {self.ceiling})")
+        logging.debug(f"{self.name}: concurrency over time " + ", ".join(f"{limit} @ {seconds}s" for seconds, limit in self.history))
+        fetch_timing.record_concurrency(self.name, self.history)
+
+
+class ThreadConcurrencyLimit(ConcurrencyLimit):
+    """For threads: slot() blocks, while the limit is reached. The pool needs 'ceiling' threads."""
+
+    def __init__(self, name, floor, ceiling, initial=None):
+        super().__init__(name, floor, ceiling, initial)
+        self._condition = threading.Condition()
+        self._waiting_first = 0
+
+    @contextmanager
+    def slot(self, first=False):
+        """first: the job gets the next free slot before all jobs waiting without it, e.g. a retry"""
+        with self._condition:
+            if first:
+                self._waiting_first += 1
+            try:
+                while self.running >= self.limit or (not first and self._waiting_first):
+                    self._condition.wait()
+            finally:
+                if first:
+                    self._waiting_first -= 1
+            self.running += 1
+            if first and not self._waiting_first:
+                # Jobs, which only waited behind the first ones, may take the remaining free slots
+                self._condition.notify(self._free_slots())
+        job = Job()
+        try:
+            yield job
+        finally:
+            with self._condition:
+                self.running -= 1
+                self._record(job)
+                if self._waiting_first:
+                    # notify() might wake only threads, which keep waiting behind the first ones
+                    self._condition.notify_all()
+                else:
+                    self._condition.notify(self._free_slots())
+
+
+class AsyncConcurrencyLimit(ConcurrencyLimit):
+    """For one asyncio event loop: 'async with slot()' waits, while the limit is reached"""
+
+    def __init__(self, name, floor, ceiling, initial=None):
+        super().__init__(name, floor, ceiling, initial)
+        self._waiters = deque()
+        self._first_waiters = deque()
+
+    @asynccontextmanager
+    async def slot(self, first=False):
+        """first: the job gets the next free slot before all jobs waiting without it, e.g. a retry"""
+        while self.running >= self.limit or (not first and self._first_waiters):
+            waiters = self._first_waiters if first else self._waiters
+            waiter = asyncio.get_running_loop().create_future()
+            waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                # A slot, which was handed to this job, goes to the next one
+                self._wake_up_waiters()
+                raise
+        self.running += 1
+        if first:
+            # Jobs, which only waited behind this one, may take the remaining free slots
+            self._wake_up_waiters()
+        job = Job()
+        try:
+            yield job
+        finally:
+            self.running -= 1
+            self._record(job)
+            self._wake_up_waiters()
+
+    def _wake_up_waiters(self):
+        for _ in range(self._free_slots()):
+            for waiters in (self._first_waiters, self._waiters):
+                while waiters and waiters[0].done():
+                    waiters.popleft()
+                if waiters:
+                    waiters.popleft().set_result(None)
+                    break
+            else:
+                return
+
+
+def _configured_sessions(async_engine):
+    return config.GLOBAL_CONFIG.max_concurrent_sessions if async_engine else config.GLOBAL_CONFIG.number_of_worker_threads
+
+
+def describe_session_limit(async_engine=False):
+    """Returns the limit of SSH sessions for the log, e.g. 'max. 15 concurrent sessions'"""
+    if config.GLOBAL_CONFIG.adaptive_concurrency:
+        return f"{config.GLOBAL_CONFIG.adaptive_min_sessions}-{config.GLOBAL_CONFIG.adaptive_max_sessions} concurrent sessions, adaptive"
+    return f"max. {_configured_sessions(async_engine)} concurrent sessions"
+
+
+def create_session_limit(async_engine=False):
+    """Limit of the SSH sessions of a collection: 'number_of_worker_threads' (asyncio: 'max_concurrent_sessions') or,
+    with 'adaptive_concurrency', adaptive between 'adaptive_min_sessions' and 'adaptive_max_sessions'"""
+    global_config = config.GLOBAL_CONFIG
+    configured_sessions = _configured_sessions(async_engine)
+    limit_class = AsyncConcurrencyLimit if async_engine else ThreadConcurrencyLimit
+    if not global_config.adaptive_concurrency:
+        return limit_class("SSH sessions", configured_sessions, configured_sessions)
+    return limit_class("SSH sessions", global_config.adaptive_min_sessions, global_config.adaptive_max_sessions, configured_sessions)
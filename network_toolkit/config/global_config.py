@@ -23,6 +23,23 @@ class GlobalConfiguration:
     skip_ssh_reachability_check: bool
     skip_ssh_authentication_check: bool
     input_source: str
+    collection_engine: str = "thread"
+    max_concurrent_sessions: int = 200
+    max_open_ssh_sessions: int = 50
+    ssh_session_idle_timeout: int = 60
+    snapshot_format: str = "json"
+    max_concurrent_probes: int = 1000
+    delta_base_interval: int = 30
+    delta_max_changed_ratio: float = 0.3
+    fetch_timing: bool = True
+    metrics_textfile: str = None
+    pipeline_queue_size: int = 100
+    parser_processes: int = 0
+    adaptive_concurrency: bool = False
+    adaptive_min_sessions: int = 2
+    adaptive_max_sessions: int = 50
+    adaptive_min_probes: int = 50
+    ssh_max_retries: int = 2
 
 
 def _open_and_read_config_file():
@@ -69,7 +86,24 @@ def _create_global_config(config_value):
                                         config_value["debug_mode"],
                                         config_value["skip_ssh_reachability_check"],
                                         config_value["skip_ssh_authentication_check"],
-                                        config_value["input_source"])
+                                        config_value["input_source"],
+                                        config_value.get("collection_engine", "thread"),
+                                        config_value.get("max_concurrent_sessions", 200),
+                                        config_value.get("max_open_ssh_sessions", 50),
+                                        config_value.get("ssh_session_idle_timeout", 60),
+                                        config_value.get("snapshot_format", "json"),
+                                        config_value.get("max_concurrent_probes", 1000),
+                                        config_value.get("delta_base_interval", 30),
+                                        config_value.get("delta_max_changed_ratio", 0.3),
+                                        config_value.get("fetch_timing", True),
+                                        config_value.get("metrics_textfile"),
+                                        config_value.get("pipeline_queue_size", 100),
+                                        config_value.get("parser_processes", 0),
+                                        config_value.get("adaptive_concurrency", False),
+                                        config_value.get("adaptive_min_sessions", 2),
+                                        config_value.get("adaptive_max_sessions", 50),
+                                        config_value.get("adaptive_min_probes", 50),
+                                        config_value.get("ssh_max_retries", 2))
     logging.debug("Global config got successfully loaded and parsed.")
     logging.debug(global_config)
     return global_config
@@ -17,6 +17,12 @@ class PrimeConfiguration:
     password: str
     address: str
     group: str
+    page_size: int = 1000
+    max_concurrent_requests: int = 4
+    requests_per_second: float = 5
+    max_retries: int = 5
+    inventory_cache_max_age_hours: float = 24
+    inventory_cache_refresh_minutes: float = 15
 
 
 def _open_and_read_config_file():
@@ -37,7 +43,13 @@ def _create_input_config(input_config):
         opt_config = PrimeConfiguration(input_config["username"],
                                         input_config["password"],
                                         input_config["address"],
-                                        input_config["group"], )
+                                        input_config["group"],
+                                        input_config.get("page_size", 1000),
+                                        input_config.get("max_concurrent_requests", 4),
+                                        input_config.get("requests_per_second", 5),
+                                        input_config.get("max_retries", 5),
+                                        input_config.get("inventory_cache_max_age_hours", 24),
+                                        input_config.get("inventory_cache_refresh_minutes", 15))
         logging.debug("Prime config got successfully loaded and parsed.")
         logging.debug(input_config)
     return opt_config
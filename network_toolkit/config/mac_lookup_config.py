@@ -12,6 +12,14 @@ yaml.indent(mapping=2, sequence=4)
 @dataclass(frozen=True)
 class MacLookupConfiguration:
     api_token_macvendors: str
+    cache_ttl_days: int = 365
+    cache_max_entries: int = 100000
+    path_to_ieee_registry: str = "raw_output/mac_address_lookup/ieee_registry"
+    api_url_macvendors: str = "https://api.macvendors.com/v1/lookup/"
+    api_requests_per_second: float = 2
+    api_burst: int = 2
+    api_max_workers: int = 4
+    api_max_retries: int = 4
 
 
 def _open_and_read_config_file():
@@ -25,7 +33,15 @@ def _open_and_read_config_file():
 
 
 def _create_input_config(input_config):
-    mac_lookup_config = MacLookupConfiguration(input_config["api_token_macvendors"])
+    mac_lookup_config = MacLookupConfiguration(input_config["api_token_macvendors"],
+                                               input_config.get("cache_ttl_days", 365),
+                                               input_config.get("cache_max_entries", 100000),
+                                               input_config.get("path_to_ieee_registry", "raw_output/mac_address_lookup/ieee_registry"),
+                                               input_config.get("api_url_macvendors", "https://api.macvendors.com/v1/lookup/"),
+                                               input_config.get("api_requests_per_second", 2),
+                                               input_config.get("api_burst", 2),
+                                               input_config.get("api_max_workers", 4),
+                                               input_config.get("api_max_retries", 4))
     logging.debug("Mac Address Lookup config got successfully loaded and parsed.")
     logging.debug(input_config)
     return mac_lookup_config
@@ -33,9 +49,8 @@ def _create_input_config(input_config):
 
 def _check_values_set(config_list):
     if config_list.api_token_macvendors is None:
-        logging.critical("Mac Address Lookup config: API Token must be set in 'global_config.yml'.\n"
-                         "To obtain a token you have to register @ https://macvendors.com/register")
-        quit()
+        logging.warning("Mac Address Lookup config: No API Token set in 'global_config.yml'. Only the local IEEE registry and the cache get used.\n"
+                        "To obtain a token you have to register @ https://macvendors.com/register")
 
 
 def load_mac_lookup_config():
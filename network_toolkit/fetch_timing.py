@@ -0,0 +1,175 @@
+"""Timing of a collection run per device and phase.
+
+Phases:
+    queue_wait   from handing the switch to the pool until a worker starts on it
+    tcp_connect  TCP handshake to the SSH port
+    ssh_login    SSH key exchange, authentication (AAA) and session setup, e.g. prompt detection of netmiko
+    command      from sending the command until its whole output arrived
+    parse        parsing the output into the interface config
+
+Reused sessions of the session pool have no tcp_connect and ssh_login. The collection engines record into the run,
+which is currently measured (see measure_run). Without one, recording does nothing. Adaptive concurrency limits
+record their limit over time into the run, too.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PHASES = ("queue_wait", "tcp_connect", "ssh_login", "command", "parse")
+METRIC_PREFIX = "network_toolkit_fetch"
+
+_current_run = None
+
+
+def _percentile(sorted_values, point):
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(point / 100 * len(sorted_values)) - 1))]
+
+
+class RunTiming:
+    def __init__(self, command, switches):
+        self.command = command
+        self.hostnames = {switch_element.ip: switch_element.hostname for switch_element in switches}
+        self.started = datetime.now()
+        self.duration = None
+        self.devices = {}  # ip -> {phase: seconds}
+        self.failures = {}  # ip -> reason
+        self.retries = {}  # ip -> number of retries
+        self.concurrency = {}  # name of the limit -> [(seconds since start, limit)], only of adaptive limits
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, ip, phase, seconds):
+        with self._lock:
+            phases = self.devices.setdefault(ip, {})
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    def record_failure(self, ip, reason):
+        with self._lock:
+            self.failures[ip] = reason
+
+    def record_retry(self, ip):
+        with self._lock:
+            self.retries[ip] = self.retries.get(ip, 0) + 1
+
+    def record_concurrency(self, name, history):
+        with self._lock:
+            self.concurrency[name] = list(history)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def summary(self, slowest_count=10):
+        """Returns percentiles per phase and the slowest devices"""
+        phase_summary = {}
+        for phase in PHASES:
+            values = sorted(phases[phase] for phases in self.devices.values() if phase in phases)
+            if values:
+                phase_summary[phase] = {"count": len(values), "sum": round(sum(values), 4), "p50": round(_percentile(values, 50), 4),
+                                        "p90": round(_percentile(values, 90), 4), "p99": round(_percentile(values, 99), 4), "max": round(values[-1], 4)}
+
+        device_totals = sorted(((sum(phases.values()), ip) for ip, phases in self.devices.items()), reverse=True)
+        slowest_devices = [{"ip": ip, "hostname": self.hostnames.get(ip, "No hostname"), "seconds": round(total, 3),
+                            "phases": {phase: round(seconds, 3) for phase, seconds in self.devices[ip].items()}}
+                           for total, ip in device_totals[:slowest_count]]
+        return {"command": self.command, "started": self.started.isoformat(timespec="seconds"),
+                "seconds": None if self.duration is None else round(self.duration, 3), "device_count": len(self.hostnames),
+                "failed_count": len(self.failures), "retry_count": sum(self.retries.values()), "phases": phase_summary, "slowest_devices": slowest_devices}
+
+    def log_summary(self):
+        summary = self.summary(slowest_count=3)
+        for phase, values in summary["phases"].items():
+            logging.info(f"{phase:<12} p50 {values['p50']:.3f}s  p90 {values['p90']:.3f}s  p99 {values['p99']:.3f}s  max {values['max']:.3f}s")
+        slowest = ", ".join(f"{device['hostname']} @ {device['ip']} ({device['seconds']:.1f}s)" for device in summary["slowest_devices"])
+        logging.info(f"Slowest switches: {slowest}")
+
+    def write_json(self, path_json_file):
+        """Writes the summary and the phases of every device"""
+        report = self.summary()
+        report["devices"] = {ip: {"hostname": self.hostnames.get(ip, "No hostname"), "failure": self.failures.get(ip), "retries": self.retries.get(ip, 0),
+                                  "phases": {phase: round(seconds, 4) for phase, seconds in phases.items()}}
+                             for ip, phases in self.devices.items()}
+        if self.concurrency:
+            report["concurrency"] = {name: [{"seconds": seconds, "limit": limit} for seconds, limit in history]
+                                     for name, history in self.concurrency.items()}
+        Path(path_json_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(path_json_file, mode="w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+
+    def write_prometheus(self, path_textfile):
+        """Writes the run as Prometheus text format, e.g. for the textfile collector of node_exporter"""
+        summary = self.summary(slowest_count=0)
+        labels = 'command="' + self.command.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        lines = [f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds Start of the last collection run.",
+                 f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+                 f"{METRIC_PREFIX}_last_run_timestamp_seconds{{{labels}}} {self.started.timestamp():.0f}",
+                 f"# HELP {METRIC_PREFIX}_duration_seconds Duration of the last collection run.",
+                 f"# TYPE {METRIC_PREFIX}_duration_seconds gauge",
+                 f"{METRIC_PREFIX}_duration_seconds{{{labels}}} {summary['seconds'] or 0}",
+                 f"# HELP {METRIC_PREFIX}_devices Switches in the last collection run.",
+                 f"# TYPE {METRIC_PREFIX}_devices gauge",
+                 f"{METRIC_PREFIX}_devices{{{labels}}} {summary['device_count']}",
+                 f"# HELP {METRIC_PREFIX}_failed_devices Switches, which failed in the last collection run.",
+                 f"# TYPE {METRIC_PREFIX}_failed_devices gauge",
+                 f"{METRIC_PREFIX}_failed_devices{{{labels}}} {summary['failed_count']}",
+                 f"# HELP {METRIC_PREFIX}_phase_seconds Time per switch and phase in the last collection run.",
+                 f"# TYPE {METRIC_PREFIX}_phase_seconds summary"]
+        for phase, values in summary["phases"].items():
+            for point in (50, 90, 99):
+                lines.append(f'{METRIC_PREFIX}_phase_seconds{{{labels},phase="{phase}",quantile="0.{point}"}} {values[f"p{point}"]}')
+            lines.append(f'{METRIC_PREFIX}_phase_seconds_sum{{{labels},phase="{phase}"}} {values["sum"]}')
+            lines.append(f'{METRIC_PREFIX}_phase_seconds_count{{{labels},phase="{phase}"}} {values["count"]}')
+
+        # The collector may read at any time, so the file gets replaced in one step
+        path_textfile = Path(path_textfile)
+        path_textfile.parent.mkdir(parents=True, exist_ok=True)
+        path_temporary_file = path_textfile.with_name(path_textfile.name + ".tmp")
+        with open(path_temporary_file, mode="w", encoding="utf-8") as textfile:
+            textfile.write("\n".join(lines) + "\n")
+        os.replace(path_temporary_file, path_textfile)
+
+
+@contextmanager
+def measure_run(command, switches):
+    """Measures the collection run of the command on the switches within the block"""
+    global _current_run
+    run_timing = RunTiming(command, switches)
+    _current_run = run_timing
+    try:
+        yield run_timing
+    finally:
+        run_timing.finish()
+        _current_run = None
+
+
+def record(ip, phase, seconds):
+    if _current_run is not None:
+        _current_run.record(ip, phase, seconds)
+
+
+def record_failure(ip, reason):
+    if _current_run is not None:
+        _current_run.record_failure(ip, reason)
+
+
+def record_retry(ip):
+    if _current_run is not None:
+        _current_run.record_retry(ip)
+
+
+def record_concurrency(name, history):
+    if _current_run is not None:
+        _current_run.record_concurrency(name, history)
+
+
+@contextmanager
+def measure(ip, phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(ip, phase, time.perf_counter() - start)
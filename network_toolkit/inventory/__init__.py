@@ -1,5 +1,16 @@
-from .csv_import import import_switches_from_csv
-from .prime_import import import_switches_from_prime
-# from .prime_import import *
+# The importers pull in heavy dependencies (requests, netmiko), so they get imported on first access only
+_LAZY_EXPORTS = {
+    "import_switches_from_csv": ".csv_import",
+    "import_switches_from_prime": ".prime_import",
+}
 
 __all__ = ["import_switches_from_csv", "import_switches_from_prime"]
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
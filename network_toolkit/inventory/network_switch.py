@@ -2,6 +2,90 @@ import logging
 import re
 
 
+# Tells if the config changed since the last snapshot. Its output is one line, but IOS still renders the whole running
+# config for it, so it costs about as much CPU on the switch as the config pull, just without the transfer.
+CONFIG_CHANGE_PROBE = "show running-config | include Last configuration change"
+
+
+def iter_interface_sections(cli_output):
+    """Yields (interface line, config lines) for every interface section of a 'show derived-config' output.
+
+    Works in a single pass on a string or on any iterable of lines (with or without line breaks). The result is the
+    same as the one of the former RegEx '^(interface.*)\\n((?:.*\\n)+?)!' followed by split("\\n ") and strip():
+    A section ends at the next line starting with '!', but never before its first config line, and lines without
+    leading blank belong to the config line above them. Unlike the RegEx, an unterminated section at the end of the
+    output doesn't cause a rescan of the rest of the output for every following interface line.
+    """
+    if isinstance(cli_output, str):
+        return _iter_sections_in_text(cli_output)
+    return _iter_sections_in_lines(line if line.endswith("\n") else line + "\n" for line in cli_output)
+
+
+def _iter_sections_in_text(text):
+    """Jumps from section to section with str.find, so the text is scanned only once and never backtracked"""
+    find = text.find
+    strip = str.strip
+
+    section_start = 0 if text.startswith("interface") else _find_next_interface_line(text, 0)
+    while section_start != -1:
+        header_end = find("\n", section_start)
+        if header_end == -1:
+            return
+        # Searching after the line break of the header skips the first config line, even if it starts with '!'
+        section_end = find("\n!", header_end + 1)
+        if section_end == -1:
+            # Without a terminating '!' none of the following sections can be complete either
+            return
+
+        yield text[section_start:header_end], list(map(strip, text[header_end + 1:section_end].split("\n ")))
+        section_start = _find_next_interface_line(text, section_end + 2)
+
+
+def _find_next_interface_line(text, position):
+    line_break = text.find("\ninterface", position)
+    return -1 if line_break == -1 else line_break + 1
+
+
+def _iter_sections_in_lines(lines):
+    interface_name = None
+    interface_config = []
+    config_line = None  # Config line, which might still get continued by the next line
+
+    for line in lines:
+        terminated = line.endswith("\n")
+        if terminated:
+            line = line[:-1]
+
+        if interface_name is None:
+            if terminated and line.startswith("interface"):
+                interface_name = line
+                interface_config = []
+                config_line = None
+            continue
+
+        if config_line is None:
+            if not terminated:
+                break
+            config_line = line
+            continue
+
+        if line.startswith("!"):
+            interface_config.append(config_line.strip())
+            yield interface_name, interface_config
+            interface_name = None
+            continue
+
+        if not terminated:
+            # Output ended in the middle of a section, so the section is incomplete
+            break
+
+        if line.startswith(" "):
+            interface_config.append(config_line.strip())
+            config_line = line
+        else:
+            config_line = config_line + "\n" + line
+
+
 class NetworkSwitch:
     def __init__(self, hostname, ip, os, reachable, line_number):
         self.hostname = hostname
@@ -11,6 +95,7 @@ class NetworkSwitch:
         self.line_number = line_number
 
         self.parse_error = ""
+        self.config_fingerprint = ""
         self.interface_eth_config = {}
         # self.interface_vlan_config = ""
 
@@ -31,16 +116,25 @@ class NetworkSwitch:
         return parsed_cli_output
 
     def parse_interface_cli_output(self, raw_cli_output):
-        interface_eth_config = self.parse_cli_output(r"^(interface.*)\n((?:.*\n)+?)!", raw_cli_output)
+        """Parses the interface sections from the cli output, which can be a string or an iterable of lines"""
+        if raw_cli_output is None:
+            self.parse_error = f"{self.ip} - Did not receive CLI output."
+            logging.warning(self.parse_error)
+            return
 
-        for element in interface_eth_config:
-            interface_name = element[0]
-            interface_config = element[1]
-            interface_config_list = interface_config.split("\n ")
-            interface_config_list = [x.strip() for x in interface_config_list]  # Remove leading blanks
+        for interface_name, interface_config_list in iter_interface_sections(raw_cli_output):
             if interface_name.startswith("interface Vlan"):  # Strip off VLAN interfaces
                 continue
             self.interface_eth_config[interface_name] = interface_config_list
 
+    def parse_config_fingerprint(self, raw_cli_output):
+        """Remembers when the config was changed last, based on the output of CONFIG_CHANGE_PROBE. Any other output, e.g.
+        only the prompt of a session out of step, leaves it empty, so the switch gets pulled on the next update."""
+        match = re.search(r"Last configuration change at (.+)", raw_cli_output or "")
+        self.config_fingerprint = "" if match is None else match.group(1).strip()
+
+    def snapshot_entry(self):
+        return {"hostname": self.hostname, "reachable": self.reachable, "config_fingerprint": self.config_fingerprint, "eth_interfaces": self.interface_eth_config}
+
     def parse_vlan_cli_output(self, raw_cli_output):
         self.vlan_eth_config = self.parse_cli_output(r"^(\d+)\s+(\w+)", raw_cli_output)
@@ -1,30 +1,65 @@
 # -*- coding: UTF-8 -*-
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import replace
+from datetime import timedelta
+from pathlib import Path
+
 import requests
 
 from network_toolkit.config.input_source_config import load_input_config
+from network_toolkit.rate_limit import TokenBucket, backoff_delay
 from .network_switch import NetworkSwitch
+from .prime_inventory_cache import PrimeInventoryCache, collection_time_filter
 
 requests.packages.urllib3.disable_warnings()
 
+# Prime answers with at most 1000 devices per request, if '.full=true' is set
+MAX_PAGE_SIZE = 1000
+
+path_to_inventory_cache = Path.cwd() / "raw_output/prime_inventory/inventory_cache.json"
+
+
+def _device_query_url(prime_config, first_result, max_results, device_filter=None):
+    request = f"/webacs/api/v4/data/Devices.json?.full=true&.firstResult={first_result}&.maxResults={max_results}"
+    if prime_config.group is not None:
+        request += "&.group=" + prime_config.group
+    request += "&.sort=deviceName&reachability=REACHABLE&adminStatus=MANAGED&productFamily=startsWith(Switches)"
+    if device_filter is not None:
+        request += "&" + device_filter
+
+    # The address may contain the scheme, e.g. 'http://127.0.0.1:8080' for a local mock
+    if prime_config.address.startswith(("http://", "https://")):
+        return prime_config.address + request
+    return "https://" + prime_config.address + request
+
+
+def _request_page(session, prime_config, rate_limiter, first_result, device_filter=None):
+    """Returns the response for the page of devices, which starts at first_result. Retries, while Prime answers 503.
+    Raises requests.exceptions.ConnectionError, if Prime can't be reached. Runs in worker threads, so it doesn't quit()."""
+    url = _device_query_url(prime_config, first_result, prime_config.page_size, device_filter)
+
+    for attempt in range(prime_config.max_retries + 1):
+        rate_limiter.acquire()
+        response = session.get(url, verify=False, timeout=30, auth=(prime_config.username, prime_config.password))
+        if response.status_code != 503:
+            return response
+        logging.debug(f"HTTP 503 for devices from {first_result}, retrying (attempt {attempt + 1}/{prime_config.max_retries})")
+        time.sleep(backoff_delay(attempt))
+    return response
 
-def _query_switch_data(prime_config):
-    if prime_config.group is None:
-        request = "/webacs/api/v4/data/Devices.json?.full=true&.maxResults=1000&.sort=deviceName&reachability=REACHABLE&adminStatus=MANAGED&productFamily" \
-                  "=startsWith(Switches) "
-    else:
-        request = "/webacs/api/v4/data/Devices.json?.full=true&.maxResults=1000&.group=" + prime_config.group + "&.sort=deviceName&reachability" \
-                  "=REACHABLE&adminStatus=MANAGED&productFamily=startsWith(Switches)"
-    url = "https://" + prime_config.address + request
 
+def _receive_page(request_page, prime_config):
+    """Returns the response of request_page() or quits, if Prime can't be reached"""
     try:
-        response = requests.get(url, verify=False, timeout=5, auth=(prime_config.username, prime_config.password))
+        return request_page()
     except requests.exceptions.ConnectionError:
         logging.critical(f"Timeout - Please check address({prime_config.address}) and reachability")
         quit()
-    except Exception as e:
-        print(e)
 
+
+def _check_response(response, prime_config):
     if response.status_code == 401:
         logging.critical("HTTP 401 Unauthorized - Please check username, password and role('NBI Read')")
         quit()
@@ -35,44 +70,119 @@ def _query_switch_data(prime_config):
         logging.critical(f"HTTP 500 Internal Server Error - Invalid group. Check your group('{prime_config.group}")
         quit()
     elif response.status_code == 503:
-        logging.critical(f"HTTP 503 Service Unavailable - Rate limited / Requestes more then 1000 devices at once")
+        logging.critical(f"HTTP 503 Service Unavailable - Still rate limited after {prime_config.max_retries} retries. "
+                         f"Lower 'max_concurrent_requests' or 'requests_per_second'")
         quit()
     elif response.status_code != 200:
         logging.critical(f"HTTP {response.status_code} - Unknown Error")
         quit()
 
-    logging.info("Connected to Prime Infrastructure API. [1/5]")
-    response_data = response.json()
-
-    if response_data["queryResponse"]["@count"] == 0:
-        logging.critical(f"Found no devices. Check your group('{prime_config.group}')")
-        quit()
-
-    return response_data
 
-
-def _build_switch_data(response):
+def _build_switch_data(devices):
     switches_data = []
-    logging.info("Valid response to device query received. [2/5]")
-
-    for switch in response["queryResponse"]["entity"]:
-        hostname = switch["devicesDTO"]["deviceName"]
-        ip = switch["devicesDTO"]["ipAddress"]
-        if switch["devicesDTO"]["softwareType"] == "IOS-XE":
+    for device in devices:
+        hostname = device["deviceName"]
+        ip = device["ipAddress"]
+        if device["softwareType"] == "IOS-XE":
             os = "cisco_xe"
         else:
             os = "cisco_ios"
 
         switch_data = NetworkSwitch(hostname=hostname, ip=ip, os=os, reachable=False, line_number=0)
         switches_data.append(switch_data)
-
-    logging.info(f"Read {response['queryResponse']['@count']} devices from Prime. [3/5]")
     return switches_data
 
 
+def _devices_of_page(response):
+    return [entity["devicesDTO"] for entity in response.json()["queryResponse"].get("entity", [])]
+
+
+def _query_devices(prime_config, device_filter=None):
+    """Reads all devices ('devicesDTO') page by page. The first page tells the number of devices, the others get
+    requested concurrently and are taken over as soon as they arrive."""
+    if prime_config.page_size > MAX_PAGE_SIZE:
+        logging.warning(f"Prime returns max. {MAX_PAGE_SIZE} devices per page. Using this as 'page_size'.")
+        prime_config = replace(prime_config, page_size=MAX_PAGE_SIZE)
+
+    rate_limiter = TokenBucket(prime_config.requests_per_second, prime_config.max_concurrent_requests)
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=prime_config.max_concurrent_requests)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        response = _receive_page(lambda: _request_page(session, prime_config, rate_limiter, 0, device_filter), prime_config)
+        _check_response(response, prime_config)
+        logging.info("Connected to Prime Infrastructure API. [1/5]")
+
+        device_count = response.json()["queryResponse"]["@count"]
+        pages = {0: _devices_of_page(response)}
+        page_starts = range(prime_config.page_size, device_count, prime_config.page_size)
+        logging.info(f"Reading {device_count} devices in {len(page_starts) + 1} pages of {prime_config.page_size}...")
+
+        with ThreadPoolExecutor(max_workers=prime_config.max_concurrent_requests) as executor:
+            futures = {executor.submit(_request_page, session, prime_config, rate_limiter, first_result, device_filter): first_result
+                       for first_result in page_starts}
+            try:
+                for future in as_completed(futures):
+                    response = _receive_page(future.result, prime_config)
+                    _check_response(response, prime_config)
+                    pages[futures[future]] = _devices_of_page(response)
+            except BaseException:
+                # Quit (or CTRL+C) on a failed page: the pages, which did not start yet, must not keep hitting Prime
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    logging.info("Valid response to device query received. [2/5]")
+    # Pages arrive in any order, but the devices stay sorted by device name
+    return [device for first_result in sorted(pages) for device in pages[first_result]]
+
+
+def _query_switch_data(prime_config):
+    devices = _query_devices(prime_config)
+    if not devices:
+        logging.critical(f"Found no devices. Check your group('{prime_config.group}')")
+        quit()
+    return _build_switch_data(devices)
+
+
+def _sync_inventory_cache(prime_config):
+    """Brings the local copy of the Prime inventory up to date: nothing to do within the refresh interval, a full sync
+    after max age and otherwise only the devices, which Prime collected since the newest device in the cache"""
+    inventory_cache = PrimeInventoryCache.load(path_to_inventory_cache, {"address": prime_config.address, "group": prime_config.group})
+
+    if inventory_cache.is_fresh(timedelta(minutes=prime_config.inventory_cache_refresh_minutes)):
+        logging.info(f"Using inventory cache from {inventory_cache.last_sync.astimezone():%H:%M:%S}. [1/5]")
+        logging.info("Inventory cache is up to date. [2/5]")
+        return inventory_cache
+
+    latest_collection_time = inventory_cache.latest_collection_time()
+    if inventory_cache.needs_full_sync(timedelta(hours=prime_config.inventory_cache_max_age_hours)) or latest_collection_time is None:
+        logging.info("Connecting to Prime Infrastructure for a full sync of the inventory...")
+        inventory_cache.replace_devices(_query_devices(prime_config))
+    else:
+        logging.info(f"Connecting to Prime Infrastructure for devices collected after {latest_collection_time.isoformat()}...")
+        changed_devices = _query_devices(prime_config, collection_time_filter(latest_collection_time))
+        inventory_cache.update_devices(changed_devices)
+        logging.info(f"Updated {len(changed_devices)} devices in the inventory cache.")
+
+    try:
+        inventory_cache.save()
+    except OSError:
+        logging.warning(f"Could not store inventory cache @ {inventory_cache.path}")
+    return inventory_cache
+
+
 def import_switches_from_prime():
-    logging.info("Connecting to Prime Infrastructure...")
     prime_config = load_input_config()
-    response = _query_switch_data(prime_config)
-    switch_data = _build_switch_data(response)
+    if prime_config.inventory_cache_max_age_hours <= 0:
+        logging.info("Connecting to Prime Infrastructure...")
+        switch_data = _query_switch_data(prime_config)
+    else:
+        inventory_cache = _sync_inventory_cache(prime_config)
+        if not inventory_cache.devices:
+            logging.critical(f"Found no devices. Check your group('{prime_config.group}')")
+            quit()
+        switch_data = _build_switch_data(inventory_cache.sorted_devices())
+
+    logging.info(f"Read {len(switch_data)} devices from Prime. [3/5]")
     return switch_data
@@ -0,0 +1,89 @@
+# -*- coding: UTF-8 -*-
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+CACHE_VERSION = 1
+
+
+def _parse_collection_time(collection_time):
+    """Prime returns e.g. '2022-05-01T09:13:47.123+02:00'"""
+    try:
+        parsed_collection_time = datetime.fromisoformat(collection_time)
+    except (TypeError, ValueError):
+        return None
+    if parsed_collection_time.tzinfo is None:
+        parsed_collection_time = parsed_collection_time.replace(tzinfo=timezone.utc)
+    return parsed_collection_time
+
+
+class PrimeInventoryCache:
+    """Devices of Prime ('devicesDTO' entries by '@id') with the time of the last full and incremental sync"""
+
+    def __init__(self, path_cache_file, source, devices=None, last_full_sync=None, last_sync=None):
+        self.path = Path(path_cache_file)
+        self.source = source  # Address and group of Prime the devices were read from
+        self.devices = devices or {}
+        self.last_full_sync = last_full_sync
+        self.last_sync = last_sync
+
+    @classmethod
+    def load(cls, path_cache_file, source):
+        """Returns the cache stored in the file or an empty one, if the file is missing, damaged or from another source"""
+        try:
+            with open(path_cache_file, mode="r", encoding="utf-8") as cache_file:
+                raw_cache = json.load(cache_file)
+        except FileNotFoundError:
+            return cls(path_cache_file, source)
+        except ValueError:
+            logging.warning(f"Inventory cache {path_cache_file} is damaged. Starting a new one.")
+            return cls(path_cache_file, source)
+
+        if raw_cache.get("version") != CACHE_VERSION or raw_cache.get("source") != source:
+            logging.info("Inventory cache belongs to another Prime address or group. Starting a new one.")
+            return cls(path_cache_file, source)
+        return cls(path_cache_file, source, raw_cache["devices"],
+                   datetime.fromisoformat(raw_cache["last_full_sync"]), datetime.fromisoformat(raw_cache["last_sync"]))
+
+    def save(self):
+        raw_cache = {"version": CACHE_VERSION, "source": self.source, "last_full_sync": self.last_full_sync.isoformat(),
+                     "last_sync": self.last_sync.isoformat(), "devices": self.devices}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so an interrupted save does not destroy the cache
+        path_temporary_file = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(path_temporary_file, mode="w", encoding="utf-8") as cache_file:
+            json.dump(raw_cache, cache_file, separators=(",", ":"))
+        os.replace(path_temporary_file, self.path)
+
+    def is_fresh(self, refresh_interval):
+        return self.last_sync is not None and datetime.now(timezone.utc) - self.last_sync < refresh_interval
+
+    def needs_full_sync(self, max_age):
+        return self.last_full_sync is None or datetime.now(timezone.utc) - self.last_full_sync >= max_age
+
+    def latest_collection_time(self):
+        """Returns the newest 'collectionTime' of all cached devices, the starting point of the next incremental sync"""
+        collection_times = [_parse_collection_time(device.get("collectionTime")) for device in self.devices.values()]
+        collection_times = [collection_time for collection_time in collection_times if collection_time is not None]
+        return max(collection_times, default=None)
+
+    def replace_devices(self, devices):
+        sync_time = datetime.now(timezone.utc)
+        self.devices = {str(device["@id"]): device for device in devices}
+        self.last_full_sync = sync_time
+        self.last_sync = sync_time
+
+    def update_devices(self, devices):
+        for device in devices:
+            self.devices[str(device["@id"])] = device
+        self.last_sync = datetime.now(timezone.utc)
+
+    def sorted_devices(self):
+        return sorted(self.devices.values(), key=lambda device: device["deviceName"])
+
+
+def collection_time_filter(collection_time):
+    """Prime filter for devices, which were collected after the given time (epoch milliseconds)"""
+    return f"collectionTime=gt({round(collection_time.timestamp() * 1000)})"
@@ -1,12 +1,14 @@
+import asyncio
 import logging
 import re
 import socket
-from concurrent.futures import ThreadPoolExecutor
 
 from alive_progress import alive_bar
 
 import network_toolkit.config as config
+from network_toolkit.profiling import profile_phase
 from network_toolkit.ssh_connection import run_command_on_switch
+from .reachability_scanner import scan_tcp_port
 
 
 def wrapper_check_for_ssh_reachability(validated_switch_data):
@@ -22,26 +24,32 @@ def wrapper_check_for_ssh_reachability(validated_switch_data):
 
 
 def check_switch_reachability(validated_switch_data):
-    logging.info(f"Starting SSH reachability check on TCP port {config.GLOBAL_CONFIG.ssh_port} for {len(validated_switch_data)} switches...")
-    results = {}
+    """Probes the SSH port of all switches at once on non-blocking sockets, each with its own timeout"""
+    if config.GLOBAL_CONFIG.adaptive_concurrency:
+        min_concurrent_probes = config.GLOBAL_CONFIG.adaptive_min_probes
+        probe_limit = f"{min_concurrent_probes}-{config.GLOBAL_CONFIG.max_concurrent_probes} concurrent probes, adaptive"
+    else:
+        min_concurrent_probes = None
+        probe_limit = f"max. {config.GLOBAL_CONFIG.max_concurrent_probes} concurrent probes"
+    logging.info(f"Starting SSH reachability check on TCP port {config.GLOBAL_CONFIG.ssh_port} for {len(validated_switch_data)} switches "
+                 f"({probe_limit})...")
+    ips = [switch_element.ip for switch_element in validated_switch_data]
 
     with alive_bar(total=len(validated_switch_data)) as bar:
-        with ThreadPoolExecutor(max_workers=config.GLOBAL_CONFIG.number_of_worker_threads) as executor:
-            futures = [executor.submit(check_reachability, switch_element.ip, config.GLOBAL_CONFIG.ssh_port) for switch_element in validated_switch_data]
-            for future in futures:
-                ip, reachable = future.result()
-                results[ip] = reachable
-                bar()
+        results = asyncio.run(scan_tcp_port(ips, config.GLOBAL_CONFIG.ssh_port, config.GLOBAL_CONFIG.ssh_timeout,
+                                            config.GLOBAL_CONFIG.max_concurrent_probes, progress_callback=bar,
+                                            min_concurrent_probes=min_concurrent_probes))
 
     logging.debug(results)
     return results
 
 
 def check_reachability(ip, port):
+    """Blocking check of a single switch"""
     try:
-        # Open TCP Socket for SSH reachability check
+        # Open TCP Socket for SSH reachability check. The timeout is set on this socket only, not process wide.
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            socket.setdefaulttimeout(config.GLOBAL_CONFIG.ssh_timeout)
+            sock.settimeout(config.GLOBAL_CONFIG.ssh_timeout)
             result = sock.connect_ex((ip, port))
         if result == 0:
             reachable = True
@@ -110,7 +118,9 @@ def check_ssh_authentication(switch_data):
 
 
 def check_ssh_connection(validated_switch_data):
-    reachable_switch_data = wrapper_check_for_ssh_reachability(validated_switch_data)
-    wrapper_check_ssh_authentication(reachable_switch_data)
+    with profile_phase("reachability"):
+        reachable_switch_data = wrapper_check_for_ssh_reachability(validated_switch_data)
+    with profile_phase("validation"):
+        wrapper_check_ssh_authentication(reachable_switch_data)
     logging.info("All prerequisites are fullfilled.")
     return reachable_switch_data
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import socket
+
+from network_toolkit.concurrency_limit import AsyncConcurrencyLimit
+
+# Sockets kept free for the rest of the process (log files, SSH sessions, ...)
+_RESERVED_FILE_DESCRIPTORS = 64
+
+
+def _limit_to_open_files(max_concurrent_probes):
+    """Every probe holds one socket, so stay below the limit of open files of the process"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return max_concurrent_probes
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return max_concurrent_probes
+    return max(1, min(max_concurrent_probes, soft_limit - _RESERVED_FILE_DESCRIPTORS))
+
+
+async def probe_tcp_port(ip, port, timeout):
+    """Returns True, if a TCP connection to ip:port gets established within timeout seconds"""
+    loop = asyncio.get_running_loop()
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+    return True
+
+
+async def scan_tcp_port(ips, port, timeout, max_concurrent_probes, progress_callback=None, min_concurrent_probes=None):
+    """Probes all IPs at once (up to max_concurrent_probes open sockets) and returns {ip: reachable}. With
+    min_concurrent_probes, the open sockets adapt between both values to the connect time of the reachable hosts.
+    Unreachable hosts don't count, they time out no matter how many probes run."""
+    ceiling = _limit_to_open_files(max_concurrent_probes)
+    floor = ceiling if min_concurrent_probes is None else min_concurrent_probes
+    probe_limit = AsyncConcurrencyLimit("Reachability probes", floor, ceiling)
+
+    async def probe_worker(ip):
+        async with probe_limit.slot() as job:
+            reachable = await probe_tcp_port(ip, port, timeout)
+            if not reachable:
+                job.failure = "unreachable"
+        return ip, reachable
+
+    results = {}
+    for task in asyncio.as_completed([probe_worker(ip) for ip in ips]):
+        ip, reachable = await task
+        results[ip] = reachable
+        if progress_callback is not None:
+            progress_callback()
+    probe_limit.finish()
+    logging.debug(f"{sum(results.values())} of {len(results)} hosts are reachable on TCP port {port}.")
+    return results
@@ -0,0 +1,185 @@
+"""Order, retries and timeouts of the jobs of a collection, one job per switch:
+
+    order     switches, which took longest in earlier runs, start first (longest processing time first). A slow switch
+              at the end of the list would otherwise extend the run by its whole duration.
+    results   get handled as soon as their job finished, not in the order of the switches
+    retries   jobs, which failed with a transient error (timeout, SSH), start again after an exponential backoff with
+              jitter, up to 'ssh_max_retries' times. A due retry gets the next free session, before the switches,
+              which did not start yet.
+    timeouts  the connect and login timeouts of a switch get doubled per retry and per timeout of the switch in
+              the last runs, up to _MAX_TIMEOUT_FACTOR times
+
+The history of every switch (moving average of the duration, timeouts in the last runs) is kept
+@ raw_output/fetch_timing/device_history.json and updated after every fetch.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import statistics
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import network_toolkit.config as config
+from network_toolkit import fetch_timing
+from network_toolkit.rate_limit import backoff_delay
+
+HISTORY_VERSION = 1
+TRANSIENT_FAILURES = ("timeout", "ssh")
+# Phases of a job, which the next run of the switch needs again
+_JOB_PHASES = ("tcp_connect", "ssh_login", "command")
+# Weight of the latest run in the moving average of the duration
+_HISTORY_WEIGHT = 0.3
+_MAX_TIMEOUT_DOUBLINGS = 3
+_MAX_TIMEOUT_FACTOR = 2 ** _MAX_TIMEOUT_DOUBLINGS
+_RETRY_BASE_DELAY = 1.0
+
+
+def path_history_file():
+    return Path.cwd() / "raw_output/fetch_timing/device_history.json"
+
+
+class DeviceHistory:
+    """Duration and timeouts per switch, from the timing of earlier runs"""
+
+    def __init__(self, path_history_file, devices=None):
+        self.path = Path(path_history_file)
+        self.devices = devices or {}  # ip -> {"seconds": moving average, "timeouts": timeouts in the last runs}
+
+    @classmethod
+    def load(cls, path_history_file):
+        """Returns the history stored in the file or an empty one, if the file is missing or damaged"""
+        try:
+            with open(path_history_file, mode="r", encoding="utf-8") as history_file:
+                raw_history = json.load(history_file)
+        except FileNotFoundError:
+            return cls(path_history_file)
+        except ValueError:
+            logging.warning(f"Device history {path_history_file} is damaged. Starting a new one.")
+            return cls(path_history_file)
+
+        if raw_history.get("version") != HISTORY_VERSION:
+            return cls(path_history_file)
+        return cls(path_history_file, raw_history["devices"])
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so an interrupted save does not destroy the history
+        path_temporary_file = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(path_temporary_file, mode="w", encoding="utf-8") as history_file:
+            json.dump({"version": HISTORY_VERSION, "devices": self.devices}, history_file, separators=(",", ":"))
+        os.replace(path_temporary_file, self.path)
+
+    def order_switches(self, switches):
+        """Returns the switches, the slowest of the earlier runs first. Unknown switches count as median switch, switches
+        of the same duration keep their order."""
+        known_seconds = [entry["seconds"] for entry in self.devices.values() if "seconds" in entry]
+        default_seconds = statistics.median(known_seconds) if known_seconds else 0.0
+        return sorted(switches, key=lambda switch_element: self.devices.get(switch_element.ip, {}).get("seconds", default_seconds),
+                      reverse=True)
+
+    def timeout_factor(self, ip, attempt=0):
+        """Factor for the connect and login timeouts of the switch in the given (0 based) attempt"""
+        timeouts = self.devices.get(ip, {}).get("timeouts", 0)
+        return min(_MAX_TIMEOUT_FACTOR, 2 ** (timeouts + attempt))
+
+    def update(self, run_timing):
+        """Adds the durations and the timeouts of the run"""
+        for ip in run_timing.hostnames:
+            phases = run_timing.devices.get(ip, {})
+            failure = run_timing.failures.get(ip)
+            if failure is None and not any(phase in phases for phase in _JOB_PHASES):
+                continue
+            entry = self.devices.setdefault(ip, {})
+            if failure is None:
+                seconds = sum(phases.get(phase, 0.0) for phase in _JOB_PHASES)
+                previous_seconds = entry.get("seconds", seconds)
+                entry["seconds"] = round(previous_seconds + _HISTORY_WEIGHT * (seconds - previous_seconds), 4)
+                entry["timeouts"] = max(0, entry.get("timeouts", 0) - 1)
+            elif failure == "timeout":
+                entry["timeouts"] = min(entry.get("timeouts", 0) + 1, _MAX_TIMEOUT_DOUBLINGS)
+
+
+def _retry_delay(switch_element, attempt, failure):
+    """Returns the backoff before the next attempt or None, if the job of the switch is done"""
+    max_retries = config.GLOBAL_CONFIG.ssh_max_retries
+    if failure not in TRANSIENT_FAILURES or attempt >= max_retries:
+        if failure is not None:
+            fetch_timing.record_failure(switch_element.ip, failure)
+        return None
+    delay = backoff_delay(attempt, base_delay=_RETRY_BASE_DELAY)
+    fetch_timing.record_retry(switch_element.ip)
+    logging.info(f"Retrying {switch_element.ip} in {delay:.1f}s after {failure} (retry {attempt + 1} of {max_retries})")
+    return delay
+
+
+def run_in_threads(switches, run_job, max_workers):
+    """Runs run_job(switch_element, timeout_factor, submitted_at, retry) -> (result, failure or None) for all switches
+    on max_workers threads and yields (switch_element, result) in the order the switches finished, after their retries.
+    Due retries get submitted before switches, which did not start yet. Within run_job, 'retry' is meant for
+    slot(first=retry) of the concurrency limit, so a retry also goes first, when the limit is below max_workers."""
+    history = DeviceHistory.load(path_history_file())
+    waiting_switches = deque(history.order_switches(switches))
+    retries = []  # heap of (due, sequence, switch_element, attempt)
+    sequence = itertools.count()
+    running_jobs = {}  # future -> (switch_element, attempt)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while waiting_switches or retries or running_jobs:
+            now = time.monotonic()
+            # Jobs are only handed to the pool, when a thread is free, so a retry doesn't queue up behind all switches
+            while len(running_jobs) < max_workers:
+                if retries and retries[0][0] <= now:
+                    _, _, switch_element, attempt = heapq.heappop(retries)
+                elif waiting_switches:
+                    switch_element, attempt = waiting_switches.popleft(), 0
+                else:
+                    break
+                future = executor.submit(run_job, switch_element, history.timeout_factor(switch_element.ip, attempt), time.perf_counter(), attempt > 0)
+                running_jobs[future] = (switch_element, attempt)
+
+            # A due retry needs a free thread. With all threads busy only a finished job changes something, waiting for
+            # the retry would return at once and spin, as long as the jobs run
+            wait_time = max(0.0, retries[0][0] - now) if retries and len(running_jobs) < max_workers else None
+            if not running_jobs:
+                time.sleep(wait_time)
+                continue
+            finished_jobs, _ = wait(running_jobs, timeout=wait_time, return_when=FIRST_COMPLETED)
+            for future in finished_jobs:
+                switch_element, attempt = running_jobs.pop(future)
+                result, failure = future.result()
+                delay = _retry_delay(switch_element, attempt, failure)
+                if delay is None:
+                    yield switch_element, result
+                else:
+                    heapq.heappush(retries, (time.monotonic() + delay, next(sequence), switch_element, attempt + 1))
+
+
+async def run_in_asyncio(switches, run_job):
+    """Like run_in_threads for coroutines: run_job(switch_element, timeout_factor, submitted_at, retry) gets awaited.
+    All jobs start at once, the concurrency is up to run_job: slot(first=retry) of AsyncConcurrencyLimit lets a retry
+    go before the switches, which are still waiting for their first slot."""
+    history = DeviceHistory.load(path_history_file())
+
+    async def run_with_retries(switch_element):
+        attempt = 0
+        while True:
+            result, failure = await run_job(switch_element, history.timeout_factor(switch_element.ip, attempt), time.perf_counter(), attempt > 0)
+            delay = _retry_delay(switch_element, attempt, failure)
+            if delay is None:
+                return switch_element, result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    tasks = [asyncio.create_task(run_with_retries(switch_element)) for switch_element in history.order_switches(switches)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        # The consumer stopped early
+        for task in tasks:
+            task.cancel()
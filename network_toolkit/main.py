@@ -1,17 +1,25 @@
 # -*- coding: UTF-8 -*-
+import argparse
 import json
 import logging
+import os
 import signal
+import sys
 from datetime import datetime
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import re
 
 import network_toolkit.config as config
-from inventory import import_switches_from_csv, import_switches_from_prime
-from inventory.validator.connection_validator import check_ssh_connection
-from ssh_connection import run_show_command
-from tool import mac_address_batch_lookup
+from inventory.network_switch import CONFIG_CHANGE_PROBE
+from network_toolkit.profiling import profile_phase, start_profiling, stop_profiling
+from network_toolkit.snapshot import (dump_mapping, open_snapshot, write_compact_snapshot, write_ndjson_snapshot, write_snapshot_with_delta,
+                                      NdjsonSnapshot, NdjsonSnapshotWriter, SNAPSHOT_SUFFIXES)
+from network_toolkit.snapshot.compact_format import COMPACT_SUFFIX
+from network_toolkit.snapshot.ndjson_format import NDJSON_SUFFIX, PARTIAL_SUFFIX, iter_ndjson_snapshot, list_partial_snapshots
+
+# netmiko, paramiko, requests and alive_progress are imported inside the functions, which need them.
+# This keeps the start of the CLI fast, e.g. a MAC lookup never loads the SSH stack.
 
 logging.basicConfig(
     # filename='test.log',
@@ -34,21 +42,251 @@ class SearchMaskFlags:
     strip_uplink: bool
 
 
-def fetch_switch_config():
-    """Read config via ssh from switches defined in switchlist.csv"""
-    if config.GLOBAL_CONFIG.input_source == "csv":
-        switch_data = import_switches_from_csv()
-    elif config.GLOBAL_CONFIG.input_source == "prime":
-        switch_data = import_switches_from_prime()
+def _import_and_validate_switches():
+    """Imports the switches from the input source and returns those, which are reachable via SSH"""
+    from inventory import import_switches_from_csv, import_switches_from_prime
+    from inventory.validator.connection_validator import check_ssh_connection
+
+    with profile_phase("inventory_import"):
+        if config.GLOBAL_CONFIG.input_source == "csv":
+            switch_data = import_switches_from_csv()
+        elif config.GLOBAL_CONFIG.input_source == "prime":
+            switch_data = import_switches_from_prime()
 
     switch_data = check_ssh_connection(switch_data)
 
     # TODO rewrite code to be more readable but less pythonic, quite sad :(
     # Filter out all switches that are not reachable
-    reachable_switches = [x for x in switch_data if x.reachable]
-    parsed_config = run_show_command(reachable_switches, "show derived-config | begin interface")
+    return [x for x in switch_data if x.reachable]
+
+
+@profile_phase("collection")
+def _stream_show_command(switches, cli_show_command, snapshot_writer):
+    from network_toolkit.collection_pipeline import stream_show_command
+    stream_show_command(switches, cli_show_command, snapshot_writer)
+
+
+@profile_phase("collection")
+def _run_raw_command(switches, cli_show_command):
+    if config.GLOBAL_CONFIG.collection_engine == "asyncio":
+        # asyncssh is only needed for this engine, so import it on demand
+        from async_ssh_connection import run_raw_command_async
+        return run_raw_command_async(switches, cli_show_command)
+    from ssh_connection import run_raw_command
+    return run_raw_command(switches, cli_show_command)
+
+
+def _run_show_command_timed(switches, cli_show_command, snapshot_writer):
+    """Streams the parsed switches into the snapshot_writer and stores how long every switch took per phase (connect,
+    login, command, parse)"""
+    from network_toolkit.fetch_timing import measure_run
+    from network_toolkit.job_scheduler import DeviceHistory, path_history_file
+
+    with measure_run(cli_show_command, switches) as run_timing:
+        _stream_show_command(switches, cli_show_command, snapshot_writer)
+    try:
+        # The next fetch starts the slowest switches first
+        device_history = DeviceHistory.load(path_history_file())
+        device_history.update(run_timing)
+        device_history.save()
+    except OSError:
+        logging.warning("Could not update the device history")
+    if not config.GLOBAL_CONFIG.fetch_timing or not switches:
+        return
+
+    run_timing.log_summary()
+    timestamp_url_safe = run_timing.started.strftime("%Y-%m-%dT%H-%M-%S")
+    path_timing_file = Path.cwd() / "raw_output/fetch_timing" / (timestamp_url_safe + ".json")
+    try:
+        run_timing.write_json(path_timing_file)
+        logging.info(f"Created timing file @ {path_timing_file}")
+        if config.GLOBAL_CONFIG.metrics_textfile:
+            run_timing.write_prometheus(config.GLOBAL_CONFIG.metrics_textfile)
+    except OSError:
+        logging.warning("Could not write the timing of the collection run")
+
+
+def _probe_config_fingerprints(switches):
+    """Runs CONFIG_CHANGE_PROBE on the switches, so the snapshot tells the next 'update' when their config changed last.
+    The probe runs before the config gets pulled, so a change in between only causes one more pull on the next update."""
+    probe_outputs = _run_raw_command(switches, CONFIG_CHANGE_PROBE)
+    for switch_element in switches:
+        switch_element.parse_config_fingerprint(probe_outputs.get(switch_element.ip))
+
+
+def _find_changed_switches(reachable_switches, previous_config, path_previous_file):
+    """Returns the switches, whose config changed since the previous file, based on CONFIG_CHANGE_PROBE"""
+    _probe_config_fingerprints(reachable_switches)
+
+    changed_switches = []
+    for switch_element in reachable_switches:
+        previous_switch_config = previous_config.get(switch_element.ip, {})
+        config_unchanged = switch_element.config_fingerprint != "" \
+            and switch_element.config_fingerprint == previous_switch_config.get("config_fingerprint") \
+            and previous_switch_config.get("eth_interfaces")
+        if not config_unchanged:
+            changed_switches.append(switch_element)
+
+    logging.info(f"{len(changed_switches)} of {len(reachable_switches)} switches changed since {Path(path_previous_file).name}.")
+    return changed_switches
+
+
+def _collect_into_checkpoint(reachable_switches, switches_to_fetch, path_snapshot_file, mode="x", previous_config=None):
+    """Streams the config of switches_to_fetch into the checkpoint of path_snapshot_file ('<name>.partial'), which keeps
+    every finished switch, also if the run gets interrupted. The other reachable switches are copied from
+    previous_config, if given. Returns the path of the snapshot in the configured 'snapshot_format' or None."""
+    ndjson_format = config.GLOBAL_CONFIG.snapshot_format == "ndjson"
+    try:
+        # For the other formats the checkpoint keeps its partial name until it is converted, so it never becomes a snapshot,
+        # which e.g. a delta file could take as its base
+        with NdjsonSnapshotWriter(path_snapshot_file, mode, complete_on_close=ndjson_format) as snapshot_writer:
+            if previous_config is not None:
+                ips_to_fetch = {switch_element.ip for switch_element in switches_to_fetch}
+                for switch_element in reachable_switches:
+                    if switch_element.ip not in ips_to_fetch:
+                        switch_element.interface_eth_config = previous_config[switch_element.ip]["eth_interfaces"]
+                        snapshot_writer.write(switch_element.ip, switch_element.snapshot_entry())
+            if switches_to_fetch:
+                _run_show_command_timed(switches_to_fetch, "show derived-config | begin interface", snapshot_writer)
+    except KeyboardInterrupt:
+        logging.warning(f"Collection interrupted. Finished switches are kept @ {path_snapshot_file}{PARTIAL_SUFFIX}. "
+                        f"Collect the missing ones with 'main.py fetch --resume' or 'resume' in the menu.")
+        raise
+    except FileExistsError:
+        logging.error(f"Could not create result file, {path_snapshot_file} or the checkpoint of an interrupted retrieval "
+                      f"({path_snapshot_file.name}{PARTIAL_SUFFIX}) already exists. Resume it with 'main.py fetch --resume' or 'resume' in the menu.")
+        return None
+    except OSError:
+        logging.error("Could not create result file")
+        return None
     logging.info("Finished fetching switch config.")
-    return parsed_config
+
+    if ndjson_format:
+        logging.info(f"Created result file @ {path_snapshot_file}")
+        return path_snapshot_file
+    return _convert_checkpoint(snapshot_writer.path_partial_file, path_snapshot_file, reachable_switches)
+
+
+def _convert_checkpoint(path_checkpoint_file, path_snapshot_file, reachable_switches):
+    """Stores the completed checkpoint in the configured 'snapshot_format', with the switches in the order of the
+    inventory, and removes it. If that fails, the checkpoint is completed as NDJSON file (path_snapshot_file).
+    The switches are read from the checkpoint one by one, while they get written, so memory stays flat."""
+    # Switches of a resumed run, which are no longer in the inventory, come last
+    with NdjsonSnapshot(path_checkpoint_file, [switch_element.ip for switch_element in reachable_switches]) as collected_config:
+        config_path = save_parsed_cli_output(collected_config)
+    if config_path is None:
+        os.replace(path_checkpoint_file, path_snapshot_file)
+        logging.warning(f"Kept the collected config @ {path_snapshot_file}")
+        return path_snapshot_file
+    Path(path_checkpoint_file).unlink()
+    return config_path
+
+
+def _new_snapshot_path():
+    timestamp_url_safe = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+    return Path.cwd() / "raw_output/interface_eth_config" / (timestamp_url_safe + NDJSON_SUFFIX)
+
+
+def fetch_and_save_switch_config(path_previous_file=None):
+    """Retrieves a new 'Interface Ethernet Config' file and returns its path. With path_previous_file, only switches
+    whose config changed since that file get pulled, the others are copied from it."""
+    if path_previous_file is None:
+        reachable_switches = _import_and_validate_switches()
+        _probe_config_fingerprints(reachable_switches)
+        return _collect_into_checkpoint(reachable_switches, reachable_switches, _new_snapshot_path())
+
+    with open_snapshot(path_previous_file) as previous_config:
+        reachable_switches = _import_and_validate_switches()
+        switches_to_fetch = _find_changed_switches(reachable_switches, previous_config, path_previous_file)
+        return _collect_into_checkpoint(reachable_switches, switches_to_fetch, _new_snapshot_path(), previous_config=previous_config)
+
+
+def collect_mac_address_tables():
+    """Pulls the MAC address tables of all switches into the MAC location index, which the MAC address batch lookup uses
+    to find the edge port of a MAC. Trunks are taken from the latest 'Interface Ethernet Config' file, if there is one."""
+    from tool import MAC_TABLE_COMMAND, update_mac_location_index
+
+    reachable_switches = _import_and_validate_switches()
+    raw_cli_outputs = _run_raw_command(reachable_switches, MAC_TABLE_COMMAND)
+
+    file_list = fetch_interface_config_files()
+    if not file_list:
+        logging.warning("Could not find a 'show run' file. Only uplinks by name and port-channels count as non-edge interfaces.")
+        return update_mac_location_index(reachable_switches, raw_cli_outputs)
+    logging.info(f"Taking the trunk interfaces from {file_list[-1].name}.")
+    with open_snapshot(file_list[-1]) as switch_configs:
+        return update_mac_location_index(reachable_switches, raw_cli_outputs, switch_configs)
+
+
+def fetch_checkpoint_files():
+    """Returns the checkpoints of interrupted collection runs, the latest last"""
+    return list_partial_snapshots(Path.cwd() / "raw_output/interface_eth_config")
+
+
+def resume_switch_config(path_checkpoint_file):
+    """Collects the switches, which are missing in the checkpoint of an interrupted run or failed there, into the same
+    checkpoint and returns the path of the completed file"""
+    path_snapshot_file = Path(str(path_checkpoint_file)[:-len(PARTIAL_SUFFIX)])
+    collected_ips = {ip for ip, switch_entry in iter_ndjson_snapshot(path_checkpoint_file) if switch_entry.get("eth_interfaces")}
+
+    reachable_switches = _import_and_validate_switches()
+    missing_switches = [switch_element for switch_element in reachable_switches if switch_element.ip not in collected_ips]
+    logging.info(f"{len(reachable_switches) - len(missing_switches)} of {len(reachable_switches)} switches are collected "
+                 f"in {Path(path_checkpoint_file).name}. Resuming with the {len(missing_switches)} missing ones.")
+    _probe_config_fingerprints(missing_switches)
+    return _collect_into_checkpoint(reachable_switches, missing_switches, path_snapshot_file, mode="a")
+
+
+@profile_phase("snapshot_write")
+def save_parsed_cli_output(parsed_cli_output):
+    """Stores the parsed cli output (any mapping ip -> switch entry) in the configured 'snapshot_format' and returns
+    name of the file"""
+    if config.GLOBAL_CONFIG.snapshot_format == "compact":
+        return save_parsed_cli_output_as_compact_file(parsed_cli_output)
+    if config.GLOBAL_CONFIG.snapshot_format == "delta":
+        return save_parsed_cli_output_as_delta(parsed_cli_output)
+    if config.GLOBAL_CONFIG.snapshot_format == "ndjson":
+        return save_parsed_cli_output_as_ndjson(parsed_cli_output)
+    return save_parsed_cli_output_as_json(parsed_cli_output)
+
+
+def save_parsed_cli_output_as_delta(parsed_cli_output):
+    """Stores the parsed cli output as delta on the latest base file (or as new base) and returns name of the file"""
+    local_time = datetime.now()
+    timestamp_url_safe = local_time.strftime("%Y-%m-%dT%H-%M-%S")
+    try:
+        file_path = write_snapshot_with_delta(parsed_cli_output, Path.cwd() / "raw_output/interface_eth_config", timestamp_url_safe,
+                                              config.GLOBAL_CONFIG.delta_base_interval, config.GLOBAL_CONFIG.delta_max_changed_ratio)
+        logging.info(f"Created result file @ {file_path}")
+        return file_path
+    except Exception:
+        logging.error("Could not create result file")
+
+
+def save_parsed_cli_output_as_compact_file(parsed_cli_output):
+    """Stores the parsed cli output as compact file (.ntks) and returns name of the file"""
+    local_time = datetime.now()
+    timestamp_url_safe = local_time.strftime("%Y-%m-%dT%H-%M-%S")
+    file_path = Path.cwd() / "raw_output/interface_eth_config" / (timestamp_url_safe + COMPACT_SUFFIX)
+    try:
+        write_compact_snapshot(parsed_cli_output, file_path)
+        logging.info(f"Created result file @ {file_path}")
+        return file_path
+    except Exception:
+        logging.error("Could not create result file")
+
+
+def save_parsed_cli_output_as_ndjson(parsed_cli_output):
+    """Stores the parsed cli output as NDJSON file, one line per switch, and returns name of the file"""
+    local_time = datetime.now()
+    timestamp_url_safe = local_time.strftime("%Y-%m-%dT%H-%M-%S")
+    file_path = Path.cwd() / "raw_output/interface_eth_config" / (timestamp_url_safe + NDJSON_SUFFIX)
+    try:
+        write_ndjson_snapshot(parsed_cli_output, file_path)
+        logging.info(f"Created result file @ {file_path}")
+        return file_path
+    except Exception:
+        logging.error("Could not create result file")
 
 
 def save_parsed_cli_output_as_json(parsed_cli_output):
@@ -59,7 +297,7 @@ def save_parsed_cli_output_as_json(parsed_cli_output):
     file_path = Path.cwd() / str_file_path
     try:
         with open(file_path, "x") as json_file:
-            json.dump(parsed_cli_output, json_file, indent=2)
+            dump_mapping(parsed_cli_output, json_file, indent=2)
             logging.info(f"Created result file @ {file_path}")
         return file_path
     except Exception:
@@ -70,25 +308,37 @@ def search_command_user_input():
     file_list = fetch_interface_config_files()
 
     if not file_list:
-        logging.warning("Could not find a 'show run' file. Retrieving now!")
-        switch_config = fetch_switch_config()
-        config_path = save_parsed_cli_output_as_json(switch_config)
+        checkpoint_files = fetch_checkpoint_files()
+        if checkpoint_files:
+            logging.warning("Could not find a 'show run' file. Resuming the interrupted retrieval now!")
+            config_path = resume_switch_config(checkpoint_files[-1])
+        else:
+            logging.warning("Could not find a 'show run' file. Retrieving now!")
+            config_path = fetch_and_save_switch_config()
         file_list.append(config_path)
 
-    logging.info(f"Found {len(file_list)} 'Interface Ethernet Config' files. The latest is from {file_list[-1].name.strip('.json')}.")
+    logging.info(f"Found {len(file_list)} 'Interface Ethernet Config' files. The latest is from {file_list[-1].stem}.")
     print("[ENTER]:     Use latest file\n"
           "get:         Retrieve a new file now\n"
+          "update:      Retrieve a new file, but only pull switches whose config changed since the latest file\n"
+          "resume:      Continue the latest interrupted retrieval, only pull the switches still missing\n"
           "dir:         Show a list of all files\n"
           "[filename]:  Use the specified file")
 
     path_output_file = prompt_to_select_output_file(file_list)
 
-    print(r"""    Usage: "[search mask]" [flags]
+    print(r"""    Usage: [search mask] [flags]
+    Search mask:
+    "line"      Interface has exactly this config line
+    ~"text"     Interface has a config line containing the text
+    /regex/i    Interface has a config line matching the regex (i: ignore case)
+    NOT, AND, OR and ( ) combine them
     Flags/Options: 
     --n     Turn to negative search mode. Will list all interfaces, which wont fit the search mask.
     --o     Tries to strip off out-of-band-management interfaces
     --u     Tries to strip off uplink interfaces
-    Example: "switchport mode access" --n --u""")
+    Example: "switchport mode access" --n --u
+    Example: "switchport mode access" AND NOT (~"dot1x" OR /^mab/) --o""")
 
     search_mask, search_mask_flags = prompt_for_search_command()
     search_result = search_in_output_file(path_output_file, search_mask, search_mask_flags)
@@ -100,7 +350,8 @@ def fetch_interface_config_files():
     path_raw_output = Path.cwd() / 'raw_output/interface_eth_config'
 
     try:
-        all_files = list(path_raw_output.glob("**/*.json"))
+        # File names are timestamps, so sorting them puts the latest file last
+        all_files = sorted(file for file in path_raw_output.glob("**/*") if file.suffix in SNAPSHOT_SUFFIXES)
         return all_files
     except FileNotFoundError:
         logging.error(f"Could not find {path_raw_output}")
@@ -120,60 +371,94 @@ def prompt_to_select_output_file(filtered_file_list):
             logging.info(f"Using file '{user_input}'")
             return absolute_file_path
         elif user_input == "get":
-            switch_config = fetch_switch_config()
-            config_path = save_parsed_cli_output_as_json(switch_config)
-            return config_path
+            return fetch_and_save_switch_config()
+        elif user_input == "update":
+            return fetch_and_save_switch_config(filtered_file_list[-1])
+        elif user_input == "resume":
+            checkpoint_files = fetch_checkpoint_files()
+            if not checkpoint_files:
+                logging.warning("There is no interrupted retrieval to resume.")
+                continue
+            return resume_switch_config(checkpoint_files[-1])
         elif user_input == "dir" or user_input == "ls":
             print(f"{[file_path.name for file_path in filtered_file_list]}")
         else:
             logging.warning(f"'{user_input}' was not found in directory.")
 
 
-# TODO https://regex101.com/r/p50usT/3 RegEx vebessern
 def prompt_for_search_command():
-    negative_search = False
-    strip_oobm = False
-    strip_uplink = False
+    from tool import compile_search_query, SearchQueryError
 
     search_mask = input("Search mask: ")
-    mask_pattern = re.compile(r"^[\"'](.*)[\"']((?: |--\w+)*)", re.IGNORECASE)
+    # Flags follow the search mask, e.g. '"switchport mode access" --n --u'
+    mask_pattern = re.compile(r"^(.*?)((?:\s*--\w+)*)\s*$", re.DOTALL)
     match_mask = mask_pattern.search(search_mask)
 
-    if not match_mask:
-        logging.warning("Search mask is empty or the quotation marks are missing")
+    if not match_mask.group(1).strip():
+        logging.warning("Search mask is empty")
+        return prompt_for_search_command()
+    try:
+        search_query = compile_search_query(match_mask.group(1))
+    except SearchQueryError as e:
+        logging.warning(f"Invalid search mask: {e}")
         return prompt_for_search_command()
 
-    if match_mask.group(2).find("--n") != -1:
-        negative_search = True
-    if match_mask.group(2).find("--o") != -1:
-        strip_oobm = True
-    if match_mask.group(2).find("--u") != -1:
-        strip_uplink = True
+    negative_search = match_mask.group(2).find("--n") != -1
+    strip_oobm = match_mask.group(2).find("--o") != -1
+    strip_uplink = match_mask.group(2).find("--u") != -1
 
     search_mask_flags = SearchMaskFlags(negative_search, strip_oobm, strip_uplink)
-    logging.info(f"Mask: '{match_mask.group(1)}'. Set {search_mask_flags}.")
-    return match_mask.group(1), search_mask_flags
+    logging.info(f"Mask: '{search_query}'. Set {search_mask_flags}.")
+    return search_query, search_mask_flags
 
 
+@profile_phase("search")
 def search_in_output_file(path_output_file, search_mask, search_mask_flags):
-    with open(path_output_file, mode="r", encoding="utf-8") as serial_output_file:
-        raw_int_eth_config = json.load(serial_output_file)
-
-    search_result = {}
-    uplink_int_pattern = re.compile(r"\d+/(?!0/)\d+/\d+$")
-    for switch_ip, switch_config in raw_int_eth_config.items():
-        interface_list = []
-        for int_name, int_config in switch_config.get("eth_interfaces", {}).items():
-            if search_mask_flags.strip_oobm and int_name.endswith(("FastEthernet0", "GigabitEthernet0/0")):
-                continue
-            if search_mask_flags.strip_uplink and uplink_int_pattern.search(int_name):
-                print(int_name)
-                continue
-            if (search_mask in int_config) != search_mask_flags.negative_search:
-                interface_list.append(int_name)
-        keyname = switch_ip + " - " + switch_config.get("hostname", "No hostname")
-        search_result[keyname] = interface_list
-    return search_result
+    from tool import load_search_index
+    search_index = load_search_index(path_output_file)
+    return search_index.search(search_mask, search_mask_flags)
+
+
+def parse_time_range_limit(user_input, end_of_day=False):
+    """Parses '2022-05-01' or '2022-05-01T09:13'. A date without time covers the whole day."""
+    if not user_input:
+        return None
+    parsed_time = datetime.fromisoformat(user_input)
+    if end_of_day and len(user_input) == 10:
+        parsed_time = parsed_time.replace(hour=23, minute=59, second=59)
+    return parsed_time
+
+
+def prompt_for_time_range():
+    while True:
+        try:
+            since = parse_time_range_limit(input("Since (YYYY-MM-DD, [ENTER] for the oldest file): ").strip())
+            until = parse_time_range_limit(input("Until (YYYY-MM-DD, [ENTER] for the latest file): ").strip(), end_of_day=True)
+            return since, until
+        except ValueError:
+            logging.warning("Invalid date. Use the format YYYY-MM-DD or YYYY-MM-DDTHH:MM.")
+
+
+@profile_phase("search")
+def search_history_in_output_files(since, until, search_query, search_mask_flags):
+    from tool import list_snapshots, search_history
+
+    snapshots = list_snapshots(Path.cwd() / "raw_output/interface_eth_config", since, until)
+    if not snapshots:
+        logging.error("Could not find a 'show run' file in this time range.")
+        return None, []
+    logging.info(f"Searching {len(snapshots)} files from {snapshots[0].name} to {snapshots[-1].name}...")
+    return search_history(snapshots, search_query, search_mask_flags), snapshots
+
+
+def search_history_user_input():
+    since, until = prompt_for_time_range()
+    print(r"""    Usage: [search mask] [flags], like for the interface search.
+    Lists per interface the files, in which the search mask started or stopped to match.""")
+    search_query, search_mask_flags = prompt_for_search_command()
+    history_result, snapshots = search_history_in_output_files(since, until, search_query, search_mask_flags)
+    if history_result is not None:
+        write_search_result(history_result, f"{len(snapshots)} files from {snapshots[0].name} to {snapshots[-1].name}", search_query, search_mask_flags)
 
 
 def write_search_result(search_result, path_output_file, search_mask, search_mask_flags):
@@ -195,6 +480,8 @@ def menue():
               "1 - Interface search\n"
               "2 - MAC address batch lookup\n"
               "3 - Meraki bulk edit\n"
+              "4 - Interface search history\n"
+              "5 - MAC address table collection\n"
               "99 - Show Config Values (global_config.yml)")
         tool_number = input("Tool number: ")
         if tool_number == "1":
@@ -204,9 +491,18 @@ def menue():
         elif tool_number == "2":
             print("\033[H\033[J", end="")  # Flush terminal
             logging.info("Tool: 'MAC address batch lookup' started")
+            from tool import mac_address_batch_lookup
             mac_address_batch_lookup()
         elif tool_number == "3":
             print("Tool will soon be available.")
+        elif tool_number == "4":
+            print("\033[H\033[J", end="")  # Flush terminal
+            logging.info("Tool: 'Interface search history' started")
+            search_history_user_input()
+        elif tool_number == "5":
+            print("\033[H\033[J", end="")  # Flush terminal
+            logging.info("Tool: 'MAC address table collection' started")
+            collect_mac_address_tables()
         elif tool_number == "99":
             print(config.GLOBAL_CONFIG)
         else:
@@ -218,14 +514,232 @@ def check_all_prerequisites():
     config.GLOBAL_CONFIG = config.load_global_config()
 
 
+def _select_output_file(file_name):
+    """Returns the config file for the CLI: 'latest' or the name of a file in raw_output/interface_eth_config"""
+    file_list = fetch_interface_config_files()
+    if file_name == "latest":
+        if not file_list:
+            logging.error("Could not find a 'show run' file. Run 'fetch' first.")
+            sys.exit(1)
+        return file_list[-1]
+    for path_output_file in file_list:
+        if file_name in (path_output_file.name, str(path_output_file)):
+            return path_output_file
+    logging.error(f"'{file_name}' was not found in directory.")
+    sys.exit(1)
+
+
+def _select_checkpoint_file(file_name):
+    checkpoint_files = fetch_checkpoint_files()
+    if not checkpoint_files:
+        logging.error("There is no interrupted retrieval to resume.")
+        sys.exit(1)
+    if file_name == "latest":
+        return checkpoint_files[-1]
+    for path_checkpoint_file in checkpoint_files:
+        if file_name in (path_checkpoint_file.name, str(path_checkpoint_file), path_checkpoint_file.name[:-len(PARTIAL_SUFFIX)]):
+            return path_checkpoint_file
+    logging.error(f"'{file_name}' is no interrupted retrieval. Found: {', '.join(path_file.name for path_file in checkpoint_files)}")
+    sys.exit(1)
+
+
+def cli_fetch(args):
+    check_all_prerequisites()
+    if args.snapshot_format is not None:
+        config.GLOBAL_CONFIG = replace(config.GLOBAL_CONFIG, snapshot_format=args.snapshot_format)
+
+    if args.resume is not None:
+        config_path = resume_switch_config(_select_checkpoint_file(args.resume))
+    else:
+        path_previous_file = None if args.update is None else _select_output_file(args.update)
+        config_path = fetch_and_save_switch_config(path_previous_file)
+    if config_path is None:
+        sys.exit(1)
+    print(config_path)
+
+
+def cli_search(args):
+    from tool import compile_search_query, SearchQueryError
+
+    try:
+        search_query = compile_search_query(args.search_mask)
+    except SearchQueryError as e:
+        logging.error(f"Invalid search mask: {e}")
+        sys.exit(2)
+    path_output_file = _select_output_file(args.file)
+    search_mask_flags = SearchMaskFlags(args.negative, args.strip_oobm, args.strip_uplink)
+    logging.info(f"Mask: '{search_query}'. Set {search_mask_flags}.")
+    search_result = search_in_output_file(path_output_file, search_query, search_mask_flags)
+    if args.save:
+        write_search_result(search_result, path_output_file, search_query, search_mask_flags)
+    else:
+        json.dump(search_result, sys.stdout, indent=2)
+        print()
+
+
+def cli_history(args):
+    from tool import compile_search_query, SearchQueryError
+
+    try:
+        search_query = compile_search_query(args.search_mask)
+        since = parse_time_range_limit(args.since)
+        until = parse_time_range_limit(args.until, end_of_day=True)
+    except (SearchQueryError, ValueError) as e:
+        logging.error(f"Invalid argument: {e}")
+        sys.exit(2)
+    search_mask_flags = SearchMaskFlags(args.negative, args.strip_oobm, args.strip_uplink)
+    history_result, snapshots = search_history_in_output_files(since, until, search_query, search_mask_flags)
+    if history_result is None:
+        sys.exit(1)
+    if args.save:
+        write_search_result(history_result, f"{len(snapshots)} files from {snapshots[0].name} to {snapshots[-1].name}", search_query, search_mask_flags)
+    else:
+        json.dump(history_result, sys.stdout, indent=2)
+        print()
+
+
+def cli_diff(args):
+    from tool import diff_snapshots
+
+    if args.new_file is None:
+        file_list = fetch_interface_config_files()
+        if len(file_list) < 2:
+            logging.error("Need two 'show run' files to compare. Run 'fetch' first.")
+            sys.exit(1)
+        path_old_file = file_list[-2] if args.old_file is None else _select_output_file(args.old_file)
+        path_new_file = file_list[-1]
+    else:
+        path_old_file, path_new_file = _select_output_file(args.old_file), _select_output_file(args.new_file)
+
+    with profile_phase("diff"):
+        diff_result = diff_snapshots(path_old_file, path_new_file)
+    if args.save:
+        path_results = Path("results") / (datetime.now().strftime("%Y-%m-%dT%H-%M-%S") + ".json")
+        with open(path_results, "x") as json_file:
+            json_file.write(f"Changes from {path_old_file.name} to {path_new_file.name}.\n\n")
+            json.dump(diff_result, json_file, indent=2)
+        logging.info(f"Wrote {path_results}. Diff is done.")
+    else:
+        json.dump(diff_result, sys.stdout, indent=2)
+        print()
+
+
+def cli_compact(args):
+    from network_toolkit.snapshot import compact_snapshots
+
+    check_all_prerequisites()
+    path_raw_output = Path.cwd() / "raw_output/interface_eth_config"
+    if not path_raw_output.is_dir():
+        logging.error(f"Could not find {path_raw_output}")
+        sys.exit(1)
+    try:
+        compact_snapshots(path_raw_output, config.GLOBAL_CONFIG.delta_base_interval, config.GLOBAL_CONFIG.delta_max_changed_ratio)
+    except FileExistsError as e:
+        logging.error(f"Could not compact the files, nothing was changed: {e}")
+        sys.exit(1)
+
+
+def cli_mac_lookup(args):
+    from tool import mac_address_batch_lookup
+    # MACs come from the arguments or, e.g. in a pipe, from stdin
+    user_input = "\n".join(args.mac_addresses) if args.mac_addresses else sys.stdin.read()
+    mac_address_batch_lookup(user_input)
+
+
+def cli_mac_table(args):
+    check_all_prerequisites()
+    print(collect_mac_address_tables())
+
+
+def cli_menu(args):
+    check_all_prerequisites()
+    menue()
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(prog="network-toolkit", description="Without a command the interactive menu starts.")
+    parser.add_argument("--debug", action="store_true", help="Log debug messages")
+    parser.add_argument("--profile", action="store_true", help="Write a CPU and memory profile of every phase (import, "
+                                                               "reachability, validation, collection, write, search)")
+    parser.add_argument("--profile-dir", default="profiles", help="Directory of the profiles (default: profiles)")
+    parser.set_defaults(handler=cli_menu)
+    subparsers = parser.add_subparsers(title="commands")
+
+    fetch_parser = subparsers.add_parser("fetch", help="Retrieve a new 'Interface Ethernet Config' file and print its path")
+    fetch_source = fetch_parser.add_mutually_exclusive_group()
+    fetch_source.add_argument("--update", nargs="?", const="latest", metavar="FILE",
+                              help="Only pull switches whose config changed since FILE (default: latest file)")
+    fetch_source.add_argument("--resume", nargs="?", const="latest", metavar="FILE",
+                              help="Continue an interrupted retrieval (FILE.partial, default: latest) and only pull the switches still missing")
+    fetch_parser.add_argument("--format", dest="snapshot_format", choices=["json", "compact", "delta", "ndjson"], help="Overrides 'snapshot_format'")
+    fetch_parser.set_defaults(handler=cli_fetch)
+
+    search_parser = subparsers.add_parser("search", help="Search interfaces by config line and print the result as JSON")
+    search_parser.add_argument("search_mask", help="Config line to search for, e.g. 'switchport mode access', or a query like "
+                                                   "'\"switchport mode access\" AND NOT (~\"dot1x\" OR /^mab/)'")
+    search_parser.add_argument("--file", default="latest", help="Name of the config file (default: latest file)")
+    search_parser.add_argument("-n", "--negative", action="store_true", help="List all interfaces, which don't fit the search mask")
+    search_parser.add_argument("-o", "--strip-oobm", action="store_true", help="Strip off out-of-band-management interfaces")
+    search_parser.add_argument("-u", "--strip-uplink", action="store_true", help="Strip off uplink interfaces")
+    search_parser.add_argument("--save", action="store_true", help="Write the result to results/ instead of stdout")
+    search_parser.set_defaults(handler=cli_search)
+
+    history_parser = subparsers.add_parser("history", help="List per interface the files, in which the search mask started or stopped to match")
+    history_parser.add_argument("search_mask", help="Search mask like for 'search'")
+    history_parser.add_argument("--since", help="Oldest file to search, YYYY-MM-DD or YYYY-MM-DDTHH:MM (default: oldest file)")
+    history_parser.add_argument("--until", help="Latest file to search, YYYY-MM-DD or YYYY-MM-DDTHH:MM (default: latest file)")
+    history_parser.add_argument("-n", "--negative", action="store_true", help="Track interfaces, which don't fit the search mask")
+    history_parser.add_argument("-o", "--strip-oobm", action="store_true", help="Strip off out-of-band-management interfaces")
+    history_parser.add_argument("-u", "--strip-uplink", action="store_true", help="Strip off uplink interfaces")
+    history_parser.add_argument("--save", action="store_true", help="Write the result to results/ instead of stdout")
+    history_parser.set_defaults(handler=cli_history)
+
+    diff_parser = subparsers.add_parser("diff", help="List the added, removed and changed interfaces and config lines between two files")
+    diff_parser.add_argument("old_file", nargs="?", help="Name of the older config file (default: the file before the latest)")
+    diff_parser.add_argument("new_file", nargs="?", help="Name of the newer config file (default: latest file)")
+    diff_parser.add_argument("--save", action="store_true", help="Write the result to results/ instead of stdout")
+    diff_parser.set_defaults(handler=cli_diff)
+
+    compact_parser = subparsers.add_parser("compact", help="Rewrite all 'Interface Ethernet Config' files as base files plus deltas")
+    compact_parser.set_defaults(handler=cli_compact)
+
+    mac_lookup_parser = subparsers.add_parser("mac-lookup", help="Resolve the vendors of MAC addresses given as arguments or via stdin "
+                                                                 "and, after 'mac-table', their edge ports")
+    mac_lookup_parser.add_argument("mac_addresses", nargs="*", metavar="MAC")
+    mac_lookup_parser.set_defaults(handler=cli_mac_lookup)
+
+    mac_table_parser = subparsers.add_parser("mac-table", help="Collect the MAC address tables of all switches, so 'mac-lookup' "
+                                                               "also prints the edge port of every MAC")
+    mac_table_parser.set_defaults(handler=cli_mac_table)
+    return parser
+
+
+def run_cli(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    if args.debug:
+        logging.getLogger().setLevel(logging.DEBUG)
+    if not args.profile:
+        args.handler(args)
+        return
+
+    start_profiling(args.profile_dir)
+    try:
+        args.handler(args)
+    finally:
+        # Also after CTRL+C, which ends the interactive menu
+        stop_profiling()
+
+
 def signal_handler(sig, frame):
-    # Signal handler for processing CTRL+C
+    # Signal handler for processing CTRL+C. Unwinds like an exception, so a collection keeps its checkpoint
     logging.warning("Received keyboard interrupt. Stopping!")
-    quit()
+    raise KeyboardInterrupt
 
 
 signal.signal(signal.SIGINT, signal_handler)
 
 if is_main():
-    check_all_prerequisites()
-    menue()
+    try:
+        run_cli()
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -0,0 +1,154 @@
+"""Profiling mode (main.py --profile): CPU and memory profile of every phase of the toolkit.
+
+Per phase, numbered in the order they ran, e.g. '03_collection':
+    .prof           cProfile stats of the main thread and all threads started during the phase (snakeviz, gprof2dot,
+                    flameprof, python -m pstats)
+    .memory.folded  memory allocated during the phase and still allocated at its end by call stack (tracemalloc), in
+                    the collapsed stack format of flamegraph.pl and speedscope
+    .memory.txt     top allocation sites and peak memory
+
+summary.txt lists wall time, CPU time and peak memory per phase. Memory counts only allocations of the phase itself. Parsing runs on the worker threads of the collection,
+so it is listed as cumulative time of parse_interface_cli_output within the collection. Worker processes (history search)
+are not profiled. Phases within a phase count to the outer one.
+"""
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+TRACEMALLOC_FRAMES = 25
+TOP_ALLOCATIONS = 30
+# Functions, whose cumulative time gets its own line in the summary
+SUMMARY_FUNCTIONS = {"parse_interface_cli_output": "parsing"}
+
+_session = None
+
+
+class _ThreadStats:
+    """Stats of a thread profiler in the shape pstats.Stats.add() expects, without disabling the profiler from this thread"""
+
+    def __init__(self, profiler):
+        profiler.snapshot_stats()
+        self.stats = profiler.stats
+
+    def create_stats(self):
+        pass
+
+
+class ProfilingSession:
+    def __init__(self, path_directory):
+        self.path = Path(path_directory)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.phase_count = 0
+        self.summary_lines = []
+        self._active_phase = None
+        self._thread_profilers = []
+        self._lock = threading.Lock()
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def _start_thread_profiler(self, frame, event, arg):
+        # Runs once as first profile event of every thread started during the phase
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._thread_profilers.append(profiler)
+        profiler.enable()
+
+    @contextmanager
+    def phase(self, name):
+        if self._active_phase is not None:
+            yield
+            return
+
+        self.phase_count += 1
+        self._active_phase = f"{self.phase_count:02d}_{name}"
+        self._thread_profilers = []
+        # Only allocations of this phase get traced, comparing snapshots of the whole heap takes minutes
+        tracemalloc.clear_traces()
+        main_profiler = cProfile.Profile()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        threading.setprofile(self._start_thread_profiler)
+        main_profiler.enable()
+        try:
+            yield
+        finally:
+            main_profiler.disable()
+            threading.setprofile(None)
+            wall_time, cpu_time = time.perf_counter() - start_wall, time.process_time() - start_cpu
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            memory_snapshot = tracemalloc.take_snapshot()
+            try:
+                self._write_phase(main_profiler, memory_snapshot, wall_time, cpu_time, peak_memory)
+            except OSError:
+                logging.warning(f"Could not write the profile of phase '{self._active_phase}' @ {self.path}")
+            self._active_phase = None
+
+    def _write_phase(self, main_profiler, memory_snapshot, wall_time, cpu_time, peak_memory):
+        path_prefix = self.path / self._active_phase
+        stats = pstats.Stats(main_profiler)
+        with self._lock:
+            for profiler in self._thread_profilers:
+                stats.add(_ThreadStats(profiler))
+        stats.dump_stats(str(path_prefix) + ".prof")
+
+        own_files = {tracemalloc.__file__, __file__}
+        memory_statistics = [statistic for statistic in memory_snapshot.statistics("traceback") if statistic.traceback[-1].filename not in own_files]
+        retained_memory = sum(statistic.size for statistic in memory_statistics)
+        retained_by_line = {}
+        file_names = {}
+        with open(str(path_prefix) + ".memory.folded", mode="w", encoding="utf-8") as folded_file:
+            for statistic in memory_statistics:
+                # Like collapsed stacks, the traceback goes from the outermost to the innermost frame
+                frame = statistic.traceback[-1]
+                retained_by_line[(frame.filename, frame.lineno)] = retained_by_line.get((frame.filename, frame.lineno), 0) + statistic.size
+                frames = ";".join(f"{file_names.setdefault(frame.filename, os.path.basename(frame.filename))}:{frame.lineno}" for frame in statistic.traceback)
+                folded_file.write(f"{frames} {statistic.size}\n")
+        with open(str(path_prefix) + ".memory.txt", mode="w", encoding="utf-8") as memory_file:
+            memory_file.write(f"Peak memory: {peak_memory / 2 ** 20:.1f} MiB, retained after the phase: {retained_memory / 2 ** 20:.1f} MiB\n\n")
+            top_lines = sorted(retained_by_line.items(), key=lambda item: item[1], reverse=True)[:TOP_ALLOCATIONS]
+            for (filename, lineno), size in top_lines:
+                memory_file.write(f"{filename}:{lineno}: {size / 1024:.1f} KiB\n")
+
+        line = f"{self._active_phase:<24} wall {wall_time:8.2f}s  cpu {cpu_time:8.2f}s  peak {peak_memory / 2 ** 20:8.1f} MiB"
+        for (_, _, function_name), (_, _, _, cumulative_time, _) in stats.stats.items():
+            if function_name in SUMMARY_FUNCTIONS:
+                line += f"  {SUMMARY_FUNCTIONS[function_name]} {cumulative_time:.2f}s"
+        self.summary_lines.append(line)
+        logging.info(f"Profile: {line}")
+
+    def finish(self):
+        tracemalloc.stop()
+        with open(self.path / "summary.txt", mode="w", encoding="utf-8") as summary_file:
+            summary_file.write("\n".join(self.summary_lines) + "\n")
+        logging.info(f"Wrote profiles of {self.phase_count} phases @ {self.path}. Open the .prof files e.g. with 'snakeviz'.")
+
+
+def start_profiling(path_directory):
+    """Profiles all following phases into a new directory below path_directory, named by the current time"""
+    global _session
+    _session = ProfilingSession(Path(path_directory) / datetime.now().strftime("%Y-%m-%dT%H-%M-%S"))
+    return _session
+
+
+def stop_profiling():
+    global _session
+    if _session is not None:
+        _session.finish()
+        _session = None
+
+
+@contextmanager
+def profile_phase(name):
+    """Profiles the block as phase, if the profiling mode is on"""
+    if _session is None:
+        yield
+        return
+    with _session.phase(name):
+        yield
@@ -0,0 +1,43 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread safe token bucket: refills 'rate' tokens per second up to 'burst' tokens. acquire() blocks until a token is free."""
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.burst = max(burst, 1)
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+    def pause(self, seconds):
+        """Empties the bucket for the given time, e.g. after the server answered 'Too Many Requests'"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=30.0):
+    """Exponential backoff with full jitter for the given (0 based) retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
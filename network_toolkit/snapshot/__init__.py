@@ -0,0 +1,9 @@
+from .compact_format import CompactSnapshot, convert_json_snapshot, write_compact_snapshot
+from .delta_storage import compact_snapshots, write_snapshot_with_delta
+from .json_format import dump_mapping
+from .ndjson_format import NdjsonSnapshot, NdjsonSnapshotWriter, write_ndjson_snapshot
+from .snapshot_loader import load_snapshot, open_snapshot, snapshot_signature, SNAPSHOT_SUFFIXES
+
+__all__ = ["CompactSnapshot", "convert_json_snapshot", "write_compact_snapshot", "load_snapshot", "open_snapshot", "snapshot_signature", "SNAPSHOT_SUFFIXES",
+           "compact_snapshots", "write_snapshot_with_delta", "dump_mapping", "NdjsonSnapshot",
+           "NdjsonSnapshotWriter", "write_ndjson_snapshot"]
@@ -0,0 +1,194 @@
+# -*- coding: UTF-8 -*-
+"""Compact 'Interface Ethernet Config' file (.ntks), which stores every distinct string only once.
+
+Layout (all integers are unsigned 32 bit, little endian):
+    b"NTKS" | version | length of header | header (JSON) | padding to 4 bytes
+    interfaces:     3 integers per interface: string id of the name, index of its first line ref, number of lines
+    line refs:      string id per config line
+    string offsets: start of every string in the string data, plus the end of the last string
+    string data:    all strings UTF-8 encoded, back to back
+
+The header holds the switches (ip, hostname, reachable, config_fingerprint and their range of interfaces) and the
+length of the arrays. Files are opened via mmap, so only the header gets parsed on open and strings are decoded on
+first access.
+"""
+import argparse
+import json
+import logging
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+
+COMPACT_SUFFIX = ".ntks"
+MAGIC = b"NTKS"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")
+
+
+def _to_little_endian(values):
+    if sys.byteorder != "little":
+        values = array("I", values)
+        values.byteswap()
+    return values
+
+
+class CompactSnapshot(Mapping):
+    """Read-only mapping ip -> switch entry, which behaves like the dict of a JSON config file"""
+
+    def __init__(self, path_snapshot_file):
+        self.path = Path(path_snapshot_file)
+        with open(self.path, mode="rb") as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_length = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is no compact config file of version {FORMAT_VERSION}")
+        header_end = _PREAMBLE.size + header_length
+        header = json.loads(self._mmap[_PREAMBLE.size:header_end].decode("utf-8"))
+
+        self.switches = header["switches"]
+        self._switch_ids = {switch["ip"]: switch_id for switch_id, switch in enumerate(self.switches)}
+        self.string_count = header["string_count"]
+
+        position = header_end + (-header_end % 4)
+        self.interfaces, position = self._integer_array(position, 3 * header["interface_count"])
+        self.line_refs, position = self._integer_array(position, header["line_ref_count"])
+        self.string_offsets, position = self._integer_array(position, self.string_count + 1)
+        self._string_data_start = position
+        self._strings = [None] * self.string_count
+
+    def _integer_array(self, position, length):
+        end = position + 4 * length
+        if sys.byteorder == "little":
+            values = memoryview(self._mmap)[position:end].cast("I")
+        else:
+            values = array("I", self._mmap[position:end])
+            values.byteswap()
+        return values, end
+
+    def close(self):
+        for name in ("interfaces", "line_refs", "string_offsets"):
+            values = getattr(self, name, None)
+            if isinstance(values, memoryview):
+                values.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def string(self, string_id):
+        string = self._strings[string_id]
+        if string is None:
+            start = self._string_data_start + self.string_offsets[string_id]
+            end = self._string_data_start + self.string_offsets[string_id + 1]
+            string = self._mmap[start:end].decode("utf-8")
+            self._strings[string_id] = string
+        return string
+
+    def iter_interfaces(self, switch_id):
+        """Yields (string id of the interface name, string ids of its config lines) of the switch"""
+        switch = self.switches[switch_id]
+        interfaces = self.interfaces
+        for interface_id in range(switch["first_interface"], switch["first_interface"] + switch["interface_count"]):
+            first_line_ref = interfaces[3 * interface_id + 1]
+            line_count = interfaces[3 * interface_id + 2]
+            yield interfaces[3 * interface_id], self.line_refs[first_line_ref:first_line_ref + line_count].tolist()
+
+    def __getitem__(self, ip):
+        switch_id = self._switch_ids[ip]
+        switch = self.switches[switch_id]
+        eth_interfaces = {}
+        for name_id, line_ids in self.iter_interfaces(switch_id):
+            eth_interfaces[self.string(name_id)] = [self.string(line_id) for line_id in line_ids]
+        return {"hostname": switch["hostname"], "reachable": switch["reachable"], "config_fingerprint": switch["config_fingerprint"], "eth_interfaces": eth_interfaces}
+
+    def __contains__(self, ip):
+        return ip in self._switch_ids
+
+    def __iter__(self):
+        return iter(self._switch_ids)
+
+    def __len__(self):
+        return len(self.switches)
+
+
+def close_snapshot(snapshot):
+    """Unmaps a compact file. Snapshots of the other formats are plain dicts and need no closing."""
+    if isinstance(snapshot, CompactSnapshot):
+        snapshot.close()
+
+
+def write_compact_snapshot(parsed_cli_output, path_snapshot_file, mode="x"):
+    """Stores the parsed cli output ({ip: {hostname, reachable, eth_interfaces}}) as compact config file"""
+    string_ids = {}
+    strings = []
+
+    def intern(string):
+        string_id = string_ids.get(string)
+        if string_id is None:
+            string_id = len(strings)
+            string_ids[string] = string_id
+            strings.append(string)
+        return string_id
+
+    switches = []
+    interfaces = array("I")
+    line_refs = array("I")
+    for switch_ip, switch_config in parsed_cli_output.items():
+        eth_interfaces = switch_config.get("eth_interfaces", {})
+        switches.append({"ip": switch_ip,
+                         "hostname": switch_config.get("hostname", "No hostname"),
+                         "reachable": switch_config.get("reachable", True),
+                         "config_fingerprint": switch_config.get("config_fingerprint", ""),
+                         "first_interface": len(interfaces) // 3,
+                         "interface_count": len(eth_interfaces)})
+        for int_name, int_config in eth_interfaces.items():
+            interfaces.extend((intern(int_name), len(line_refs), len(int_config)))
+            line_refs.extend(map(intern, int_config))
+
+    encoded_strings = [string.encode("utf-8") for string in strings]
+    string_offsets = array("I", [0])
+    for encoded_string in encoded_strings:
+        string_offsets.append(string_offsets[-1] + len(encoded_string))
+
+    header = json.dumps({"switches": switches, "string_count": len(strings), "interface_count": len(interfaces) // 3,
+                         "line_ref_count": len(line_refs)}, separators=(",", ":")).encode("utf-8")
+
+    with open(path_snapshot_file, mode + "b") as snapshot_file:
+        snapshot_file.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        snapshot_file.write(header)
+        snapshot_file.write(b"\0" * (-(_PREAMBLE.size + len(header)) % 4))
+        for values in (interfaces, line_refs, string_offsets):
+            _to_little_endian(values).tofile(snapshot_file)
+        snapshot_file.write(b"".join(encoded_strings))
+
+    logging.debug(f"Stored {len(line_refs)} config lines as {len(strings)} distinct strings.")
+    return Path(path_snapshot_file)
+
+
+def convert_json_snapshot(path_json_file):
+    """Converts a JSON config file into a compact one next to it and returns the path of the new file"""
+    path_json_file = Path(path_json_file)
+    with open(path_json_file, mode="r", encoding="utf-8") as json_file:
+        parsed_cli_output = json.load(json_file)
+
+    path_compact_file = path_json_file.with_suffix(COMPACT_SUFFIX)
+    write_compact_snapshot(parsed_cli_output, path_compact_file)
+    logging.info(f"Converted {path_json_file.name} ({path_json_file.stat().st_size / 2 ** 20:.1f} MiB) "
+                 f"to {path_compact_file.name} ({path_compact_file.stat().st_size / 2 ** 20:.1f} MiB)")
+    return path_compact_file
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%dT%H:%M:%SZ", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Converts JSON 'Interface Ethernet Config' files into compact files (.ntks)")
+    parser.add_argument("json_files", nargs="+", type=Path)
+    for json_file in parser.parse_args().json_files:
+        convert_json_snapshot(json_file)
@@ -0,0 +1,287 @@
+# -*- coding: UTF-8 -*-
+"""Delta storage of 'Interface Ethernet Config' files: periodic full base files plus per-switch deltas.
+
+A delta file ('<timestamp>.delta.json') holds the name of its base file and only the switches, whose entry differs
+from the base (removed switches as null). Deltas are differential, i.e. always relative to the base and never to
+another delta, so every file is rebuilt from exactly two files. A new base is written, once a base has
+'base_interval' deltas or more than 'max_changed_ratio' of the switches changed since the base.
+
+Compaction (python -m network_toolkit.snapshot.delta_storage [directory]) rewrites a directory in this layout: full
+files get folded into deltas, deltas which drifted too far from their base become new bases.
+"""
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+
+from .compact_format import COMPACT_SUFFIX, CompactSnapshot, close_snapshot
+from .json_format import dump_mapping
+from .ndjson_format import NDJSON_SUFFIX, load_ndjson_snapshot
+
+DELTA_SUFFIX = ".delta.json"
+DELTA_VERSION = 1
+
+
+def is_delta_snapshot(path_snapshot_file):
+    return Path(path_snapshot_file).name.endswith(DELTA_SUFFIX)
+
+
+def _load_full_snapshot(path_snapshot_file):
+    if Path(path_snapshot_file).suffix == COMPACT_SUFFIX:
+        return CompactSnapshot(path_snapshot_file)
+    if Path(path_snapshot_file).suffix == NDJSON_SUFFIX:
+        return load_ndjson_snapshot(path_snapshot_file)
+    with open(path_snapshot_file, mode="r", encoding="utf-8") as snapshot_file:
+        return json.load(snapshot_file)
+
+
+def _read_delta(path_delta_file):
+    with open(path_delta_file, mode="r", encoding="utf-8") as delta_file:
+        delta = json.load(delta_file)
+    if delta.get("version") != DELTA_VERSION:
+        raise ValueError(f"{path_delta_file} is no delta file of version {DELTA_VERSION}")
+    return delta
+
+
+def apply_delta(base_snapshot, changed_switches):
+    """Returns the snapshot as dict: switches of the base in their order, replaced or removed by the delta, new ones last"""
+    snapshot = {}
+    for switch_ip in base_snapshot:
+        if switch_ip not in changed_switches:
+            snapshot[switch_ip] = base_snapshot[switch_ip]
+        elif changed_switches[switch_ip] is not None:
+            snapshot[switch_ip] = changed_switches[switch_ip]
+    for switch_ip, switch_entry in changed_switches.items():
+        if switch_ip not in snapshot and switch_entry is not None:
+            snapshot[switch_ip] = switch_entry
+    return snapshot
+
+
+def load_delta_snapshot(path_delta_file, loaded_bases=None):
+    """Rebuilds the snapshot of a delta file. loaded_bases ({file name: snapshot}) saves reading a base twice."""
+    path_delta_file = Path(path_delta_file)
+    delta = _read_delta(path_delta_file)
+    base_snapshot = None if loaded_bases is None else loaded_bases.get(delta["base"])
+    if base_snapshot is not None:
+        return apply_delta(base_snapshot, delta["switches"])
+    base_snapshot = _load_full_snapshot(path_delta_file.parent / delta["base"])
+    try:
+        return apply_delta(base_snapshot, delta["switches"])
+    finally:
+        close_snapshot(base_snapshot)
+
+
+def diff_switches(base_snapshot, parsed_cli_output):
+    """Returns the switches of parsed_cli_output, which differ from the base, and None for the removed ones"""
+    changed_switches = {}
+    for switch_ip, switch_entry in parsed_cli_output.items():
+        if switch_ip not in base_snapshot or base_snapshot[switch_ip] != switch_entry:
+            changed_switches[switch_ip] = switch_entry
+    for switch_ip in base_snapshot:
+        if switch_ip not in parsed_cli_output:
+            changed_switches[switch_ip] = None
+    return changed_switches
+
+
+def _write_json_atomically(content, path_file):
+    """Writes the new file via a temporary file. Raises FileExistsError, if there is a file of the same name."""
+    if path_file.exists():
+        raise FileExistsError(f"{path_file} already exists")
+    path_temporary_file = _write_temporary_json(content, path_file)
+    os.replace(path_temporary_file, path_file)
+
+
+def _write_temporary_json(content, path_file):
+    """content can be any mapping, e.g. a NdjsonSnapshot, whose switches are read one by one"""
+    path_temporary_file = path_file.with_name(path_file.name + ".tmp")
+    with open(path_temporary_file, mode="w", encoding="utf-8") as temporary_file:
+        dump_mapping(content, temporary_file)
+    return path_temporary_file
+
+
+def _base_path(path_directory, timestamp):
+    return Path(path_directory) / (timestamp + ".json")
+
+
+def _delta_path(path_directory, timestamp):
+    return Path(path_directory) / (timestamp + DELTA_SUFFIX)
+
+
+def _delta_content(changed_switches, base_name):
+    return {"version": DELTA_VERSION, "base": base_name, "switches": changed_switches}
+
+
+def write_base(parsed_cli_output, path_directory, timestamp):
+    path_base_file = _base_path(path_directory, timestamp)
+    _write_json_atomically(parsed_cli_output, path_base_file)
+    return path_base_file
+
+
+def write_delta(changed_switches, base_name, path_directory, timestamp):
+    path_delta_file = _delta_path(path_directory, timestamp)
+    _write_json_atomically(_delta_content(changed_switches, base_name), path_delta_file)
+    return path_delta_file
+
+
+def _snapshot_timestamp(path_snapshot_file):
+    return Path(path_snapshot_file).name.split(".")[0]
+
+
+def _list_snapshot_files(path_directory):
+    """Returns all config files of the directory, oldest first (file names are timestamps)"""
+    snapshot_files = [path_file for path_file in Path(path_directory).iterdir()
+                      if path_file.suffix in (".json", COMPACT_SUFFIX, NDJSON_SUFFIX) and not path_file.name.endswith(".tmp")]
+    return sorted(snapshot_files, key=lambda path_file: (_snapshot_timestamp(path_file), is_delta_snapshot(path_file)))
+
+
+def _current_base(path_directory):
+    """Returns (path of the base of the latest file, number of deltas written on it) or (None, 0)"""
+    snapshot_files = _list_snapshot_files(path_directory)
+    if not snapshot_files:
+        return None, 0
+    latest_file = snapshot_files[-1]
+    if not is_delta_snapshot(latest_file):
+        return latest_file, 0
+
+    base_name = _read_delta(latest_file)["base"]
+    delta_count = sum(1 for path_file in snapshot_files if is_delta_snapshot(path_file) and _snapshot_timestamp(path_file) > base_name.split(".")[0])
+    return Path(path_directory) / base_name, delta_count
+
+
+def write_snapshot_with_delta(parsed_cli_output, path_directory, timestamp, base_interval=30, max_changed_ratio=0.3):
+    """Stores the parsed cli output (any mapping ip -> switch entry) as delta on the current base or, if due, as new
+    base. Returns the path of the file."""
+    path_base_file, delta_count = _current_base(path_directory)
+    if path_base_file is None or not path_base_file.exists() or delta_count >= base_interval:
+        return write_base(parsed_cli_output, path_directory, timestamp)
+
+    base_snapshot = _load_full_snapshot(path_base_file)
+    try:
+        changed_switches = diff_switches(base_snapshot, parsed_cli_output)
+    finally:
+        close_snapshot(base_snapshot)
+    if len(changed_switches) > max_changed_ratio * max(len(parsed_cli_output), 1):
+        logging.info(f"{len(changed_switches)} switches changed since {path_base_file.name}. Writing a new base file.")
+        return write_base(parsed_cli_output, path_directory, timestamp)
+
+    logging.info(f"Storing {len(changed_switches)} changed switches as delta on {path_base_file.name}.")
+    return write_delta(changed_switches, path_base_file.name, path_directory, timestamp)
+
+
+def _remove_snapshot_file(path_snapshot_file):
+    # The search index and hash manifest next to the file belong to it
+    for path_file in (path_snapshot_file, path_snapshot_file.with_name(path_snapshot_file.name + ".idx"),
+                      path_snapshot_file.with_name(path_snapshot_file.name + ".hashes")):
+        if path_file.exists():
+            path_file.unlink()
+
+
+def _stage_rewrite(content, path_file, path_original_file, rewritten_files):
+    """Writes the new version of path_original_file as temporary file of path_file. The originals are only touched,
+    once all files are staged, so an interrupted compaction never leaves a delta without its base."""
+    if path_file.exists() and path_file != path_original_file:
+        raise FileExistsError(f"{path_file} already exists, can't rewrite {path_original_file.name}")
+    rewritten_files.append((_write_temporary_json(content, path_file), path_file, path_original_file))
+    return path_file
+
+
+def _commit_rewrites(path_directory, rewritten_files):
+    """Moves the staged files in place (oldest first), then removes the originals, which no delta refers to anymore"""
+    for path_temporary_file, path_file, _ in rewritten_files:
+        os.replace(path_temporary_file, path_file)
+
+    referenced_bases = {_read_delta(path_file)["base"] for path_file in _list_snapshot_files(path_directory) if is_delta_snapshot(path_file)}
+    for _, path_file, path_original_file in rewritten_files:
+        if path_original_file == path_file:
+            continue
+        if path_original_file.name in referenced_bases:
+            logging.warning(f"Kept {path_original_file.name}, a delta still refers to it.")
+            continue
+        _remove_snapshot_file(path_original_file)
+
+
+def _drop_interrupted_rewrites(snapshot_files):
+    """Removes the deltas, which an interrupted compaction left next to the full file of the same time, and returns
+    the remaining files"""
+    full_files = {_snapshot_timestamp(path_file): path_file for path_file in snapshot_files if not is_delta_snapshot(path_file)}
+    remaining_files = []
+    for path_file in snapshot_files:
+        path_full_file = full_files.get(_snapshot_timestamp(path_file))
+        if not is_delta_snapshot(path_file) or path_full_file is None:
+            remaining_files.append(path_file)
+            continue
+        full_snapshot = _load_full_snapshot(path_full_file)
+        try:
+            interrupted_rewrite = load_delta_snapshot(path_file) == dict(full_snapshot.items())
+        finally:
+            close_snapshot(full_snapshot)
+        if not interrupted_rewrite:
+            raise FileExistsError(f"{path_file.name} and {path_full_file.name} hold different config of the same time")
+        logging.info(f"Removing {path_file.name}, an interrupted compaction left it next to {path_full_file.name}.")
+        _remove_snapshot_file(path_file)
+    return remaining_files
+
+
+def compact_snapshots(path_directory, base_interval=30, max_changed_ratio=0.3):
+    """Rewrites all config files of the directory as bases and deltas. Returns (bytes before, bytes after)."""
+    path_directory = Path(path_directory)
+    snapshot_files = _list_snapshot_files(path_directory)
+    size_before = sum(path_file.stat().st_size for path_file in snapshot_files)
+    snapshot_files = _drop_interrupted_rewrites(snapshot_files)
+
+    # Content of the bases, also of the ones which are only staged yet
+    loaded_bases = {}
+    base_name = None
+    base_snapshot = None
+    delta_count = 0
+    rewritten_files = []  # (temporary file, new file, original file)
+
+    try:
+        for path_snapshot_file in snapshot_files:
+            if is_delta_snapshot(path_snapshot_file):
+                snapshot = load_delta_snapshot(path_snapshot_file, loaded_bases)
+            else:
+                snapshot = _load_full_snapshot(path_snapshot_file)
+                if isinstance(snapshot, CompactSnapshot):
+                    with snapshot:
+                        snapshot = dict(snapshot.items())
+                loaded_bases[path_snapshot_file.name] = snapshot
+            timestamp = _snapshot_timestamp(path_snapshot_file)
+
+            changed_switches = None
+            if base_snapshot is not None and delta_count < base_interval:
+                changed_switches = diff_switches(base_snapshot, snapshot)
+                if len(changed_switches) > max_changed_ratio * max(len(snapshot), 1):
+                    changed_switches = None
+
+            if changed_switches is None:
+                # Full files stay as they are, also compact ones, only deltas become new bases
+                if is_delta_snapshot(path_snapshot_file):
+                    path_snapshot_file = _stage_rewrite(snapshot, _base_path(path_directory, timestamp), path_snapshot_file, rewritten_files)
+                    loaded_bases[path_snapshot_file.name] = snapshot
+                base_name, base_snapshot, delta_count = path_snapshot_file.name, snapshot, 0
+                continue
+
+            delta_count += 1
+            if not is_delta_snapshot(path_snapshot_file) or _read_delta(path_snapshot_file)["base"] != base_name:
+                _stage_rewrite(_delta_content(changed_switches, base_name), _delta_path(path_directory, timestamp), path_snapshot_file, rewritten_files)
+        _commit_rewrites(path_directory, rewritten_files)
+    except BaseException:
+        for path_temporary_file, _, _ in rewritten_files:
+            path_temporary_file.unlink(missing_ok=True)
+        raise
+
+    size_after = sum(path_file.stat().st_size for path_file in _list_snapshot_files(path_directory))
+    logging.info(f"Compacted {len(snapshot_files)} files from {size_before / 2 ** 20:.1f} MiB to {size_after / 2 ** 20:.1f} MiB.")
+    return size_before, size_after
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%dT%H:%M:%SZ", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rewrites the 'Interface Ethernet Config' files of a directory as base files plus deltas")
+    parser.add_argument("directory", nargs="?", type=Path, default=Path.cwd() / "raw_output/interface_eth_config")
+    parser.add_argument("--base-interval", type=int, default=30, help="Max. number of deltas per base file")
+    parser.add_argument("--max-changed-ratio", type=float, default=0.3, help="Share of changed switches, above which a new base gets written")
+    arguments = parser.parse_args()
+    compact_snapshots(arguments.directory, arguments.base_interval, arguments.max_changed_ratio)
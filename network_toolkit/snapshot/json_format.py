@@ -0,0 +1,25 @@
+# -*- coding: UTF-8 -*-
+"""JSON 'Interface Ethernet Config' file, written switch by switch.
+
+json.dump only takes a dict, so the whole fleet would have to be in memory. dump_mapping writes the entries one by one,
+e.g. of a NdjsonSnapshot, which reads them from the checkpoint of the collection on access. The file is byte by byte
+the same as the one of json.dump.
+"""
+import json
+
+
+def dump_mapping(mapping, json_file, indent=None):
+    """Writes the mapping like json.dump(dict(mapping), json_file, indent=indent), with compact separators without indent"""
+    if indent is None:
+        item_separator, key_separator, line_break = ",", ":", ""
+    else:
+        item_separator, key_separator, line_break = ",", ": ", "\n" + " " * indent
+
+    json_file.write("{")
+    empty = True
+    for key, value in mapping.items():
+        value_text = json.dumps(value, indent=indent, separators=(item_separator, key_separator))
+        # Line breaks in strings are escaped, so every line break of value_text belongs to the indent
+        json_file.write(("" if empty else item_separator) + line_break + json.dumps(key) + key_separator + value_text.replace("\n", line_break))
+        empty = False
+    json_file.write("}" if empty or indent is None else "\n}")
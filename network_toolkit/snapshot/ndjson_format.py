@@ -0,0 +1,147 @@
+# -*- coding: UTF-8 -*-
+"""Streamed 'Interface Ethernet Config' file (.ndjson): one JSON object per line and switch.
+
+Every line holds the switch entry plus its ip, e.g. {"ip": "10.0.0.1", "hostname": ..., "eth_interfaces": {...}}.
+The collection pipeline appends every switch as soon as it is parsed, so neither the collection nor the writer keeps
+the whole fleet in memory. The file grows as '<name>.partial' and gets its name once complete, so a half written file
+is never picked up as snapshot. The partial file is the checkpoint of the run: every line is flushed once written, so
+an interrupted run can be continued with mode "a". If a switch occurs twice, its last line counts.
+"""
+import json
+import os
+import re
+from collections.abc import Mapping
+from pathlib import Path
+
+NDJSON_SUFFIX = ".ndjson"
+PARTIAL_SUFFIX = ".partial"
+_CHUNK_SIZE = 65536
+# The writer puts the ip first, so reading it doesn't need to parse the whole line
+_IP_PATTERN = re.compile(rb'^\{"ip":("(?:[^"\\]|\\.)*")')
+
+
+def _truncate_incomplete_line(path_file):
+    """Cuts off the last line, if the writing process died in the middle of it"""
+    with open(path_file, mode="rb+") as binary_file:
+        position = binary_file.seek(0, os.SEEK_END)
+        while position > 0:
+            chunk_start = max(0, position - _CHUNK_SIZE)
+            binary_file.seek(chunk_start)
+            line_break = binary_file.read(position - chunk_start).rfind(b"\n")
+            if line_break != -1:
+                binary_file.truncate(chunk_start + line_break + 1)
+                return
+            position = chunk_start
+        binary_file.truncate(0)
+
+
+class NdjsonSnapshotWriter:
+    """Writes to '<path_snapshot_file>.partial'. Mode "x" starts a new file and raises FileExistsError, if the file or
+    its partial file, i.e. the checkpoint of an interrupted run, exists. Mode "a" continues the partial file. With
+    complete_on_close=False the file keeps its partial name on close, e.g. until it is converted into another format."""
+
+    def __init__(self, path_snapshot_file, mode="x", complete_on_close=True):
+        self.path = Path(path_snapshot_file)
+        self.complete_on_close = complete_on_close
+        self.path_partial_file = self.path.with_name(self.path.name + PARTIAL_SUFFIX)
+        if mode == "x" and self.path.exists():
+            raise FileExistsError(f"{self.path} already exists")
+        self.switch_count = 0
+        if mode == "a":
+            _truncate_incomplete_line(self.path_partial_file)
+            self._file = open(self.path_partial_file, mode="a", encoding="utf-8")
+        else:
+            self._file = open(self.path_partial_file, mode="x", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keeps the partial file, the switches in it are complete
+            self._file.close()
+
+    def write(self, ip, switch_entry):
+        self._file.write(json.dumps({"ip": ip, **switch_entry}, separators=(",", ":")) + "\n")
+        # Survives a crash of the process, not of the OS
+        self._file.flush()
+        self.switch_count += 1
+
+    def close(self):
+        """Completes the file under its final name, unless complete_on_close is False"""
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.complete_on_close:
+            os.replace(self.path_partial_file, self.path)
+
+
+def write_ndjson_snapshot(parsed_cli_output, path_snapshot_file, mode="x"):
+    with NdjsonSnapshotWriter(path_snapshot_file, mode) as snapshot_writer:
+        for ip, switch_entry in parsed_cli_output.items():
+            snapshot_writer.write(ip, switch_entry)
+
+
+def iter_ndjson_snapshot(path_snapshot_file):
+    """Yields (ip, switch entry) line by line. A truncated last line, e.g. of a partial file, is skipped."""
+    with open(path_snapshot_file, mode="r", encoding="utf-8") as snapshot_file:
+        for line in snapshot_file:
+            if not line.endswith("\n"):
+                return
+            switch_entry = json.loads(line)
+            yield switch_entry.pop("ip"), switch_entry
+
+
+def load_ndjson_snapshot(path_snapshot_file):
+    return dict(iter_ndjson_snapshot(path_snapshot_file))
+
+
+class NdjsonSnapshot(Mapping):
+    """Read-only mapping ip -> switch entry, which keeps only the position of every line in memory and reads an entry
+    on access. Like load_ndjson_snapshot, but memory stays flat with the number of switches. The switches of ip_order
+    come first in its order, the others follow in the order of the file."""
+
+    def __init__(self, path_snapshot_file, ip_order=()):
+        self.path = Path(path_snapshot_file)
+        self._file = open(self.path, mode="rb")
+        line_offsets = {}
+        offset = 0
+        for line in self._file:
+            if not line.endswith(b"\n"):
+                break
+            match = _IP_PATTERN.match(line)
+            line_offsets[json.loads(match.group(1)) if match else json.loads(line)["ip"]] = offset
+            offset += len(line)
+        self._line_offsets = {ip: line_offsets.pop(ip) for ip in ip_order if ip in line_offsets}
+        self._line_offsets.update(line_offsets)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getitem__(self, ip):
+        self._file.seek(self._line_offsets[ip])
+        switch_entry = json.loads(self._file.readline())
+        del switch_entry["ip"]
+        return switch_entry
+
+    def __contains__(self, ip):
+        return ip in self._line_offsets
+
+    def __iter__(self):
+        return iter(self._line_offsets)
+
+    def __len__(self):
+        return len(self._line_offsets)
+
+
+def list_partial_snapshots(path_directory):
+    """Returns the partial files of the directory, i.e. checkpoints of interrupted runs, the latest last"""
+    return sorted(Path(path_directory).glob("*" + NDJSON_SUFFIX + PARTIAL_SUFFIX))
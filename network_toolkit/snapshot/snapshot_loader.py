@@ -0,0 +1,40 @@
+# -*- coding: UTF-8 -*-
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+from .compact_format import COMPACT_SUFFIX, CompactSnapshot, close_snapshot
+from .delta_storage import is_delta_snapshot, load_delta_snapshot
+from .ndjson_format import NDJSON_SUFFIX, load_ndjson_snapshot
+
+# Delta files (.delta.json) are covered by ".json"
+SNAPSHOT_SUFFIXES = (".json", COMPACT_SUFFIX, NDJSON_SUFFIX)
+
+
+def snapshot_signature(path_snapshot_file):
+    """Returns what tells, if a file derived from the snapshot (search index, hash manifest) is still up to date"""
+    file_stat = Path(path_snapshot_file).stat()
+    return {"mtime_ns": file_stat.st_mtime_ns, "size": file_stat.st_size}
+
+
+def load_snapshot(path_snapshot_file):
+    """Returns the content of an 'Interface Ethernet Config' file as mapping ip -> switch entry, whatever its format"""
+    if Path(path_snapshot_file).suffix == COMPACT_SUFFIX:
+        return CompactSnapshot(path_snapshot_file)
+    if Path(path_snapshot_file).suffix == NDJSON_SUFFIX:
+        return load_ndjson_snapshot(path_snapshot_file)
+    if is_delta_snapshot(path_snapshot_file):
+        return load_delta_snapshot(path_snapshot_file)
+
+    with open(path_snapshot_file, mode="r", encoding="utf-8") as serial_output_file:
+        return json.load(serial_output_file)
+
+
+@contextmanager
+def open_snapshot(path_snapshot_file):
+    """load_snapshot, which closes a compact file (mmap) at the end of the with block"""
+    snapshot = load_snapshot(path_snapshot_file)
+    try:
+        yield snapshot
+    finally:
+        close_snapshot(snapshot)
@@ -1,13 +1,14 @@
 import logging
-import traceback
-from concurrent.futures import ThreadPoolExecutor
+import time
 
 from alive_progress import alive_bar
-from netmiko import ConnectHandler
 from netmiko.ssh_exception import NetMikoTimeoutException, AuthenticationException
 from paramiko.ssh_exception import SSHException
 
-import network_toolkit.config as config
+from network_toolkit import fetch_timing
+from network_toolkit.concurrency_limit import create_session_limit
+from network_toolkit.job_scheduler import run_in_threads
+from network_toolkit.ssh_session_pool import get_session_pool
 
 logging.getLogger("paramiko.transport").setLevel(logging.WARNING)
 logging.getLogger("netmiko").setLevel(logging.WARNING)
@@ -16,47 +17,80 @@ logging.getLogger("netmiko").setLevel(logging.WARNING)
 def run_show_command(switches, cli_show_command):
     """Runs the cli command on all the switches"""
     logging.info(f"Starting to execute '{cli_show_command}' on {len(switches)} switches...")
-    combined_cli_output = {}
+    session_limit = create_session_limit()
+
+    def run_job(switch_element, timeout_factor, submitted_at, retry):
+        return run_command_in_slot(switch_element, cli_show_command, session_limit, timeout_factor, submitted_at, retry)
 
     with alive_bar(total=len(switches)) as bar:
-        with ThreadPoolExecutor(max_workers=config.GLOBAL_CONFIG.number_of_worker_threads) as executor:
-            futures = [executor.submit(worker, switch_element, cli_show_command) for switch_element in switches]
-            for future in futures:
-                switch_element = future.result()
-                combined_cli_output[switch_element.ip] = {"hostname": switch_element.hostname, "reachable": switch_element.reachable, "eth_interfaces": switch_element.interface_eth_config}
-                bar()
+        for switch_element, raw_cli_output in run_in_threads(switches, run_job, session_limit.ceiling):
+            with fetch_timing.measure(switch_element.ip, "parse"):
+                switch_element.parse_interface_cli_output(raw_cli_output)
+            bar()
+
+    session_limit.finish()
+    # Keep the order of the input, the switches finish in any order
+    return {switch_element.ip: switch_element.snapshot_entry() for switch_element in switches}
 
-    return combined_cli_output
+
+def run_raw_command(switches, cli_show_command):
+    """Runs the cli command on all the switches and returns the unparsed output per IP"""
+    logging.info(f"Starting to execute '{cli_show_command}' on {len(switches)} switches...")
+    raw_cli_outputs = {}
+    session_limit = create_session_limit()
+
+    def run_job(switch_element, timeout_factor, submitted_at, retry):
+        return run_command_in_slot(switch_element, cli_show_command, session_limit, timeout_factor, submitted_at, retry)
+
+    with alive_bar(total=len(switches)) as bar:
+        for switch_element, raw_cli_output in run_in_threads(switches, run_job, session_limit.ceiling):
+            raw_cli_outputs[switch_element.ip] = raw_cli_output
+            bar()
+
+    session_limit.finish()
+    return raw_cli_outputs
+
+
+def run_command_in_slot(switch_element, command, session_limit, timeout_factor=1, submitted_at=None, retry=False):
+    """Runs the command, as soon as session_limit has a free slot (a retry before all others), and reports the result
+    to the limit. Returns (raw cli output, reason of the failure or None)."""
+    with session_limit.slot(first=retry) as job:
+        if submitted_at is not None:
+            fetch_timing.record(switch_element.ip, "queue_wait", time.perf_counter() - submitted_at)
+        raw_cli_output, job.failure = try_command_on_switch(switch_element, command, timeout_factor)
+    return raw_cli_output, job.failure
 
 
 def run_command_on_switch(switch_element, command):
-    """Connects via ssh to the switch and runs the given command"""
-    ssh_parameter = {
-        'device_type': switch_element.os,
-        'host': switch_element.ip,
-        'username': config.GLOBAL_CONFIG.ssh_username,
-        'password': config.GLOBAL_CONFIG.ssh_password,
-        'port': config.GLOBAL_CONFIG.ssh_port
-        }
+    """Borrows a ssh session to the switch from the session pool and runs the given command"""
+    return try_command_on_switch(switch_element, command)[0]
 
+
+def try_command_on_switch(switch_element, command, timeout_factor=1):
+    """Like run_command_on_switch, but returns (raw cli output, reason of the failure or None). A new session gets
+    timeout_factor times the usual connect and login timeouts."""
     raw_cli_output = ""
+    failure = None
     try:
-        with ConnectHandler(**ssh_parameter) as ssh_connection:
-            raw_cli_output = ssh_connection.send_command(command)
+        with get_session_pool().session(switch_element, timeout_factor) as ssh_connection:
+            with fetch_timing.measure(switch_element.ip, "command"):
+                raw_cli_output = ssh_connection.send_command(command)
     except AuthenticationException:
         logging.warning(f"Authentication failed for {switch_element.ip}")
+        failure = "authentication"
     except NetMikoTimeoutException:
         logging.warning(f"SSH timeout for {switch_element.ip}")
+        failure = "timeout"
     except SSHException:
         logging.warning(f"SSH not enabled or could not be negotiated for {switch_element.ip}")
+        failure = "ssh"
+    except OSError:
+        # netmiko: "Search pattern never detected", the prompt did not come back in time. The pool drops the session.
+        logging.warning(f"Timeout reading from {switch_element.ip}")
+        failure = "timeout"
     except Exception:
-        traceback.print_exc()
-        quit()
-
-    return raw_cli_output
-
+        # One broken switch must not end the run, it shows up as failed and gets retried by a resumed run
+        logging.exception(f"Unexpected error on {switch_element.ip}")
+        failure = "error"
 
-def worker(switch_element, command):
-    raw_cli_output = run_command_on_switch(switch_element, command)
-    switch_element.parse_interface_cli_output(raw_cli_output)
-    return switch_element
+    return raw_cli_output, failure
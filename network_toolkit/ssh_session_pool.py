@@ -0,0 +1,209 @@
+import atexit
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from netmiko import ConnectHandler
+from netmiko.ssh_exception import NetMikoTimeoutException
+
+import network_toolkit.config as config
+from network_toolkit import fetch_timing
+
+# Defaults of netmiko (banner) and paramiko (authentication), which the timeout_factor of a session multiplies
+_BANNER_TIMEOUT = 15
+_AUTH_TIMEOUT = 30
+
+_pool_lock = threading.Lock()
+_session_pool = None
+
+
+class SshSessionPool:
+    """Keeps authenticated netmiko sessions open, so every device pays key exchange and AAA only once per run"""
+
+    def __init__(self, max_open_sessions, idle_timeout):
+        self.max_open_sessions = max_open_sessions
+        self.idle_timeout = idle_timeout
+
+        self._condition = threading.Condition()
+        self._idle_sessions = {}  # key -> list of (ssh_connection, last_used)
+        self._open_sessions = 0
+
+    @staticmethod
+    def _session_key(switch_element):
+        return switch_element.ip, config.GLOBAL_CONFIG.ssh_port, config.GLOBAL_CONFIG.ssh_username, switch_element.os
+
+    @staticmethod
+    def _ssh_parameter(switch_element):
+        return {
+            'device_type': switch_element.os,
+            'host': switch_element.ip,
+            'username': config.GLOBAL_CONFIG.ssh_username,
+            'password': config.GLOBAL_CONFIG.ssh_password,
+            'port': config.GLOBAL_CONFIG.ssh_port
+            }
+
+    @contextmanager
+    def session(self, switch_element, timeout_factor=1):
+        """Borrows a session to the switch and hands it back afterwards. Sessions which raised an error are closed. A new
+        session gets timeout_factor times the usual connect and login timeouts, e.g. for a retry."""
+        key = self._session_key(switch_element)
+        ssh_connection = self._borrow(key, switch_element, timeout_factor)
+        try:
+            yield ssh_connection
+        except BaseException:
+            self._discard(ssh_connection)
+            raise
+        self._give_back(key, ssh_connection)
+
+    def _borrow(self, key, switch_element, timeout_factor):
+        while True:
+            ssh_connection, sessions_to_close = self._reserve(key)
+            if sessions_to_close:
+                # netmiko waits seconds for the prompt after exit, which must not delay the session of this switch
+                threading.Thread(target=_disconnect_all, args=(sessions_to_close,), daemon=True).start()
+
+            if ssh_connection is None:
+                break
+            if _is_healthy(ssh_connection):
+                logging.debug(f"Reusing SSH session to {switch_element.ip}")
+                return ssh_connection
+            logging.debug(f"Dropping dead SSH session to {switch_element.ip}")
+            self._discard(ssh_connection)
+
+        try:
+            return self._connect(switch_element, timeout_factor)
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def _connect(self, switch_element, timeout_factor=1):
+        """Opens the TCP connection itself, so the handshake and the SSH login get timed separately"""
+        with fetch_timing.measure(switch_element.ip, "tcp_connect"):
+            try:
+                sock = socket.create_connection((switch_element.ip, config.GLOBAL_CONFIG.ssh_port),
+                                                timeout=config.GLOBAL_CONFIG.ssh_timeout * timeout_factor)
+            except OSError as e:
+                # Same exception as netmiko raises, if it opens the connection
+                raise NetMikoTimeoutException(f"TCP connection to device failed: {switch_element.ip}:{config.GLOBAL_CONFIG.ssh_port} ({e})")
+        try:
+            with fetch_timing.measure(switch_element.ip, "ssh_login"):
+                return ConnectHandler(**self._ssh_parameter(switch_element), sock=sock,
+                                      banner_timeout=_BANNER_TIMEOUT * timeout_factor, auth_timeout=_AUTH_TIMEOUT * timeout_factor)
+        except BaseException:
+            sock.close()
+            raise
+
+    def _reserve(self, key):
+        """Returns an idle session for the key or (None) a free slot for a new one. Blocks while the pool is full."""
+        sessions_to_close = []
+        with self._condition:
+            while True:
+                sessions_to_close.extend(self._pop_expired_sessions())
+                idle_sessions = self._idle_sessions.get(key)
+                if idle_sessions:
+                    ssh_connection, _ = idle_sessions.pop()
+                    return ssh_connection, sessions_to_close
+                if self._open_sessions < self.max_open_sessions:
+                    self._open_sessions += 1
+                    return None, sessions_to_close
+                # Pool is full: make room by closing the least recently used idle session of another device
+                lru_session = self._pop_least_recently_used_session()
+                if lru_session is not None:
+                    sessions_to_close.append(lru_session)
+                    self._open_sessions -= 1
+                    continue
+                self._condition.wait()
+
+    def _pop_expired_sessions(self):
+        """Must be called while holding the lock"""
+        expired_sessions = []
+        deadline = time.monotonic() - self.idle_timeout
+        for key, idle_sessions in list(self._idle_sessions.items()):
+            for ssh_connection, last_used in idle_sessions:
+                if last_used < deadline:
+                    expired_sessions.append(ssh_connection)
+            self._idle_sessions[key] = [entry for entry in idle_sessions if entry[1] >= deadline]
+            if not self._idle_sessions[key]:
+                del self._idle_sessions[key]
+        self._open_sessions -= len(expired_sessions)
+        return expired_sessions
+
+    def _pop_least_recently_used_session(self):
+        """Must be called while holding the lock"""
+        if not self._idle_sessions:
+            return None
+        lru_key = min(self._idle_sessions, key=lambda key: self._idle_sessions[key][0][1])
+        ssh_connection, _ = self._idle_sessions[lru_key].pop(0)
+        if not self._idle_sessions[lru_key]:
+            del self._idle_sessions[lru_key]
+        return ssh_connection
+
+    def _give_back(self, key, ssh_connection):
+        with self._condition:
+            self._idle_sessions.setdefault(key, []).append((ssh_connection, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, ssh_connection):
+        _disconnect(ssh_connection)
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self._open_sessions -= 1
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            sessions_to_close = [entry[0] for idle_sessions in self._idle_sessions.values() for entry in idle_sessions]
+            self._idle_sessions.clear()
+            self._open_sessions -= len(sessions_to_close)
+            self._condition.notify_all()
+
+        if sessions_to_close:
+            # netmiko waits for the prompt after leaving config mode and exit, which adds up to minutes on large fleets.
+            # Plain threads, because concurrent.futures takes no new work once the interpreter shuts down (atexit)
+            threads = [threading.Thread(target=_disconnect, args=(ssh_connection,)) for ssh_connection in sessions_to_close]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            logging.debug(f"Closed {len(sessions_to_close)} idle SSH sessions.")
+
+
+def _is_healthy(ssh_connection):
+    try:
+        return ssh_connection.is_alive()
+    except Exception:
+        return False
+
+
+def _disconnect(ssh_connection):
+    try:
+        ssh_connection.disconnect()
+    except Exception:
+        logging.debug("Could not close SSH session cleanly.")
+
+
+def _disconnect_all(ssh_connections):
+    for ssh_connection in ssh_connections:
+        _disconnect(ssh_connection)
+
+
+def get_session_pool():
+    """Returns the pool shared by the validator, the collection and the tools"""
+    global _session_pool
+    with _pool_lock:
+        if _session_pool is None:
+            _session_pool = SshSessionPool(config.GLOBAL_CONFIG.max_open_ssh_sessions, config.GLOBAL_CONFIG.ssh_session_idle_timeout)
+        return _session_pool
+
+
+def close_session_pool():
+    with _pool_lock:
+        if _session_pool is not None:
+            _session_pool.close_all()
+
+
+atexit.register(close_session_pool)
@@ -1,3 +1,23 @@
-from .mac_address_lookup import mac_address_batch_lookup
+# The tools pull in heavy dependencies (requests, alive_progress), so they get imported on first access only
+_LAZY_EXPORTS = {
+    "load_search_index": ".interface_config_search",
+    "mac_address_batch_lookup": ".mac_address_lookup",
+    "MAC_TABLE_COMMAND": ".mac_address_table",
+    "update_mac_location_index": ".mac_address_table",
+    "compile_search_query": ".search_query",
+    "SearchQueryError": ".search_query",
+    "list_snapshots": ".history_search",
+    "search_history": ".history_search",
+    "diff_snapshots": ".snapshot_diff",
+}
 
-__all__ = ["mac_address_batch_lookup"]
+__all__ = ["load_search_index", "mac_address_batch_lookup", "MAC_TABLE_COMMAND", "update_mac_location_index", "compile_search_query", "SearchQueryError", "list_snapshots", "search_history", "diff_snapshots"]
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
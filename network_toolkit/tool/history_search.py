@@ -0,0 +1,85 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from network_toolkit.snapshot import SNAPSHOT_SUFFIXES
+from .interface_config_search import load_search_index
+from .search_query import compile_search_query
+
+SNAPSHOT_TIME_FORMAT = "%Y-%m-%dT%H-%M-%S"
+
+
+def snapshot_time(path_snapshot_file):
+    """Config files are named after the time they were created, e.g. '2022-05-01T09-13-47.json'"""
+    try:
+        return datetime.strptime(Path(path_snapshot_file).name.split(".")[0], SNAPSHOT_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def list_snapshots(path_raw_output, since=None, until=None):
+    """Returns the config files created in the time range, oldest first"""
+    snapshots = []
+    for path_snapshot_file in Path(path_raw_output).glob("*"):
+        created = snapshot_time(path_snapshot_file)
+        if path_snapshot_file.suffix not in SNAPSHOT_SUFFIXES or created is None:
+            continue
+        if (since is None or created >= since) and (until is None or created <= until):
+            snapshots.append((created, path_snapshot_file))
+    return [path_snapshot_file for _, path_snapshot_file in sorted(snapshots)]
+
+
+def _matching_interfaces(path_snapshot_file, query_text, flags):
+    """Runs in a worker process: returns the switches of the snapshot {ip: hostname} and the matching (ip, interface)"""
+    negative_search, strip_oobm, strip_uplink = flags
+    search_index = load_search_index(path_snapshot_file)
+    all_ids = set(range(len(search_index.interfaces)))
+    matching_ids = compile_search_query(query_text).evaluate(search_index.postings, all_ids)
+    if negative_search:
+        matching_ids = all_ids - matching_ids
+    if strip_oobm:
+        matching_ids -= search_index.oobm_ids
+    if strip_uplink:
+        matching_ids -= search_index.uplink_ids
+
+    switches = {switch_ip: hostname for switch_ip, hostname in search_index.switches}
+    matches = set()
+    for interface_id in matching_ids:
+        switch_id, int_name = search_index.interfaces[interface_id]
+        matches.add((search_index.switches[switch_id][0], int_name))
+    return switches, matches
+
+
+def search_history(snapshots, search_query, search_mask_flags, max_workers=None):
+    """Returns per switch and interface the snapshots, in which the search mask started or stopped to match.
+
+    The snapshots get evaluated in parallel processes on their search indexes, which are built only once per file.
+    A switch missing in a snapshot (e.g. unreachable at that time) keeps its previous state."""
+    query_text = str(search_query)
+    # Plain values only, the worker processes can't import the classes of main
+    flags = (search_mask_flags.negative_search, search_mask_flags.strip_oobm, search_mask_flags.strip_uplink)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        snapshot_results = executor.map(_matching_interfaces, snapshots, [query_text] * len(snapshots), [flags] * len(snapshots))
+
+        hostnames = {}
+        history = {}
+        previous_matches = set()
+        for path_snapshot_file, (switches, matches) in zip(snapshots, snapshot_results):
+            hostnames.update(switches)
+            snapshot_name = Path(path_snapshot_file).name
+            is_first_snapshot = path_snapshot_file == snapshots[0]
+
+            for switch_ip, int_name in sorted(matches - previous_matches):
+                change = "matching" if is_first_snapshot else "started"
+                history.setdefault((switch_ip, int_name), []).append({"snapshot": snapshot_name, "change": change})
+            for switch_ip, int_name in sorted(previous_matches - matches):
+                if switch_ip in switches:
+                    history.setdefault((switch_ip, int_name), []).append({"snapshot": snapshot_name, "change": "stopped"})
+            previous_matches = matches | {(switch_ip, int_name) for switch_ip, int_name in previous_matches if switch_ip not in switches}
+
+    history_result = {}
+    for (switch_ip, int_name), changes in sorted(history.items()):
+        history_result.setdefault(switch_ip + " - " + hostnames.get(switch_ip, "No hostname"), {})[int_name] = changes
+    logging.info(f"Searched {len(snapshots)} files, {len(history)} interfaces matched the search mask in at least one of them.")
+    return history_result
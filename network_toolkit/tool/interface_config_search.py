@@ -0,0 +1,169 @@
+import json
+import logging
+import re
+from pathlib import Path
+
+from network_toolkit.snapshot import CompactSnapshot, open_snapshot, snapshot_signature
+
+INDEX_VERSION = 1
+UPLINK_INT_PATTERN = re.compile(r"\d+/(?!0/)\d+/\d+$")
+OOBM_INT_SUFFIXES = ("FastEthernet0", "GigabitEthernet0/0")
+
+# Indexes which got loaded during this session, keyed by path of the config file
+_loaded_indexes = {}
+
+
+def normalize_config_line(config_line):
+    """Strips the line and collapses repeated blanks, so the index and the search mask agree on the spelling"""
+    return " ".join(config_line.split())
+
+
+def _index_path(path_output_file):
+    path_output_file = Path(path_output_file)
+    return path_output_file.with_suffix(path_output_file.suffix + ".idx")
+
+
+class InterfaceSearchIndex:
+    """Inverted index of an 'Interface Ethernet Config' file: config line -> interfaces containing it"""
+
+    def __init__(self, switches, interfaces, postings, source=None):
+        self.switches = switches  # [[ip, hostname], ...]
+        self.interfaces = interfaces  # [[switch id, interface name], ...] ordered by switch, like in the config file
+        self.postings = postings  # normalized config line -> sorted list of interface ids
+        self.source = source or {}
+
+        self._oobm_ids = None
+        self._uplink_ids = None
+
+    @classmethod
+    def build(cls, raw_int_eth_config, source=None):
+        if isinstance(raw_int_eth_config, CompactSnapshot):
+            return cls._build_from_compact_snapshot(raw_int_eth_config, source)
+
+        switches = []
+        interfaces = []
+        postings = {}
+
+        for switch_ip, switch_config in raw_int_eth_config.items():
+            switch_id = len(switches)
+            switches.append([switch_ip, switch_config.get("hostname", "No hostname")])
+            for int_name, int_config in switch_config.get("eth_interfaces", {}).items():
+                interface_id = len(interfaces)
+                interfaces.append([switch_id, int_name])
+                for config_line in set(map(normalize_config_line, int_config)):
+                    postings.setdefault(config_line, []).append(interface_id)
+
+        return cls(switches, interfaces, postings, source)
+
+    @classmethod
+    def _build_from_compact_snapshot(cls, compact_snapshot, source=None):
+        """Works on the string ids of the compact file, so every distinct line gets decoded and normalized only once"""
+        switches = []
+        interfaces = []
+        postings_by_string_id = {}
+
+        for switch_id, switch in enumerate(compact_snapshot.switches):
+            switches.append([switch["ip"], switch["hostname"]])
+            for name_id, line_ids in compact_snapshot.iter_interfaces(switch_id):
+                interface_id = len(interfaces)
+                interfaces.append([switch_id, compact_snapshot.string(name_id)])
+                for line_id in set(line_ids):
+                    postings_by_string_id.setdefault(line_id, []).append(interface_id)
+
+        postings = {}
+        for line_id, interface_ids in postings_by_string_id.items():
+            config_line = normalize_config_line(compact_snapshot.string(line_id))
+            if config_line in postings:
+                # Lines, which differ only in blanks, share one posting list
+                postings[config_line] = sorted(set(postings[config_line]) | set(interface_ids))
+            else:
+                postings[config_line] = interface_ids
+        return cls(switches, interfaces, postings, source)
+
+    @classmethod
+    def load(cls, path_index_file):
+        """Returns the stored index or None, if it was written in another format (INDEX_VERSION)"""
+        with open(path_index_file, mode="r", encoding="utf-8") as index_file:
+            raw_index = json.load(index_file)
+        if raw_index.get("version") != INDEX_VERSION:
+            return None
+        return cls(raw_index["switches"], raw_index["interfaces"], raw_index["postings"], raw_index["source"])
+
+    def save(self, path_index_file):
+        raw_index = {"version": INDEX_VERSION, "source": self.source, "switches": self.switches, "interfaces": self.interfaces, "postings": self.postings}
+        with open(path_index_file, mode="w", encoding="utf-8") as index_file:
+            json.dump(raw_index, index_file, separators=(",", ":"))
+
+    @property
+    def oobm_ids(self):
+        if self._oobm_ids is None:
+            self._oobm_ids = {interface_id for interface_id, (_, int_name) in enumerate(self.interfaces) if int_name.endswith(OOBM_INT_SUFFIXES)}
+        return self._oobm_ids
+
+    @property
+    def uplink_ids(self):
+        if self._uplink_ids is None:
+            self._uplink_ids = {interface_id for interface_id, (_, int_name) in enumerate(self.interfaces) if UPLINK_INT_PATTERN.search(int_name)}
+        return self._uplink_ids
+
+    def interface_ids_with_line(self, config_line):
+        return set(self.postings.get(normalize_config_line(config_line), ()))
+
+    def search(self, search_mask, search_mask_flags):
+        """Returns the interfaces per switch, which fulfil (or with negative search: miss) the search mask. The mask is
+        a compiled SearchQuery or a plain config line."""
+        all_ids = set(range(len(self.interfaces)))
+        if isinstance(search_mask, str):
+            matching_ids = self.interface_ids_with_line(search_mask)
+        else:
+            matching_ids = search_mask.evaluate(self.postings, all_ids)
+        if search_mask_flags.negative_search:
+            matching_ids = all_ids - matching_ids
+        if search_mask_flags.strip_oobm:
+            matching_ids -= self.oobm_ids
+        if search_mask_flags.strip_uplink:
+            matching_ids -= self.uplink_ids
+        return self.format_result(matching_ids)
+
+    def format_result(self, matching_ids):
+        search_result = {}
+        interface_lists = [[] for _ in self.switches]
+        for interface_id in sorted(matching_ids):
+            switch_id, int_name = self.interfaces[interface_id]
+            interface_lists[switch_id].append(int_name)
+        for (switch_ip, hostname), interface_list in zip(self.switches, interface_lists):
+            search_result[switch_ip + " - " + hostname] = interface_list
+        return search_result
+
+
+def load_search_index(path_output_file):
+    """Returns the index of the config file. It gets built on first use and stored next to the file (+ '.idx')"""
+    source = snapshot_signature(path_output_file)
+    search_index = _loaded_indexes.get(str(path_output_file))
+    if search_index is not None and search_index.source == source:
+        return search_index
+
+    path_index_file = _index_path(path_output_file)
+    search_index = None
+    if path_index_file.exists():
+        try:
+            search_index = InterfaceSearchIndex.load(path_index_file)
+            if search_index is None:
+                logging.info(f"Search index {path_index_file.name} has an outdated format. Rebuilding it.")
+        except (ValueError, KeyError):
+            logging.warning(f"Search index {path_index_file.name} is damaged. Rebuilding it.")
+        if search_index is not None and search_index.source != source:
+            logging.info(f"{Path(path_output_file).name} changed since the search index was built. Rebuilding it.")
+            search_index = None
+
+    if search_index is None:
+        with open_snapshot(path_output_file) as raw_int_eth_config:
+            search_index = InterfaceSearchIndex.build(raw_int_eth_config, source)
+        try:
+            search_index.save(path_index_file)
+            logging.info(f"Built search index @ {path_index_file}")
+        except OSError:
+            logging.warning(f"Could not store search index @ {path_index_file}")
+
+    _loaded_indexes[str(path_output_file)] = search_index
+    return search_index
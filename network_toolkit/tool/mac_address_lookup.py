@@ -1,23 +1,31 @@
 import re
 import logging
 import requests
+import threading
 import time
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, replace
 from alive_progress import alive_bar
 
 from network_toolkit.config.mac_lookup_config import load_mac_lookup_config
+from network_toolkit.rate_limit import TokenBucket, backoff_delay
+from .mac_address_table import locate_mac_addresses
+from .mac_vendor_cache import MacVendorCache
+from .oui_registry import OuiRegistry
 
-path_to_cache = Path.cwd() / "raw_output/mac_address_lookup/mac_address_cache.json"
+path_to_cache = Path.cwd() / "raw_output/mac_address_lookup/mac_address_cache.sqlite"
+path_to_json_cache = Path.cwd() / "raw_output/mac_address_lookup/mac_address_cache.json"
+
+# One HTTP session (and keep-alive connection) per worker thread
+_thread_local = threading.local()
 
 
 @dataclass(frozen=True)
 class MacAddress:
     raw_mac: str
     formatted_mac: str
-    oui: str
+    oui: str  # Prefix the vendor got assigned: 6, 7 or 9 hex digits (MA-L, MA-M, MA-S)
 
 
 def _prompt_user():
@@ -44,7 +52,7 @@ def _filter_mac_addresses(user_input):
         logging.error("No MAC addresses found in user input.")
         quit()
 
-    logging.info(f"Parsed {len(mac_list)} MAC addresses from user input. [1/4]")
+    logging.info(f"Parsed {len(mac_list)} MAC addresses from user input. [1/5]")
     logging.debug(mac_list)
     return mac_list
 
@@ -62,99 +70,221 @@ def _format_mac_addresses(raw_mac_list):
     return formatted_mac_list
 
 
-def _lookup_cache(formatted_mac_list):
+def _open_cache(config):
+    cache_exists = path_to_cache.exists()
+    mac_cache = MacVendorCache(path_to_cache, config.cache_ttl_days, config.cache_max_entries)
+    if not cache_exists and path_to_json_cache.exists():
+        mac_cache.import_json_cache(path_to_json_cache)
+    return mac_cache
+
+
+def _open_registry(config):
+    oui_registry = OuiRegistry(path_to_cache)
+    imported_entries = oui_registry.import_registry_files(Path.cwd() / config.path_to_ieee_registry)
+    if imported_entries:
+        logging.info(f"Local IEEE registry holds {len(oui_registry)} assignments.")
+    return oui_registry
+
+
+def _lookup_registry(formatted_mac_list, oui_registry):
     resolved_mac_list = {}
     unresolved_mac_list = []
-    logging.info(f"Trying to resolve from cache...")
+    logging.info("Trying to resolve from local IEEE registry...")
 
-    with open(path_to_cache, mode="r", encoding="utf-8") as file:
-        mac_cache = (json.load(file))
+    registry_matches = oui_registry.lookup(mac_entity.formatted_mac for mac_entity in formatted_mac_list)
+    # Vendors of a split block are cached per MA-S sized prefix, because the size of their block is unknown
+    subdivided_blocks = oui_registry.subdivided_blocks(mac_entity.oui for mac_entity in formatted_mac_list
+                                                       if mac_entity.formatted_mac not in registry_matches)
 
     for mac_entity in formatted_mac_list:
-        mac_found = False
-        organisation = None
+        registry_match = registry_matches.get(mac_entity.formatted_mac)
+        if registry_match is not None:
+            resolved_mac_list[mac_entity.raw_mac] = registry_match[1]
+        elif mac_entity.oui in subdivided_blocks:
+            unresolved_mac_list.append(replace(mac_entity, oui=mac_entity.formatted_mac[:9]))
+        else:
+            unresolved_mac_list.append(mac_entity)
+
+    logging.info(f"Resolved {len(resolved_mac_list)} MAC addresses via local IEEE registry. [2/5]")
+    return unresolved_mac_list, resolved_mac_list
+
 
-        for cache_entity in mac_cache:
-            if mac_entity.oui == cache_entity["oui"]:
-                mac_found = True
-                organisation = cache_entity["organisation"]
+def _lookup_cache(formatted_mac_list, resolved_mac_list, mac_cache):
+    unresolved_mac_list = []
+    resolved_via_cache = 0
+    logging.info(f"Trying to resolve from cache...")
 
-                date_today = datetime.now().strftime("%Y-%m-%d")
-                cache_entity["last_update"] = date_today
-                break
+    cached_organisations = mac_cache.lookup(mac_entity.oui for mac_entity in formatted_mac_list)
 
-        if not mac_found:
+    for mac_entity in formatted_mac_list:
+        organisation = cached_organisations.get(mac_entity.oui)
+        if organisation is None:
             unresolved_mac_list.append(mac_entity)
             continue
 
         resolved_mac_list[mac_entity.raw_mac] = organisation
+        resolved_via_cache += 1
 
-    logging.info(f"Resolved {len(resolved_mac_list)} MAC addresses via cache. [2/4]  (this saved you {len(resolved_mac_list) * 0.6}s)")
+    logging.info(f"Resolved {resolved_via_cache} MAC addresses via cache. [3/5]")
     if not unresolved_mac_list:
-        logging.info("Resolved all addresses via cache. Skipping webAPI lookup.")
-    return unresolved_mac_list, resolved_mac_list, mac_cache
+        logging.info("Resolved all addresses offline. Skipping webAPI lookup.")
+    return unresolved_mac_list, resolved_mac_list
 
 
-def _lookup_webapi(unresolved_mac_list, resolved_mac_list, mac_cache, config):
-    url_base = "https://api.macvendors.com/v1/lookup/"
-    # token = "Bearer " + config.api_token_macvendors
-    headers = {'Authorization': ("Bearer " + config.api_token_macvendors)}
-    date_today = datetime.now().strftime("%Y-%m-%d")
-    logging.info(f"Resolving {len(unresolved_mac_list)} MAC addresses via {url_base}...")
+def _group_by_oui(unresolved_mac_list):
+    mac_groups = {}
+    for mac_entity in unresolved_mac_list:
+        mac_groups.setdefault(mac_entity.oui, []).append(mac_entity)
+    return mac_groups
+
+
+def _http_session():
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
 
-    with alive_bar(len(unresolved_mac_list)) as bar:
-        for mac_entity in unresolved_mac_list:
-            url = url_base + mac_entity.formatted_mac
 
+def _query_webapi(formatted_mac, headers, rate_limiter, abort_event, config):
+    """Returns the organisation of the MAC, 'Unknown' if the API does not know it or None if the lookup failed"""
+    url = config.api_url_macvendors + formatted_mac
+
+    for attempt in range(config.api_max_retries + 1):
+        if abort_event.is_set():
+            return None
+        rate_limiter.acquire()
+        try:
+            response = _http_session().get(url, verify=True, timeout=5, headers=headers)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code == 200:
             try:
-                response = requests.get(url, verify=True, timeout=5, headers=headers)
-            except requests.exceptions.ConnectionError:
-                logging.critical(f"Timeout - Please check address({url_base}) and reachability")
-                quit()
-            except Exception as e:
-                print(e)
-            if response.status_code == 404:
-                resolved_mac_list[mac_entity.raw_mac] = "Unknown"
-                new_cache_entity = {"organisation": "Unknown", "oui": mac_entity.oui, "last_update": date_today}
-                mac_cache.append(new_cache_entity)
-                bar()
-                continue
-            elif response.status_code != 200:
-                logging.error(f"HTTP {response.status_code} - Please check your API token in 'global_config.yml'")
+                return response.json()["data"]["organization_name"]
+            except (ValueError, KeyError, TypeError):
+                logging.warning(f"Unexpected response for {formatted_mac} from {config.api_url_macvendors}")
+                return None
+        elif response.status_code == 404:
+            return "Unknown"
+        elif response.status_code == 429:
+            retry_after = _retry_after(response)
+            rate_limiter.pause(retry_after if retry_after is not None else backoff_delay(attempt))
+        elif response.status_code >= 500:
+            time.sleep(backoff_delay(attempt))
+        else:
+            logging.error(f"HTTP {response.status_code} - Please check your API token in 'global_config.yml'")
+            abort_event.set()
+            return None
+
+    # Only this OUI fails, the others may still get through, e.g. once the API stops rejecting requests
+    logging.warning(f"Gave up on {formatted_mac} after {config.api_max_retries + 1} attempts - Please check address({config.api_url_macvendors}) and reachability")
+    return None
+
 
-            response_text = response.json()
-            new_cache_entity = {"organisation": response_text["data"]["organization_name"], "oui": mac_entity.oui, "last_update": date_today}
-            mac_cache.append(new_cache_entity)
-            resolved_mac_list[mac_entity.raw_mac] = response_text["data"]["organization_name"]
-            bar()
-            time.sleep(0.6)
+def _lookup_webapi(unresolved_mac_list, resolved_mac_list, mac_cache, config):
+    headers = {'Authorization': ("Bearer " + config.api_token_macvendors)}
+    # MACs with the same OUI share one request, the result gets copied to every MAC of the group
+    mac_groups = _group_by_oui(unresolved_mac_list)
+    rate_limiter = TokenBucket(config.api_requests_per_second, config.api_burst)
+    abort_event = threading.Event()
+    failed_lookups = 0
+    logging.info(f"Resolving {len(unresolved_mac_list)} MAC addresses ({len(mac_groups)} distinct OUIs) via {config.api_url_macvendors}...")
+
+    with alive_bar(len(mac_groups)) as bar:
+        with ThreadPoolExecutor(max_workers=config.api_max_workers) as executor:
+            futures = {executor.submit(_query_webapi, mac_group[0].formatted_mac, headers, rate_limiter, abort_event, config): oui
+                       for oui, mac_group in mac_groups.items()}
+            for future in as_completed(futures):
+                oui = futures[future]
+                organisation = future.result()
+                if organisation is None:
+                    organisation = "Unknown (lookup failed)"
+                    failed_lookups += len(mac_groups[oui])
+                else:
+                    # SQLite connections must stay in their thread, so the cache gets written here instead of in the workers
+                    mac_cache.store(oui, organisation)
+                for mac_entity in mac_groups[oui]:
+                    resolved_mac_list[mac_entity.raw_mac] = organisation
+                bar()
 
-    logging.info(f"Resolved {len(unresolved_mac_list)} MAC addresses via webAPI. [3/4]")
-    return resolved_mac_list, mac_cache
+    logging.info(f"Resolved {len(unresolved_mac_list) - failed_lookups} MAC addresses via webAPI. [4/5]")
+    if failed_lookups:
+        logging.warning(f"Lookup of {failed_lookups} MAC addresses failed. They did not get cached.")
+    return resolved_mac_list
 
 
 def _update_cache(mac_cache):
-    with open(path_to_cache, "w") as json_file:
-        json.dump(mac_cache, json_file, indent=2)
+    evicted_entries = mac_cache.evict()
+    mac_cache.close()
+
+    logging.info(f"Updated MAC address cache, evicted {evicted_entries} stale entries. [5/5]")
+
+
+def _lookup_locations(formatted_mac_list):
+    """Returns {raw mac: edge location} from the MAC address table index or None, if no MAC address table was collected yet"""
+    mac_locations = locate_mac_addresses(int(mac_entity.formatted_mac, 16) for mac_entity in formatted_mac_list)
+    if mac_locations is None:
+        return None
+
+    location_list = {}
+    located_macs = 0
+    for mac_entity in formatted_mac_list:
+        locations = mac_locations.get(int(mac_entity.formatted_mac, 16), [])
+        edge_locations = [location for location in locations if location.edge]
+        if edge_locations:
+            location_list[mac_entity.raw_mac] = "; ".join(map(str, edge_locations))
+            located_macs += 1
+        elif locations:
+            # Only learned on uplinks, e.g. the device is connected to a switch, which is not in the inventory
+            location_list[mac_entity.raw_mac] = f"no edge port, seen on {locations[0]}"
+        else:
+            location_list[mac_entity.raw_mac] = "not in MAC address table"
 
-    logging.info("Updated MAC address cache. [4/4]")
+    logging.info(f"Located {located_macs} of {len(location_list)} MAC addresses on edge ports via MAC address table index.")
+    return location_list
 
 
-def _print_lookup(mac_list):
-    print("____________________________________________________________________________________")
+def _print_lookup(mac_list, interactive=True, location_list=None):
+    if interactive:
+        print("____________________________________________________________________________________")
     for mac_address, organisation in mac_list.items():
-        print(f"{mac_address} - {organisation}")
+        if location_list is None:
+            print(f"{mac_address} - {organisation}")
+        else:
+            print(f"{mac_address} - {organisation} - {location_list.get(mac_address, 'not in MAC address table')}")
 
 
-def mac_address_batch_lookup():
+def mac_address_batch_lookup(user_input=None):
+    """Resolves the vendors of all MAC addresses in user_input and, once the MAC address tables were collected, the edge
+    port they are connected to. Without user_input the user gets prompted for them."""
+    interactive = user_input is None
     mac_lookup_config = load_mac_lookup_config()
-    user_input = _prompt_user()
+    if interactive:
+        user_input = _prompt_user()
     raw_mac_list = _filter_mac_addresses(user_input)
     formatted_mac_list = _format_mac_addresses(raw_mac_list)
-    unresolved_mac_list, resolved_mac_list, mac_cache = _lookup_cache(formatted_mac_list)
-
-    if unresolved_mac_list:
-        resolved_mac_list, mac_cache = _lookup_webapi(unresolved_mac_list, resolved_mac_list, mac_cache, mac_lookup_config)
+    with _open_registry(mac_lookup_config) as oui_registry:
+        unresolved_mac_list, resolved_mac_list = _lookup_registry(formatted_mac_list, oui_registry)
+    mac_cache = _open_cache(mac_lookup_config)
+    unresolved_mac_list, resolved_mac_list = _lookup_cache(unresolved_mac_list, resolved_mac_list, mac_cache)
+
+    if unresolved_mac_list and mac_lookup_config.api_token_macvendors is None:
+        logging.warning(f"{len(unresolved_mac_list)} MAC addresses are neither in the local IEEE registry nor in the cache "
+                        f"and no API token is set. Skipping webAPI lookup. [4/5]")
+        for mac_entity in unresolved_mac_list:
+            resolved_mac_list[mac_entity.raw_mac] = "Unknown (offline)"
+    elif unresolved_mac_list:
+        resolved_mac_list = _lookup_webapi(unresolved_mac_list, resolved_mac_list, mac_cache, mac_lookup_config)
 
     _update_cache(mac_cache)
-    _print_lookup(resolved_mac_list)
+    location_list = _lookup_locations(formatted_mac_list)
+    _print_lookup(resolved_mac_list, interactive, location_list)
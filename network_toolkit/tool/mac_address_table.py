@@ -0,0 +1,139 @@
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from .interface_config_search import UPLINK_INT_PATTERN
+from .mac_vendor_cache import _chunks
+
+MAC_TABLE_COMMAND = "show mac address-table"
+
+path_to_mac_table = Path.cwd() / "raw_output/mac_address_lookup/mac_address_table.sqlite"
+
+# '[*] vlan mac type [...] port' of IOS, IOS-XE and NX-OS. Entries of VLAN 'All' (CPU, multicast) don't get matched.
+MAC_TABLE_ENTRY_PATTERN = re.compile(r"^[ \t*GR+]*(\d+)[ \t]+([0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4})[ \t].*?(\S+)[ \t]*$", re.MULTILINE)
+# Physical ports and port-channels, not 'CPU', 'Router', 'Drop' or lists of ports
+PORT_PATTERN = re.compile(r"^[A-Za-z][A-Za-z-]*\d[\d/.:]*$")
+INTERFACE_NAME_PATTERN = re.compile(r"^(?:interface\s+)?([A-Za-z][A-Za-z-]*)\s*(\d[\d/.:]*)$")
+TRUNK_CONFIG_LINE = "switchport mode trunk"
+
+
+@dataclass(frozen=True)
+class MacLocation:
+    switch_ip: str
+    hostname: str
+    interface: str
+    vlan: int
+    edge: bool  # False for uplink, trunk and port-channel interfaces, where the MACs of other switches are learned
+    collected: str
+
+    def __str__(self):
+        return f"{self.hostname} ({self.switch_ip}) {self.interface} VLAN {self.vlan}"
+
+
+def short_interface_name(interface_name):
+    """Returns the name as the MAC address table prints it, e.g. 'interface GigabitEthernet1/0/1' -> 'Gi1/0/1'"""
+    match = INTERFACE_NAME_PATTERN.match(interface_name.strip())
+    if match is None:
+        return interface_name.strip()
+    return match.group(1)[:2].capitalize() + match.group(2)
+
+
+def parse_mac_address_table(raw_cli_output):
+    """Yields (MAC as integer, VLAN, short interface name) for every unicast entry of a 'show mac address-table' output"""
+    for vlan, mac, port in MAC_TABLE_ENTRY_PATTERN.findall(raw_cli_output):
+        if not PORT_PATTERN.match(port):
+            continue
+        yield int(mac.replace(".", ""), 16), int(vlan), short_interface_name(port)
+
+
+def find_trunk_interfaces(switch_config):
+    """Returns the short names of the trunk interfaces in the entry of a switch in an 'Interface Ethernet Config' file"""
+    return {short_interface_name(interface_name) for interface_name, interface_config in switch_config.get("eth_interfaces", {}).items()
+            if TRUNK_CONFIG_LINE in interface_config}
+
+
+def is_edge_interface(interface_name, trunk_interfaces):
+    """Edge interfaces connect end devices. Uplinks (network module ports), trunks and port-channels lead to other switches."""
+    return not (interface_name in trunk_interfaces or interface_name.startswith("Po") or UPLINK_INT_PATTERN.search(interface_name))
+
+
+class MacLocationIndex:
+    """MAC (as integer) -> (switch, interface, VLAN) of the latest MAC address tables in a SQLite database. A collection
+    replaces the entries of every switch, which answered, the entries of the other switches are kept."""
+
+    def __init__(self, path_to_database):
+        Path(path_to_database).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path_to_database)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS mac_location (mac INTEGER NOT NULL, switch_ip TEXT NOT NULL, hostname TEXT NOT NULL, "
+                                 "interface TEXT NOT NULL, vlan INTEGER NOT NULL, edge INTEGER NOT NULL, collected TEXT NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS mac_location_mac ON mac_location (mac)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS mac_location_switch_ip ON mac_location (switch_ip)")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM mac_location").fetchone()[0]
+
+    def replace_switch(self, switch_ip, hostname, mac_entries, trunk_interfaces=()):
+        """Replaces the entries of the switch by mac_entries [(mac, vlan, interface), ...]. Returns the number of edge entries."""
+        collected = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        rows = [(mac, switch_ip, hostname, interface, vlan, is_edge_interface(interface, trunk_interfaces), collected)
+                for mac, vlan, interface in mac_entries]
+        with self._connection:
+            self._connection.execute("DELETE FROM mac_location WHERE switch_ip = ?", (switch_ip,))
+            self._connection.executemany("INSERT INTO mac_location (mac, switch_ip, hostname, interface, vlan, edge, collected) "
+                                         "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return sum(1 for row in rows if row[5])
+
+    def lookup(self, macs):
+        """Returns {mac: [MacLocation, ...]} for all indexed MACs, the edge locations first"""
+        locations = {}
+        for mac_chunk in _chunks(set(macs)):
+            placeholders = ",".join("?" * len(mac_chunk))
+            rows = self._connection.execute("SELECT mac, switch_ip, hostname, interface, vlan, edge, collected FROM mac_location "
+                                            f"WHERE mac IN ({placeholders}) ORDER BY edge DESC, collected DESC", mac_chunk)
+            for mac, switch_ip, hostname, interface, vlan, edge, collected in rows:
+                locations.setdefault(mac, []).append(MacLocation(switch_ip, hostname, interface, vlan, bool(edge), collected))
+        return locations
+
+
+def update_mac_location_index(switches, raw_cli_outputs, switch_configs=None):
+    """Stores the MAC address tables (raw_cli_outputs: ip -> output of MAC_TABLE_COMMAND) of the switches in the index.
+    switch_configs (ip -> entry of an 'Interface Ethernet Config' file) tells the trunk interfaces apart."""
+    switch_configs = switch_configs or {}
+    updated_switches = 0
+    edge_entries = 0
+    with MacLocationIndex(path_to_mac_table) as mac_location_index:
+        for switch_element in switches:
+            raw_cli_output = raw_cli_outputs.get(switch_element.ip)
+            if not raw_cli_output:
+                # Failed switches keep the entries of their last collection
+                continue
+            trunk_interfaces = find_trunk_interfaces(switch_configs.get(switch_element.ip, {}))
+            edge_entries += mac_location_index.replace_switch(switch_element.ip, switch_element.hostname,
+                                                              parse_mac_address_table(raw_cli_output), trunk_interfaces)
+            updated_switches += 1
+        indexed_entries = len(mac_location_index)
+
+    logging.info(f"Updated the MAC address tables of {updated_switches} of {len(switches)} switches ({edge_entries} MACs on edge ports). "
+                 f"The index holds {indexed_entries} entries @ {path_to_mac_table}")
+    return path_to_mac_table
+
+
+def locate_mac_addresses(macs):
+    """Returns {mac: [MacLocation, ...]} from the index, or None if no MAC address table was collected yet"""
+    if not path_to_mac_table.exists():
+        return None
+    with MacLocationIndex(path_to_mac_table) as mac_location_index:
+        return mac_location_index.lookup(macs)
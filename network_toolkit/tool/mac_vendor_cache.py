@@ -0,0 +1,83 @@
+import json
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+# SQLite allows only a limited number of variables per statement
+_CHUNK_SIZE = 500
+
+
+def _chunks(values, chunk_size=_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), chunk_size):
+        yield values[start:start + chunk_size]
+
+
+class MacVendorCache:
+    """OUI -> organisation cache in a SQLite database. Entries not used for ttl_days expire and the least recently
+    used entries get evicted above max_entries. Every change is written right away, the file is never rewritten."""
+
+    def __init__(self, path_to_database, ttl_days, max_entries):
+        self.path_to_database = path_to_database
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+
+        self._connection = sqlite3.connect(path_to_database)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS oui_cache ("
+                                 "oui TEXT PRIMARY KEY, organisation TEXT NOT NULL, last_update TEXT NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS oui_cache_last_update ON oui_cache (last_update)")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM oui_cache").fetchone()[0]
+
+    def import_json_cache(self, path_to_json_cache):
+        """Takes over the entries of the former JSON cache file"""
+        with open(path_to_json_cache, mode="r", encoding="utf-8") as file:
+            json_cache = json.load(file)
+
+        with self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO oui_cache (oui, organisation, last_update) VALUES (?, ?, ?)",
+                                         [(entry["oui"], entry["organisation"], entry["last_update"]) for entry in json_cache])
+        logging.info(f"Imported {len(json_cache)} entries of {path_to_json_cache.name} into the MAC address cache.")
+
+    def lookup(self, ouis):
+        """Returns {oui: organisation} for all cached OUIs and marks them as used today"""
+        date_today = datetime.now().strftime("%Y-%m-%d")
+        organisations = {}
+
+        for oui_chunk in _chunks(set(ouis)):
+            placeholders = ",".join("?" * len(oui_chunk))
+            rows = self._connection.execute(f"SELECT oui, organisation FROM oui_cache WHERE oui IN ({placeholders})", oui_chunk)
+            organisations.update(rows)
+
+        with self._connection:
+            self._connection.executemany("UPDATE oui_cache SET last_update = ? WHERE oui = ?",
+                                         [(date_today, oui) for oui in organisations])
+        return organisations
+
+    def store(self, oui, organisation):
+        date_today = datetime.now().strftime("%Y-%m-%d")
+        with self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO oui_cache (oui, organisation, last_update) VALUES (?, ?, ?)",
+                                     (oui, organisation, date_today))
+
+    def evict(self):
+        """Deletes expired entries and the least recently used ones above max_entries. Returns the number of deleted entries."""
+        expiry_date = (datetime.now() - timedelta(days=self.ttl_days)).strftime("%Y-%m-%d")
+        with self._connection:
+            deleted_entries = self._connection.execute("DELETE FROM oui_cache WHERE last_update < ?", (expiry_date,)).rowcount
+            surplus = len(self) - self.max_entries
+            if surplus > 0:
+                deleted_entries += self._connection.execute("DELETE FROM oui_cache WHERE oui IN "
+                                                            "(SELECT oui FROM oui_cache ORDER BY last_update LIMIT ?)", (surplus,)).rowcount
+        return deleted_entries
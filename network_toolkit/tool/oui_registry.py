@@ -0,0 +1,102 @@
+import csv
+import logging
+import sqlite3
+from pathlib import Path
+
+from .mac_vendor_cache import _chunks
+
+# Length of the assignment in hex digits: MA-L (24 bit), MA-M (28 bit), MA-S and IAB (36 bit)
+PREFIX_LENGTHS = (9, 7, 6)
+
+
+class OuiRegistry:
+    """Local copy of the IEEE registries (oui.csv, mam.csv, oui36.csv, iab.csv from https://standards.ieee.org),
+    stored next to the MAC address cache. MACs are resolved by longest prefix match over all block sizes."""
+
+    def __init__(self, path_to_database):
+        self._connection = sqlite3.connect(path_to_database)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS ieee_registry ("
+                                 "prefix TEXT PRIMARY KEY, registry TEXT NOT NULL, organisation TEXT NOT NULL)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS ieee_registry_files (file_name TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM ieee_registry").fetchone()[0]
+
+    def import_registry_files(self, path_to_registry_directory):
+        """Bulk loads all registry CSV files of the directory, which are new or changed since the last import"""
+        path_to_registry_directory = Path(path_to_registry_directory)
+        if not path_to_registry_directory.is_dir():
+            return 0
+
+        imported_files = dict(self._connection.execute("SELECT file_name, mtime_ns FROM ieee_registry_files"))
+        imported_entries = 0
+        for path_to_registry_file in sorted(path_to_registry_directory.glob("*.csv")):
+            mtime_ns = path_to_registry_file.stat().st_mtime_ns
+            if imported_files.get(path_to_registry_file.name) == mtime_ns:
+                continue
+            imported_entries += self._import_registry_file(path_to_registry_file, mtime_ns)
+        return imported_entries
+
+    def _import_registry_file(self, path_to_registry_file, mtime_ns):
+        entries = []
+        with open(path_to_registry_file, mode="r", encoding="utf-8", newline="") as registry_file:
+            for row in csv.DictReader(registry_file):
+                prefix = (row.get("Assignment") or "").strip().upper()
+                if len(prefix) not in PREFIX_LENGTHS:
+                    continue
+                entries.append((prefix, row.get("Registry", ""), (row.get("Organization Name") or "").strip()))
+
+        if not entries:
+            logging.warning(f"{path_to_registry_file.name} contains no IEEE assignments. Skipping it.")
+            return 0
+
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO ieee_registry (prefix, registry, organisation) VALUES (?, ?, ?)", entries)
+            self._connection.execute("INSERT OR REPLACE INTO ieee_registry_files (file_name, mtime_ns) VALUES (?, ?)",
+                                     (path_to_registry_file.name, mtime_ns))
+        logging.info(f"Imported {len(entries)} assignments from {path_to_registry_file.name} into the local IEEE registry.")
+        return len(entries)
+
+    def _fetch_prefixes(self, prefixes):
+        found_prefixes = {}
+        for prefix_chunk in _chunks(set(prefixes)):
+            placeholders = ",".join("?" * len(prefix_chunk))
+            found_prefixes.update(self._connection.execute(f"SELECT prefix, organisation FROM ieee_registry WHERE prefix IN ({placeholders})", prefix_chunk))
+        return found_prefixes
+
+    def lookup(self, formatted_macs):
+        """Returns {formatted mac: (prefix, organisation)} of the longest matching assignment per MAC. The MA-L entry of a
+        block, which the IEEE split into MA-M/MA-S assignments, names only the IEEE itself and does not count as match."""
+        formatted_macs = set(formatted_macs)
+        found_prefixes = self._fetch_prefixes(formatted_mac[:length] for formatted_mac in formatted_macs for length in PREFIX_LENGTHS)
+        subdivided_blocks = self.subdivided_blocks(prefix for prefix in found_prefixes if len(prefix) == 6)
+
+        matches = {}
+        for formatted_mac in formatted_macs:
+            for length in PREFIX_LENGTHS:
+                prefix = formatted_mac[:length]
+                organisation = found_prefixes.get(prefix)
+                if organisation is not None and prefix not in subdivided_blocks:
+                    matches[formatted_mac] = (prefix, organisation)
+                    break
+        return matches
+
+    def subdivided_blocks(self, ouis):
+        """Returns those 24 bit OUIs, which the IEEE split into MA-M or MA-S assignments"""
+        subdivided_blocks = set()
+        for oui in set(ouis):
+            # Range scan on the primary key: longer prefixes sort directly behind their OUI
+            row = self._connection.execute("SELECT 1 FROM ieee_registry WHERE prefix > ? AND prefix < ? LIMIT 1", (oui, oui + "G")).fetchone()
+            if row is not None:
+                subdivided_blocks.add(oui)
+        return subdivided_blocks
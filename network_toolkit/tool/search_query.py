@@ -0,0 +1,238 @@
+"""Query language of the interface search.
+
+    "switchport mode access"                 interface has exactly this config line
+    ~"dot1x"                                  interface has a config line containing this text
+    /^switchport access vlan 1\\d\\d$/i       interface has a config line matching the regex (flag i: ignore case)
+    NOT, AND, OR, ( )                         combine them, e.g. "switchport mode access" AND NOT ~"dot1x"
+
+Adjacent terms without operator are combined with AND. A query, which does not start with a quote, '~', '/', '(' or
+NOT, is taken as one exact config line, like the search mask always was.
+
+A query gets compiled once. All patterns are then checked in one pass over the distinct config lines of the search
+index (its vocabulary), so the cost grows with the number of distinct lines, not with the number of patterns: exact
+lines are dictionary lookups, substrings and regexes are combined into one regex, which rejects lines without any
+match in a single call.
+"""
+import re
+
+from .interface_config_search import normalize_config_line
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<paren>[()])
+      | (?P<tilde>~)?(?P<quote>["'])(?P<text>(?:\\.|(?!(?P=quote)).)*)(?P=quote)
+      | /(?P<regex>(?:\\.|[^/\\])*)/(?P<flags>[i]*)
+      | (?P<word>[A-Za-z]+)
+    )""", re.VERBOSE)
+_OPERATORS = {"AND", "OR", "NOT"}
+_QUERY_START = ("\"", "'", "~", "/", "(")
+# Numbered backreferences break, once several regexes are joined into one
+_NUMBERED_BACKREFERENCE = re.compile(r"\\[1-9]")
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+class _Pattern:
+    def __init__(self, kind, text, regex=None):
+        self.kind = kind  # exact, substring or regex
+        self.text = text
+        self.regex = regex
+        self.number = None  # Position in SearchQuery.patterns
+
+
+class _Not:
+    def __init__(self, operand):
+        self.operand = operand
+
+
+class _And:
+    def __init__(self, operands):
+        self.operands = operands
+
+
+class _Or:
+    def __init__(self, operands):
+        self.operands = operands
+
+
+def _tokenize(query_text):
+    tokens = []
+    position = 0
+    query_text = query_text.rstrip()
+    while position < len(query_text):
+        match = _TOKEN_PATTERN.match(query_text, position)
+        if match is None or match.end() == position:
+            raise SearchQueryError(f"Unexpected '{query_text[position:].strip()}' at position {position}")
+        position = match.end()
+
+        if match.group("paren"):
+            tokens.append(match.group("paren"))
+        elif match.group("quote"):
+            text = normalize_config_line(re.sub(r"\\(.)", r"\1", match.group("text")))
+            tokens.append(_Pattern("substring" if match.group("tilde") else "exact", text))
+        elif match.group("regex") is not None:
+            regex_text = match.group("regex").replace("\\/", "/")
+            try:
+                regex = re.compile(regex_text, re.IGNORECASE if "i" in match.group("flags") else 0)
+            except re.error as e:
+                raise SearchQueryError(f"Invalid regex /{regex_text}/: {e}")
+            tokens.append(_Pattern("regex", regex_text, regex))
+        elif match.group("word").upper() in _OPERATORS:
+            tokens.append(match.group("word").upper())
+        else:
+            raise SearchQueryError(f"Unknown word '{match.group('word')}'. Put config lines in quotes.")
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser: OR binds weaker than AND, AND weaker than NOT"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise SearchQueryError("Search query is empty")
+        tree = self._parse_or()
+        if self._peek() is not None:
+            raise SearchQueryError(f"Unexpected '{self._peek()}'")
+        return tree
+
+    def _parse_or(self):
+        operands = [self._parse_and()]
+        while self._peek() == "OR":
+            self._next()
+            operands.append(self._parse_and())
+        return operands[0] if len(operands) == 1 else _Or(operands)
+
+    def _parse_and(self):
+        operands = [self._parse_not()]
+        while self._peek() not in (None, "OR", ")"):
+            if self._peek() == "AND":
+                self._next()
+            operands.append(self._parse_not())
+        return operands[0] if len(operands) == 1 else _And(operands)
+
+    def _parse_not(self):
+        if self._peek() == "NOT":
+            self._next()
+            return _Not(self._parse_not())
+        return self._parse_atom()
+
+    def _parse_atom(self):
+        token = self._next()
+        if token == "(":
+            tree = self._parse_or()
+            if self._next() != ")":
+                raise SearchQueryError("Missing ')'")
+            return tree
+        if isinstance(token, _Pattern):
+            return token
+        raise SearchQueryError("Search query ends unexpectedly" if token is None else f"Unexpected '{token}'")
+
+
+def _collect_patterns(tree, patterns):
+    if isinstance(tree, _Pattern):
+        tree.number = len(patterns)
+        patterns.append(tree)
+    elif isinstance(tree, _Not):
+        _collect_patterns(tree.operand, patterns)
+    else:
+        for operand in tree.operands:
+            _collect_patterns(operand, patterns)
+
+
+class SearchQuery:
+    def __init__(self, source, tree):
+        self.source = source
+        self.tree = tree
+        self.patterns = []
+        _collect_patterns(tree, self.patterns)
+
+        self._exact_patterns = [pattern for pattern in self.patterns if pattern.kind == "exact"]
+        combinable_patterns = []
+        self._separate_patterns = []
+        for pattern in self.patterns:
+            if pattern.kind == "substring":
+                combinable_patterns.append((pattern, re.escape(pattern.text)))
+            elif pattern.kind == "regex" and _NUMBERED_BACKREFERENCE.search(pattern.text):
+                self._separate_patterns.append(pattern)
+            elif pattern.kind == "regex":
+                inline_flags = "(?i:" if pattern.regex.flags & re.IGNORECASE else "(?:"
+                combinable_patterns.append((pattern, inline_flags + pattern.text + ")"))
+
+        self._any_matcher = None
+        self._pattern_matcher = None
+        if combinable_patterns:
+            try:
+                # One search tells if any pattern matches, one match of the lookaheads tells which ones. The lookaheads
+                # skip over the line breaks of continued config lines (banners, multi-line descriptions), like the search does
+                self._any_matcher = re.compile("|".join(regex_text for _, regex_text in combinable_patterns))
+                self._pattern_matcher = re.compile("".join(f"(?=(?:(?s:.*?)(?P<p{pattern.number}>{regex_text}))?)"
+                                                           for pattern, regex_text in combinable_patterns))
+            except re.error:
+                # E.g. the same group name in two regexes
+                self._any_matcher = None
+                self._separate_patterns += [pattern for pattern, _ in combinable_patterns]
+
+    def __str__(self):
+        return self.source
+
+    def match_vocabulary(self, postings):
+        """Returns per pattern the set of interface ids, which have a matching config line"""
+        matching_ids = [set() for _ in self.patterns]
+        for pattern in self._exact_patterns:
+            matching_ids[pattern.number].update(postings.get(pattern.text, ()))
+
+        if self._any_matcher is None and not self._separate_patterns:
+            return matching_ids
+        for config_line, interface_ids in postings.items():
+            if self._any_matcher is not None and self._any_matcher.search(config_line):
+                for group_name, group_match in self._pattern_matcher.match(config_line).groupdict().items():
+                    if group_match is not None:
+                        matching_ids[int(group_name[1:])].update(interface_ids)
+            for pattern in self._separate_patterns:
+                if pattern.regex.search(config_line):
+                    matching_ids[pattern.number].update(interface_ids)
+        return matching_ids
+
+    def evaluate(self, postings, all_ids):
+        """Returns the set of interface ids, which fulfil the query"""
+        matching_ids = self.match_vocabulary(postings)
+
+        def evaluate_tree(tree):
+            if isinstance(tree, _Pattern):
+                return matching_ids[tree.number]
+            elif isinstance(tree, _Not):
+                return all_ids - evaluate_tree(tree.operand)
+            elif isinstance(tree, _And):
+                result = set(evaluate_tree(tree.operands[0]))
+                for operand in tree.operands[1:]:
+                    result &= evaluate_tree(operand)
+                return result
+            result = set()
+            for operand in tree.operands:
+                result |= evaluate_tree(operand)
+            return result
+
+        return evaluate_tree(self.tree)
+
+
+def compile_search_query(query_text):
+    """Compiles the query. Raises SearchQueryError, if it is invalid."""
+    stripped_query_text = query_text.strip()
+    if not stripped_query_text.startswith(_QUERY_START) and not re.match(r"NOT\b", stripped_query_text, re.IGNORECASE):
+        # Plain config line without quotes
+        return SearchQuery(query_text, _Pattern("exact", normalize_config_line(stripped_query_text)))
+    return SearchQuery(query_text, _Parser(_tokenize(stripped_query_text)).parse())
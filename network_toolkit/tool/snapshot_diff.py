@@ -0,0 +1,213 @@
+"""Diff of two 'Interface Ethernet Config' files.
+
+Every file gets a hash manifest (stored next to it, + '.hashes'): per switch one hash over its hostname and interfaces
+and per interface one hash over its config lines. A diff compares the switch hashes, descends only into switches with
+different hashes and reads config lines only of interfaces with different hashes. Two delta files on the same base
+need no manifest at all, the switches outside both deltas are those of the base and therefore equal.
+"""
+import json
+import logging
+from collections import Counter
+from hashlib import blake2b
+from pathlib import Path
+
+from network_toolkit.snapshot import CompactSnapshot, load_snapshot, open_snapshot, snapshot_signature
+from network_toolkit.snapshot.delta_storage import is_delta_snapshot
+
+MANIFEST_VERSION = 1
+
+# Manifests which got loaded during this session, keyed by path of the config file
+_loaded_manifests = {}
+
+
+def _hash_lines(lines):
+    return blake2b("\n".join(lines).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def hash_switch_entry(switch_entry):
+    """Returns (hash of the switch, {interface name: hash of its config lines})"""
+    interface_hashes = {int_name: _hash_lines(int_config) for int_name, int_config in switch_entry.get("eth_interfaces", {}).items()}
+    switch_hash = _hash_lines([switch_entry.get("hostname", "")] + [int_name + " " + int_hash for int_name, int_hash in interface_hashes.items()])
+    return switch_hash, interface_hashes
+
+
+class SnapshotHashes:
+    """Hash manifest of a config file: ip -> [hostname, switch hash, {interface name: interface hash}]"""
+
+    def __init__(self, switches, source=None):
+        self.switches = switches
+        self.source = source or {}
+
+    @classmethod
+    def build(cls, raw_int_eth_config, source=None):
+        switches = {}
+        for switch_ip, switch_entry in raw_int_eth_config.items():
+            switch_hash, interface_hashes = hash_switch_entry(switch_entry)
+            switches[switch_ip] = [switch_entry.get("hostname", "No hostname"), switch_hash, interface_hashes]
+        return cls(switches, source)
+
+    @classmethod
+    def load(cls, path_manifest_file):
+        with open(path_manifest_file, mode="r", encoding="utf-8") as manifest_file:
+            raw_manifest = json.load(manifest_file)
+        if raw_manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"{path_manifest_file} is no hash manifest of version {MANIFEST_VERSION}")
+        return cls(raw_manifest["switches"], raw_manifest["source"])
+
+    def save(self, path_manifest_file):
+        raw_manifest = {"version": MANIFEST_VERSION, "source": self.source, "switches": self.switches}
+        with open(path_manifest_file, mode="w", encoding="utf-8") as manifest_file:
+            json.dump(raw_manifest, manifest_file, separators=(",", ":"))
+
+
+def load_snapshot_hashes(path_output_file):
+    """Returns the hash manifest of the config file. It gets built on first use and stored next to the file."""
+    source = snapshot_signature(path_output_file)
+    snapshot_hashes = _loaded_manifests.get(str(path_output_file))
+    if snapshot_hashes is not None and snapshot_hashes.source == source:
+        return snapshot_hashes
+
+    path_manifest_file = Path(str(path_output_file) + ".hashes")
+    snapshot_hashes = None
+    if path_manifest_file.exists():
+        try:
+            snapshot_hashes = SnapshotHashes.load(path_manifest_file)
+        except (ValueError, KeyError):
+            logging.warning(f"Hash manifest {path_manifest_file.name} is damaged. Rebuilding it.")
+        if snapshot_hashes is not None and snapshot_hashes.source != source:
+            snapshot_hashes = None
+
+    if snapshot_hashes is None:
+        with open_snapshot(path_output_file) as snapshot:
+            snapshot_hashes = SnapshotHashes.build(snapshot, source)
+        try:
+            snapshot_hashes.save(path_manifest_file)
+            logging.debug(f"Built hash manifest @ {path_manifest_file}")
+        except OSError:
+            logging.warning(f"Could not store hash manifest @ {path_manifest_file}")
+
+    _loaded_manifests[str(path_output_file)] = snapshot_hashes
+    return snapshot_hashes
+
+
+class _SwitchEntries:
+    """Reads single switch entries of a config file. A file gets opened only, once an entry of it is needed."""
+
+    def __init__(self, path_output_file):
+        self.path = Path(path_output_file)
+        self._delta = None
+        self._snapshot = None
+        if is_delta_snapshot(self.path):
+            with open(self.path, mode="r", encoding="utf-8") as delta_file:
+                self._delta = json.load(delta_file)
+
+    @property
+    def base_name(self):
+        return None if self._delta is None else self._delta["base"]
+
+    @property
+    def delta_switches(self):
+        return self._delta["switches"]
+
+    def _full_snapshot(self):
+        if self._snapshot is None:
+            # The base of a delta file holds every switch, which is not in the delta
+            path_snapshot_file = self.path if self._delta is None else self.path.parent / self._delta["base"]
+            self._snapshot = load_snapshot(path_snapshot_file)
+        return self._snapshot
+
+    def get(self, switch_ip):
+        if self._delta is not None and switch_ip in self._delta["switches"]:
+            return self._delta["switches"][switch_ip]
+        return self._full_snapshot().get(switch_ip)
+
+    def close(self):
+        if isinstance(self._snapshot, CompactSnapshot):
+            self._snapshot.close()
+
+
+def _list_difference(lines, other_lines):
+    """Returns the lines, which are not in other_lines, in their order (a line twice in lines, once in other_lines counts once)"""
+    remaining = Counter(other_lines)
+    difference = []
+    for line in lines:
+        if remaining[line] > 0:
+            remaining[line] -= 1
+        else:
+            difference.append(line)
+    return difference
+
+
+def _diff_switch(old_entry, new_entry, old_interface_hashes=None, new_interface_hashes=None):
+    old_interfaces = old_entry.get("eth_interfaces", {})
+    new_interfaces = new_entry.get("eth_interfaces", {})
+    if old_interface_hashes is None:
+        old_interface_hashes = hash_switch_entry(old_entry)[1]
+    if new_interface_hashes is None:
+        new_interface_hashes = hash_switch_entry(new_entry)[1]
+
+    switch_diff = {}
+    if old_entry.get("hostname") != new_entry.get("hostname"):
+        switch_diff["hostname"] = {"old": old_entry.get("hostname"), "new": new_entry.get("hostname")}
+    added_interfaces = [int_name for int_name in new_interfaces if int_name not in old_interfaces]
+    removed_interfaces = [int_name for int_name in old_interfaces if int_name not in new_interfaces]
+    changed_interfaces = {}
+    for int_name in new_interfaces:
+        if int_name in old_interfaces and old_interface_hashes.get(int_name) != new_interface_hashes.get(int_name):
+            changed_interfaces[int_name] = {"added_lines": _list_difference(new_interfaces[int_name], old_interfaces[int_name]),
+                                            "removed_lines": _list_difference(old_interfaces[int_name], new_interfaces[int_name])}
+    if added_interfaces:
+        switch_diff["added_interfaces"] = {int_name: new_interfaces[int_name] for int_name in added_interfaces}
+    if removed_interfaces:
+        switch_diff["removed_interfaces"] = {int_name: old_interfaces[int_name] for int_name in removed_interfaces}
+    if changed_interfaces:
+        switch_diff["changed_interfaces"] = changed_interfaces
+    return switch_diff
+
+
+def _candidate_switches(old_entries, new_entries):
+    """Returns the ips of all switches, which may differ, and for each the interface hashes (old, new) if known"""
+    path_old_file, path_new_file = old_entries.path, new_entries.path
+    if old_entries.base_name is not None and old_entries.base_name == new_entries.base_name:
+        return {switch_ip: (None, None) for switch_ip in list(old_entries.delta_switches) + list(new_entries.delta_switches)}
+    if new_entries.base_name == path_old_file.name:
+        return {switch_ip: (None, None) for switch_ip in new_entries.delta_switches}
+    if old_entries.base_name == path_new_file.name:
+        return {switch_ip: (None, None) for switch_ip in old_entries.delta_switches}
+
+    old_hashes = load_snapshot_hashes(path_old_file).switches
+    new_hashes = load_snapshot_hashes(path_new_file).switches
+    candidates = {}
+    for switch_ip in old_hashes.keys() | new_hashes.keys():
+        old_switch, new_switch = old_hashes.get(switch_ip), new_hashes.get(switch_ip)
+        if old_switch is None or new_switch is None or old_switch[1] != new_switch[1]:
+            candidates[switch_ip] = (old_switch[2] if old_switch else None, new_switch[2] if new_switch else None)
+    return candidates
+
+
+def diff_snapshots(path_old_file, path_new_file):
+    """Returns the switches added and removed between the two files and per changed switch the added, removed and
+    changed interfaces, the latter with their added and removed config lines"""
+    old_entries, new_entries = _SwitchEntries(path_old_file), _SwitchEntries(path_new_file)
+    try:
+        candidates = _candidate_switches(old_entries, new_entries)
+        diff_result = {"added_switches": {}, "removed_switches": {}, "changed_switches": {}}
+        for switch_ip in sorted(candidates):
+            old_entry, new_entry = old_entries.get(switch_ip), new_entries.get(switch_ip)
+            if old_entry is None and new_entry is None:
+                continue
+            elif old_entry is None:
+                diff_result["added_switches"][switch_ip] = new_entry.get("hostname", "No hostname")
+            elif new_entry is None:
+                diff_result["removed_switches"][switch_ip] = old_entry.get("hostname", "No hostname")
+            else:
+                switch_diff = _diff_switch(old_entry, new_entry, *candidates[switch_ip])
+                if switch_diff:
+                    diff_result["changed_switches"][switch_ip + " - " + new_entry.get("hostname", "No hostname")] = switch_diff
+    finally:
+        old_entries.close()
+        new_entries.close()
+
+    logging.info(f"Compared {Path(path_old_file).name} with {Path(path_new_file).name}: {len(diff_result['added_switches'])} switches added, "
+                 f"{len(diff_result['removed_switches'])} removed, {len(diff_result['changed_switches'])} changed.")
+    return diff_result